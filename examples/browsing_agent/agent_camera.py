@@ -1,10 +1,11 @@
-import asyncio
 import logging
 from pathlib import Path
 from PIL import Image
 import numpy as np
 from livekit import rtc
 
+from video_scheduler import VideoScheduler
+
 logger = logging.getLogger("agent-camera")
 
 class AgentCamera:
@@ -20,6 +21,9 @@ class AgentCamera:
         if img.mode != 'RGBA':
             img = img.convert('RGBA')
         self.img_array = np.array(img)
+        # The image never changes, so one frame is built once and only re-sent as a keep-alive
+        self.frame = rtc.VideoFrame(480, 640, rtc.VideoBufferType.RGBA, self.img_array.tobytes())
+        self.scheduler = None
 
     async def start(self, room: rtc.Room):
         # Publish video track
@@ -27,25 +31,20 @@ class AgentCamera:
         self.publication = await room.local_participant.publish_track(self.track, options)
         logger.info("published track", extra={"track_sid": self.publication.sid})
         
-        # Start drawing task
-        self._draw_task = asyncio.create_task(self._draw_agent())
+        # Start publishing frames
+        self.scheduler = VideoScheduler(self.source, lambda: self.frame,
+                                        subscribers=lambda: len(room.remote_participants),
+                                        name="agent-camera")
+        self.scheduler.start()
 
     async def stop(self, room: rtc.Room):
-        # Stop drawing task
-        if hasattr(self, '_draw_task'):
-            self._draw_task.cancel()
-            try:
-                await self._draw_task
-            except asyncio.CancelledError:
-                pass
+        # Stop publishing frames
+        if self.scheduler:
+            await self.scheduler.stop()
+            self.scheduler = None
 
         # Unpublish track
         if self.publication:
             await room.local_participant.unpublish_track(self.publication.track.sid)
             self.publication = None
 
-    async def _draw_agent(self):
-        while True:
-            await asyncio.sleep(0.1)  # 100ms
-            frame = rtc.VideoFrame(480, 640, rtc.VideoBufferType.RGBA, self.img_array.tobytes())
-            self.source.capture_frame(frame) 
\ No newline at end of file
@@ -1,86 +1,119 @@
 import asyncio
 import logging
 import time
-from typing import Optional, Dict, Any, List
-from playwright.async_api import async_playwright, Browser, Page
-from PIL import Image, ImageOps
-import io
+from typing import Optional, Dict, Any, List, Callable
+from playwright.async_api import Page
 from livekit import rtc
 
+from screen_capture import ScreenCapture, FrameComposer
+from video_scheduler import VideoScheduler
+from browser_pool import get_pool
+from page_helper import HELPER_SCRIPT, HELPER_CALL, AUTO_SCROLL_BINDING
+from content_extractor import ContentExtractor
+
 logger = logging.getLogger("browser-manager")
 
 WIDTH = 640
 HEIGHT = 480
 
 DEFAULT_URL = "https://docs.livekit.io/agents/v1/"
+AUTO_SCROLL_PIXELS_PER_SECOND = 100  # At speed 1.0
 #DEFAULT_URL = "https://deepwiki.com/livekit/agents"
 
 class BrowserAutomation:
     def __init__(self, page: Page):
-        self.page = page
-        self.auto_scroll_task = None
         self.auto_scroll_speed = 1.0
         self.auto_scroll_direction = 0  # 0: stopped, 1: down, -1: up
+        self._page = None
+        self.page = page
+        self.round_trips: Dict[str, int] = {}  # Browser round trips made per action
+        self.content = ContentExtractor()
+
+    @property
+    def page(self) -> Page:
+        return self._page
+
+    @page.setter
+    def page(self, page: Page):
+        """Switches to another page (tab), stopping auto-scroll on the one left behind."""
+        previous, self._page = self._page, page
+        if previous is not None and previous is not page and self.auto_scroll_direction:
+            asyncio.create_task(self._stop_page_auto_scroll(previous))
+        self._reset_auto_scroll()
+
+    async def _stop_page_auto_scroll(self, page: Page) -> None:
+        try:
+            await self._trip("stop_auto_scroll", page.evaluate(HELPER_CALL, ["stopAutoScroll", []]))
+        except Exception as e:
+            logger.debug(f"Error stopping auto-scroll on previous page: {e}")
 
-    async def check_page(self) -> bool:
-        """Checks if the page is still responsive."""
+    def _reset_auto_scroll(self) -> None:
+        """Forgets the auto-scroll state; a new document or tab does not scroll until asked to."""
+        self.auto_scroll_direction = 0
+        self.auto_scroll_speed = 1.0
+
+    async def _trip(self, action: str, awaitable):
+        """Awaits one browser round trip made for action, counting it."""
+        self.round_trips[action] = self.round_trips.get(action, 0) + 1
+        return await awaitable
+
+    async def _helper(self, action: str, op: str, *args) -> Dict[str, Any]:
+        """Runs an operation of the page-side helper, installing it first in documents that lack it."""
+        result = await self._trip(action, self.page.evaluate(HELPER_CALL, [op, list(args)]))
+        if result is None:
+            await self._trip(action, self.page.evaluate(HELPER_SCRIPT))
+            result = await self._trip(action, self.page.evaluate(HELPER_CALL, [op, list(args)]))
+        return result
+
+    async def probe(self, action: str = "check_page") -> Optional[Dict[str, Any]]:
+        """Returns the page's title, URL and scroll position, or None if the page does not respond."""
         try:
-            await self.page.evaluate("1 + 1")
-            return True
+            return await self._helper(action, "state")
         except Exception as e:
             logger.error(f"Page check failed: {e}")
-            return False
+            return None
+
+    async def check_page(self) -> bool:
+        """Checks if the page is still responsive."""
+        return await self.probe() is not None
 
-    async def wait_for_load(self) -> bool:
-        """Waits for the page to be fully loaded."""
+    async def navigate_to(self, url: str) -> bool:
+        # The new document starts without the page-side auto-scroll loop
+        self._reset_auto_scroll()
         try:
             # Increase timeout to 60 seconds
-            await self.page.wait_for_load_state("networkidle", timeout=60000)
-            await self.page.wait_for_load_state("domcontentloaded", timeout=60000)
+            await self._trip("navigate_to", self.page.goto(url, wait_until="networkidle", timeout=60000))
             return True
         except Exception as e:
-            logger.error(f"Wait for load failed: {e}")
             # If we get a timeout, try to continue anyway
             if "Timeout" in str(e):
                 logger.warning("Continuing despite timeout - page may not be fully loaded")
                 return True
-            return False
-
-    async def navigate_to(self, url: str) -> bool:
-        try:
-            if not await self.check_page():
-                return False
-            await self.page.goto(url)
-            return await self.wait_for_load()
-        except Exception as e:
             logger.error(f"Navigation error: {e}")
             return False
 
     async def go_back(self) -> bool:
+        self._reset_auto_scroll()
         try:
-            if not await self.check_page():
-                return False
-            await self.page.go_back()
+            await self._trip("go_back", self.page.go_back())
             return True
         except Exception as e:
             logger.error(f"Go back error: {e}")
             return False
 
     async def go_forward(self) -> bool:
+        self._reset_auto_scroll()
         try:
-            if not await self.check_page():
-                return False
-            await self.page.go_forward()
+            await self._trip("go_forward", self.page.go_forward())
             return True
         except Exception as e:
             logger.error(f"Go forward error: {e}")
             return False
 
     async def reload(self) -> bool:
+        self._reset_auto_scroll()
         try:
-            if not await self.check_page():
-                return False
-            await self.page.reload()
+            await self._trip("reload", self.page.reload())
             return True
         except Exception as e:
             logger.error(f"Reload error: {e}")
@@ -88,9 +121,7 @@ class BrowserAutomation:
 
     async def scroll_down(self, pixels: int = 100) -> bool:
         try:
-            if not await self.check_page():
-                return False
-            await self.page.evaluate(f"window.scrollBy(0, {pixels})")
+            await self._helper("scroll_down", "scrollBy", pixels)
             return True
         except Exception as e:
             logger.error(f"Scroll down error: {e}")
@@ -98,25 +129,23 @@ class BrowserAutomation:
 
     async def scroll_up(self, pixels: int = 100) -> bool:
         try:
-            if not await self.check_page():
-                return False
-            await self.page.evaluate(f"window.scrollBy(0, -{pixels})")
+            await self._helper("scroll_up", "scrollBy", -pixels)
             return True
         except Exception as e:
             logger.error(f"Scroll up error: {e}")
             return False
 
     async def start_auto_scroll(self, direction: int, speed: float = 1.0) -> str:
+        """Starts scrolling inside the page, or changes the direction and speed of a running scroll.
+
+        The page scrolls itself every animation frame, so no round trips are made
+        while it runs; reaching the top or bottom calls auto_scroll_ended.
+        """
         try:
-            if not await self.check_page():
-                return "failed"
             self.auto_scroll_direction = direction
             self.auto_scroll_speed = max(0.2, min(3.0, speed))
-            
-            if self.auto_scroll_task:
-                self.auto_scroll_task.cancel()
-            
-            self.auto_scroll_task = asyncio.create_task(self._auto_scroll())
+            await self._helper("start_auto_scroll", "autoScroll", direction,
+                               AUTO_SCROLL_PIXELS_PER_SECOND * self.auto_scroll_speed)
             return "done"
         except Exception as e:
             logger.error(f"Start auto-scroll error: {e}")
@@ -124,56 +153,24 @@ class BrowserAutomation:
 
     async def stop_auto_scroll(self) -> str:
         try:
-            if self.auto_scroll_task:
-                self.auto_scroll_task.cancel()
-                self.auto_scroll_task = None
             self.auto_scroll_direction = 0
+            await self._helper("stop_auto_scroll", "stopAutoScroll")
             return "done"
         except Exception as e:
             logger.error(f"Stop auto-scroll error: {e}")
             return "failed"
 
-    async def _auto_scroll(self):
-        while self.auto_scroll_direction != 0:
-            try:
-                # Check if we've reached the page boundaries
-                scroll_position = await self.page.evaluate("""() => {
-                    return {
-                        scrollTop: window.scrollY,
-                        scrollHeight: document.documentElement.scrollHeight,
-                        clientHeight: document.documentElement.clientHeight
-                    };
-                }""")
-                
-                # Stop if we've reached the bottom (scrolling down) or top (scrolling up)
-                if (self.auto_scroll_direction > 0 and 
-                    scroll_position["scrollTop"] + scroll_position["clientHeight"] >= scroll_position["scrollHeight"]):
-                    logger.info("Reached bottom of page, stopping auto-scroll")
-                    self.auto_scroll_direction = 0
-                    return "I've reached the bottom of the page, so I stopped scrolling."
-                elif (self.auto_scroll_direction < 0 and 
-                      scroll_position["scrollTop"] <= 0):
-                    logger.info("Reached top of page, stopping auto-scroll")
-                    self.auto_scroll_direction = 0
-                    return "I've reached the top of the page, so I stopped scrolling."
-                
-                # Continue scrolling if we haven't reached the boundaries
-                pixels = int(10 * self.auto_scroll_speed)
-                await self.page.evaluate(f"window.scrollBy(0, {pixels * self.auto_scroll_direction})")
-                await asyncio.sleep(0.1)
-            except Exception as e:
-                logger.error(f"Auto-scroll error: {e}")
-                break
-        return None
+    def auto_scroll_ended(self, edge: str) -> str:
+        """Handles the page reporting that auto-scroll stopped at its top or bottom."""
+        logger.info(f"Reached {edge} of page, stopping auto-scroll")
+        self.auto_scroll_direction = 0
+        return f"I've reached the {edge} of the page, so I stopped scrolling."
 
     async def click_at(self, x: int, y: int) -> bool:
         try:
-            if not await self.check_page():
-                return False
-            
             # Wait for the page to be stable
-            await self.page.wait_for_load_state("networkidle")
-            await self.page.mouse.click(x, y)
+            await self._trip("click_at", self.page.wait_for_load_state("networkidle"))
+            await self._trip("click_at", self.page.mouse.click(x, y))
             return True
         except Exception as e:
             logger.error(f"Click at coordinates error: {e}")
@@ -181,12 +178,8 @@ class BrowserAutomation:
 
     async def click_by_text(self, text: str) -> bool:
         try:
-            if not await self.check_page():
-                return False
-            
-            # Wait for the element to be visible and clickable
-            await self.page.wait_for_selector(f"text={text}", state="visible", timeout=5000)
-            await self.page.click(f"text={text}")
+            # Waits for the element to be visible and clickable
+            await self._trip("click_by_text", self.page.click(f"text={text}", timeout=5000))
             return True
         except Exception as e:
             logger.error(f"Click by text error: {e}")
@@ -194,17 +187,11 @@ class BrowserAutomation:
 
     async def fill_input(self, selector: str, value: str) -> bool:
         try:
-            if not await self.check_page():
-                return False
-            
-            # Wait for the input to be visible and enabled
-            await self.page.wait_for_selector(selector, state="visible", timeout=5000)
-            
-            # Clear any existing value
-            await self.page.fill(selector, "")
+            # Clear any existing value, once the input is visible and enabled
+            await self._trip("fill_input", self.page.fill(selector, "", timeout=5000))
             
             # Type the new value
-            await self.page.type(selector, value)
+            await self._trip("fill_input", self.page.type(selector, value))
             return True
         except Exception as e:
             logger.error(f"Fill input error: {e}")
@@ -212,12 +199,8 @@ class BrowserAutomation:
 
     async def select_option(self, selector: str, value: str) -> bool:
         try:
-            if not await self.check_page():
-                return False
-            
-            # Wait for the select element to be visible and enabled
-            await self.page.wait_for_selector(selector, state="visible", timeout=5000)
-            await self.page.select_option(selector, value)
+            # Waits for the select element to be visible and enabled
+            await self._trip("select_option", self.page.select_option(selector, value, timeout=5000))
             return True
         except Exception as e:
             logger.error(f"Select option error: {e}")
@@ -225,9 +208,7 @@ class BrowserAutomation:
 
     async def list_input_fields(self) -> List[Dict[str, Any]]:
         try:
-            if not await self.check_page():
-                return []
-            fields = await self.page.evaluate("""() => {
+            fields = await self._trip("list_input_fields", self.page.evaluate("""() => {
                 const inputs = Array.from(document.querySelectorAll('input, select, textarea'));
                 return inputs.map(input => ({
                     type: input.tagName.toLowerCase(),
@@ -237,74 +218,49 @@ class BrowserAutomation:
                     value: input.value || '',
                     label: input.labels ? Array.from(input.labels).map(l => l.textContent).join(', ') : ''
                 }));
-            }""")
+            }"""))
             return fields
         except Exception as e:
             logger.error(f"List input fields error: {e}")
             return []
 
+    async def _extract_content(self, action: str) -> None:
+        """Brings the page's cached content up to date, extracting it again only if the DOM changed."""
+        document_id, version = self.content.known(self.page.url)
+        self.content.update(await self._helper(action, "extract", document_id, version))
+
     async def read_page_content(self) -> str:
+        """Returns the first part of the page content as markdown."""
         try:
-            if not await self.check_page():
-                return ""
-            content = await self.page.evaluate("""() => {
-                const content = [];
-                const elements = document.querySelectorAll('h1, h2, h3, h4, h5, h6, p, li, a');
-                elements.forEach(el => {
-                    const text = el.textContent.trim();
-                    if (text) {
-                        if (el.tagName.startsWith('H')) {
-                            content.push(`#${el.tagName[1]} ${text}`);
-                        } else if (el.tagName === 'A') {
-                            content.push(`[${text}](${el.href})`);
-                        } else {
-                            content.push(text);
-                        }
-                    }
-                });
-                return content.join('\\n\\n');
-            }""")
-            return content
+            await self._extract_content("read_page_content")
+            return self.content.read(0)
         except Exception as e:
             logger.error(f"Read page content error: {e}")
             return ""
 
+    async def read_next_section(self) -> str:
+        """Returns the part of the page content after the one read last."""
+        try:
+            await self._extract_content("read_next_section")
+            return self.content.read()
+        except Exception as e:
+            logger.error(f"Read next section error: {e}")
+            return ""
+
     async def get_page_title(self) -> str:
         try:
-            if not await self.check_page():
-                return ""
-            return await self.page.title()
+            state = await self._helper("get_page_title", "state")
+            return state["title"]
         except Exception as e:
             logger.error(f"Get page title error: {e}")
             return ""
 
     async def scroll_to_section(self, text: str) -> bool:
         try:
-            if not await self.check_page():
-                return False
-
-            section_text = text.lower()
-            
-            selectors = [
-                "h1, h2, h3, h4, h5, h6",
-                "section",
-                "div[id*='section']",
-                "div[class*='section']",
-                "[role='region']", 
-                "div"
-            ]
-            
-            for selector in selectors:
-                elements = self.page.locator(selector).get_by_text(text, exact=False)
-                count = await elements.count()
-                
-                if count > 0:
-                    element = elements.first
-                    await element.evaluate("element => element.scrollIntoView({block: 'start', behavior: 'smooth'})")
-                    await self.page.evaluate("window.scrollBy(0, -50)")
-
-                    await self.page.wait_for_timeout(500)
-                    return True
+            # Finds the section and scrolls it to the top, leaving a margin, in one round trip
+            state = await self._helper("scroll_to_section", "scrollToSection", text, 50)
+            if state["found"]:
+                return True
             
             logger.warning(f"No section {text} not found.")
             return False
@@ -316,14 +272,11 @@ class BrowserAutomation:
     async def press_enter(self) -> bool:
         """Simulates pressing the Enter key."""
         try:
-            if not await self.check_page():
-                return False
-            
             # Wait for the page to be stable
-            await self.page.wait_for_load_state("networkidle")
+            await self._trip("press_enter", self.page.wait_for_load_state("networkidle"))
             
             # Press Enter key
-            await self.page.keyboard.press("Enter")
+            await self._trip("press_enter", self.page.keyboard.press("Enter"))
             return True
         except Exception as e:
             logger.error(f"Press Enter error: {e}")
@@ -331,27 +284,26 @@ class BrowserAutomation:
 
 class BrowserState:
     def __init__(self):
-        self.browser = None
         self.page = None
-        self.playwright = None
         self.is_open = False
         self.screen_source = None
         self.screen_track = None
         self.publication = None
-        self.screenshare_task = None
-        self.last_screenshot = None
-        self.last_url = None
-        self.last_update_time = 0
-        self.last_content_hash = None
+        self.screenshare = None
+        self.capture = ScreenCapture(WIDTH, HEIGHT)
+        self.composer = None
         self.automation = None
         self.pages = []
         self.active_tab_index = 0
         self.context = None
+        self.action_calls: Dict[str, int] = {}
+        self.action_time: Dict[str, float] = {}
+        self.on_notice: Optional[Callable[[str], None]] = None  # Called with messages for the user about events in the page
 
     async def check_and_recover(self) -> bool:
         """Checks if the browser is still responsive and recovers if needed."""
         try:
-            if not self.page or not self.browser:
+            if not self.page or not self.context:
                 return False
             # Try a simple operation to check if the page is still responsive
             await self.page.evaluate("1 + 1")
@@ -360,76 +312,25 @@ class BrowserState:
             logger.error(f"Browser check failed: {e}")
             try:
                 # Try to recover by creating a new page
-                if self.browser:
-                    self.page = await self.browser.new_page()
+                if self.context:
+                    self.page = await self.context.new_page()
                     if self.automation:
                         self.automation.page = self.page
+                    await self.capture.attach(self.page)
                     return True
             except Exception as e:
                 logger.error(f"Browser recovery failed: {e}")
                 return False
         return False
 
-    async def get_screenshot(self):
-        if not self.page:
-            return None
-            
-        try:
-            current_time = time.time()
-            current_url = self.page.url
-            
-            time_since_last = current_time - self.last_update_time
-            if time_since_last < 3 and self.last_screenshot is not None:
-                if time_since_last < 1:
-                    return self.last_screenshot
-            
-            # Check if URL changed (always capture on URL change)
-            url_changed = current_url != self.last_url
-            
-            content_changed = False
-            if not url_changed and self.last_screenshot is not None:
-                try:
-                    sample_screenshot = await self.page.screenshot(type='png', clip={'x': 0, 'y': 0, 'width': 100, 'height': 100})
-                    import hashlib
-                    current_hash = hashlib.md5(sample_screenshot).hexdigest()
-                    if not hasattr(self, 'last_content_hash') or self.last_content_hash is None:
-                        self.last_content_hash = current_hash
-                        content_changed = True
-                    else:
-                        content_changed = current_hash != self.last_content_hash
-                        self.last_content_hash = current_hash
-                except Exception:
-                    content_changed = True
-            
-            if (url_changed or content_changed or 
-                self.last_screenshot is None or 
-                time_since_last >= 3):
-                
-                self.last_screenshot = await self.page.screenshot(type='png')
-                self.last_url = current_url
-                self.last_update_time = current_time
-                
-            return self.last_screenshot
-        except Exception as e:
-            logger.error(f"Error getting screenshot: {e}")
-            # Try to recover the browser
-            if await self.check_and_recover():
-                try:
-                    self.last_screenshot = await self.page.screenshot(type='png')
-                    self.last_url = self.page.url
-                    self.last_update_time = time.time()
-                    return self.last_screenshot
-                except Exception as e:
-                    logger.error(f"Failed to recover screenshot: {e}")
-            return None
-
     async def open_browser(self, room: rtc.Room) -> bool:
         """Opens a browser window and starts screen sharing."""
         if not self.is_open:
             try:
-                self.playwright = await async_playwright().start()
-                self.browser = await self.playwright.chromium.launch(headless=True)
-                self.context = await self.browser.new_context()
+                # Take an isolated context in one of the process's warm browsers
+                self.context = await get_pool().acquire()
+                await self.context.add_init_script(HELPER_SCRIPT)
+                await self.context.expose_binding(AUTO_SCROLL_BINDING, self._on_auto_scroll_ended)
                 
                 self.context.on("page", self._on_new_page)
                 
@@ -439,11 +340,13 @@ class BrowserState:
                 self.pages = [self.page]
                 self.active_tab_index = 0
                 self.is_open = True
-                self.last_update_time = time.time()
                 self.automation = BrowserAutomation(self.page)
                 
                 self._initializing_browser = False
 
+                # Follow the page's repaints from the start so loading shows up
+                await self.capture.attach(self.page)
+
                 # Navigate to default page
                 await self.automation.navigate_to(DEFAULT_URL)
 
@@ -456,10 +359,13 @@ class BrowserState:
                 )
                 logger.info("published track", extra={"track_sid": self.publication.sid})
 
-                # Start screenshare task
-                self.screenshare_task = asyncio.create_task(
-                    self._draw_screenshare(self.screen_source)
-                )
+                # Publish the page whenever it repaints
+                self.composer = FrameComposer(WIDTH, HEIGHT)
+                self.screenshare = VideoScheduler(self.screen_source, self._compose_screenshare,
+                                                  subscribers=lambda: len(room.remote_participants),
+                                                  name="screenshare")
+                self.capture.on_change = self.screenshare.notify
+                self.screenshare.start()
                 return True
             except Exception as e:
                 logger.error(f"Error opening browser: {e}")
@@ -470,14 +376,14 @@ class BrowserState:
         """Closes the browser window and stops screen sharing."""
         if self.is_open:
             try:
-                # Cancel screenshare task first
-                if self.screenshare_task:
-                    self.screenshare_task.cancel()
-                    try:
-                        await self.screenshare_task
-                    except asyncio.CancelledError:
-                        pass
-                    self.screenshare_task = None
+                # Stop screen sharing first
+                if self.screenshare:
+                    await self.screenshare.stop()
+                await self.capture.detach()
+                logger.info(f"Screenshare stats: {self.screenshare_stats()}")
+                logger.info(f"Browser action stats: {self.action_stats()}")
+                if self.automation:
+                    logger.info(f"Page content stats: {self.automation.content.stats()}")
 
                 # Unpublish track
                 if self.publication:
@@ -487,6 +393,8 @@ class BrowserState:
                     self.publication = None
                     self.screen_track = None
                     self.screen_source = None
+                self.capture.on_change = None
+                self.screenshare = None
 
                 if self.pages:
                     for page in self.pages:
@@ -495,59 +403,67 @@ class BrowserState:
                         except Exception as e:
                             logger.error(f"Error closing page: {e}")
 
-                # Close browser context and browser
+                # Hand the context back; the browser stays warm for the next session
                 if self.context:
-                    await self.context.close()
-                if self.browser:
-                    await self.browser.close()
-                if self.playwright:
-                    await self.playwright.stop()
+                    await get_pool().release(self.context)
 
                 # Reset state
-                self.browser = None
                 self.page = None
                 self.context = None
                 self.pages = []
                 self.active_tab_index = 0
-                self.playwright = None
                 self.is_open = False
-                self.last_screenshot = None
-                self.last_url = None
-                self.last_update_time = 0
                 self.automation = None
+                self.action_calls = {}
+                self.action_time = {}
                 return True
             except Exception as e:
                 logger.error(f"Error closing browser: {e}")
                 return False
         return True
 
-    async def _draw_screenshare(self, screen_source):
-        if not self.is_open:
-            return
+    def _compose_screenshare(self):
+        """Renders the latest captured frame for the screenshare scheduler."""
+        if self.capture.frame is None:
+            return None
+        return self.composer.compose(self.capture.frame, self.capture.take_damage())
 
-        while self.is_open:
-            try:
-                await asyncio.sleep(0.1)  # Check frequently for changes
-                
-                # Get cached or new screenshot
-                screenshot = await self.get_screenshot()
-                if screenshot is None:
-                    continue
-                
-                # Convert PNG to RGBA format and pad to fit
-                img = Image.open(io.BytesIO(screenshot))
-                img = img.convert('RGBA')
-                img = ImageOps.pad(img, (WIDTH, HEIGHT), method=Image.Resampling.LANCZOS, color=(0, 0, 0, 0))
-                
-                # Create frame from image data
-                frame = rtc.VideoFrame(WIDTH, HEIGHT, rtc.VideoBufferType.RGBA, img.tobytes())
-                screen_source.capture_frame(frame)
-            except Exception as e:
-                logger.error(f"Error capturing screenshot: {e}")
-                break 
+    def screenshare_stats(self) -> dict:
+        """Returns the capture, composition and publishing counters and per-stage times of the screenshare."""
+        stats = self.capture.stats()
+        if self.composer:
+            stats.update(self.composer.stats())
+        if self.screenshare:
+            stats.update(self.screenshare.stats())
+        return stats
 
     async def perform_action(self, action: str, **kwargs) -> str:
         """Performs a browser action and returns a status message."""
+        start = time.perf_counter()
+        result = await self._perform_action(action, **kwargs)
+
+        # Check if we need to recover the browser
+        if result == "failed" and self.is_open and not await self.check_and_recover():
+            result = "The browser has crashed. Please ask me to reopen the browser."
+
+        self.action_calls[action] = self.action_calls.get(action, 0) + 1
+        self.action_time[action] = self.action_time.get(action, 0.0) + time.perf_counter() - start
+        return result
+
+    def action_stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns the calls, browser round trips and time per call of every action performed."""
+        round_trips = self.automation.round_trips if self.automation else {}
+        stats = {}
+        for action, calls in self.action_calls.items():
+            stats[action] = {
+                "calls": calls,
+                "round_trips": round_trips.get(action, 0),
+                "round_trips_per_call": round_trips.get(action, 0) / calls,
+                "ms_per_call": self.action_time[action] * 1000 / calls,
+            }
+        return stats
+
+    async def _perform_action(self, action: str, **kwargs) -> str:
         if not self.is_open:
             return "Browser is not open. Please open it first."
         
@@ -555,8 +471,6 @@ class BrowserState:
             return "Browser automation is not initialized."
 
         try:
-            success = False
-
             if action == "navigate_to":
                 success = await self.automation.navigate_to(kwargs["url"])
                 return "done" if success else "failed"
@@ -629,9 +543,11 @@ class BrowserState:
             
             elif action == "read_page_content":
                 content = await self.automation.read_page_content()
-                if content:
-                    return f"Page content:\n{content}"
-                return "No content found on the page."
+                return content or "No content found on the page."
+            
+            elif action == "read_next_section":
+                content = await self.automation.read_next_section()
+                return content or "No content found on the page."
             
             elif action == "get_page_title":
                 title = await self.automation.get_page_title()
@@ -671,14 +587,17 @@ class BrowserState:
             else:
                 return f"Unknown action: {action}"
 
-            # Check if we need to recover the browser
-            if not success and not await self.check_and_recover():
-                return "The browser has crashed. Please ask me to reopen the browser."
-
         except Exception as e:
             logger.error(f"Error performing action {action}: {e}")
             return "failed"
 
+    def _on_auto_scroll_ended(self, source, edge: str):
+        """Binding called by a page whose auto-scroll reached its top or bottom."""
+        if self.automation and source["page"] is self.automation.page:
+            message = self.automation.auto_scroll_ended(edge)
+            if self.on_notice:
+                self.on_notice(message)
+
     def _on_new_page(self, page):
         """Handler for when a new page/tab is opened automatically."""
         try:
@@ -692,10 +611,7 @@ class BrowserState:
                 if self.automation:
                     self.automation.page = self.page
                 
-                self.last_screenshot = None
-                self.last_url = None
-                self.last_content_hash = None
-                self.last_update_time = 0
+                asyncio.create_task(self.capture.attach(page))
                 
                 logger.info(f"Automatically switched to new tab {len(self.pages)}")
             else:
@@ -744,10 +660,7 @@ class BrowserState:
             if self.automation:
                 self.automation.page = self.page
             
-            self.last_screenshot = None
-            self.last_url = None
-            self.last_content_hash = None
-            self.last_update_time = 0
+            await self.capture.attach(self.page)
             
             title = await self.page.title()
             return f"Switched to tab {tab_index}: {title}"
@@ -776,10 +689,7 @@ class BrowserState:
             if self.automation:
                 self.automation.page = self.page
             
-            self.last_screenshot = None
-            self.last_url = None
-            self.last_content_hash = None
-            self.last_update_time = 0
+            await self.capture.attach(self.page)
             
             if url:
                 success = await self.automation.navigate_to(url)
@@ -823,10 +733,7 @@ class BrowserState:
                 if self.automation:
                     self.automation.page = self.page
                 
-                self.last_screenshot = None
-                self.last_url = None
-                self.last_content_hash = None
-                self.last_update_time = 0
+                await self.capture.attach(self.page)
                 
             elif zero_based_index < self.active_tab_index:
                 self.active_tab_index -= 1
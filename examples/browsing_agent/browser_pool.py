@@ -0,0 +1,190 @@
+import asyncio
+import logging
+import time
+from typing import Optional, List, Dict, Any
+
+from playwright.async_api import async_playwright, Browser, BrowserContext
+
+logger = logging.getLogger("browser-pool")
+
+MAX_CONTEXTS_PER_BROWSER = 4
+WARM_BROWSERS = 1
+
+class PooledBrowser:
+    """A warm Chromium instance and the sessions it serves."""
+
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.contexts: List[BrowserContext] = []  # Handed out to sessions
+        self.spare: Optional[BrowserContext] = None  # Fresh context ready for the next session
+        self.launched = time.monotonic()
+
+    @property
+    def load(self) -> int:
+        return len(self.contexts) + (1 if self.spare else 0)
+
+class BrowserPool:
+    """Shares warm headless Chromium browsers between the agent sessions of a process.
+
+    Every session gets its own BrowserContext, so cookies, storage and pages
+    are isolated between sessions while the browser process is reused. When a
+    session releases its context it is closed, which drops all of its state,
+    and a fresh spare context is prepared in the background so the next session
+    starts without waiting for one. A browser serves at most
+    max_contexts_per_browser sessions; more sessions launch another browser.
+    Idle browsers beyond warm_browsers are closed.
+    """
+
+    def __init__(self, max_contexts_per_browser: int = MAX_CONTEXTS_PER_BROWSER,
+                 warm_browsers: int = WARM_BROWSERS, headless: bool = True,
+                 context_options: Dict[str, Any] = None):
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.warm_browsers = warm_browsers
+        self.headless = headless
+        self.context_options = context_options or {}
+        self.playwright = None
+        self.browsers: List[PooledBrowser] = []
+        self._lock = asyncio.Lock()
+        self._warming = set()
+        self.acquired = 0
+        self.browser_hits = 0  # Sessions served by an already running browser
+        self.context_hits = 0  # Sessions served by a spare context
+        self.launches = 0
+        self.launch_time = 0.0
+        self.acquire_time = 0.0
+        self.released = 0
+
+    async def warm(self) -> None:
+        """Launch warm_browsers browsers with a spare context each, ahead of the first session."""
+        async with self._lock:
+            try:
+                while len(self.browsers) < self.warm_browsers:
+                    await self._launch()
+                for pooled in self.browsers:
+                    await self._prepare_spare(pooled)
+            except Exception as e:
+                logger.error(f"Error warming browser pool: {e}")
+
+    async def acquire(self) -> BrowserContext:
+        """Return a fresh, isolated BrowserContext for a session."""
+        start = time.perf_counter()
+        async with self._lock:
+            self._drop_disconnected()
+            pooled = min((b for b in self.browsers if len(b.contexts) < self.max_contexts_per_browser),
+                         key=lambda b: len(b.contexts), default=None)
+            if pooled is None:
+                pooled = await self._launch()
+            else:
+                self.browser_hits += 1
+
+            if pooled.spare is not None:
+                context, pooled.spare = pooled.spare, None
+                self.context_hits += 1
+            else:
+                context = await pooled.browser.new_context(**self.context_options)
+            pooled.contexts.append(context)
+            self.acquired += 1
+        self.acquire_time += time.perf_counter() - start
+        logger.info(f"Acquired browser context in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return context
+
+    async def release(self, context: BrowserContext) -> None:
+        """Close a session's context, dropping its state, and keep its browser warm for the next one."""
+        try:
+            await context.close()
+        except Exception as e:
+            logger.debug(f"Error closing browser context: {e}")
+
+        async with self._lock:
+            self.released += 1
+            pooled = next((b for b in self.browsers if context in b.contexts), None)
+            if pooled is None:
+                return
+            pooled.contexts.remove(context)
+            self._drop_disconnected()
+
+            # Close browsers nobody uses, beyond the ones kept warm
+            idle = [b for b in self.browsers if not b.contexts]
+            if pooled in idle and len(idle) > self.warm_browsers:
+                await self._close(pooled)
+                return
+        self._warm_spare(pooled)
+
+    def _warm_spare(self, pooled: PooledBrowser) -> None:
+        task = asyncio.create_task(self._locked_prepare_spare(pooled))
+        self._warming.add(task)
+        task.add_done_callback(self._warming.discard)
+
+    async def _locked_prepare_spare(self, pooled: PooledBrowser) -> None:
+        async with self._lock:
+            if pooled in self.browsers:
+                await self._prepare_spare(pooled)
+
+    async def _prepare_spare(self, pooled: PooledBrowser) -> None:
+        if pooled.spare is not None or pooled.load >= self.max_contexts_per_browser:
+            return
+        try:
+            pooled.spare = await pooled.browser.new_context(**self.context_options)
+        except Exception as e:
+            logger.warning(f"Error preparing spare browser context: {e}")
+
+    async def _launch(self) -> PooledBrowser:
+        start = time.perf_counter()
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        browser = await self.playwright.chromium.launch(headless=self.headless)
+        pooled = PooledBrowser(browser)
+        browser.on("disconnected", lambda _: logger.warning("Pooled browser disconnected"))
+        self.browsers.append(pooled)
+        self.launches += 1
+        self.launch_time += time.perf_counter() - start
+        logger.info(f"Launched browser {self.launches} in {(time.perf_counter() - start) * 1000:.0f} ms")
+        return pooled
+
+    def _drop_disconnected(self) -> None:
+        """Forget browsers that crashed or were closed, so they are relaunched on demand."""
+        for pooled in [b for b in self.browsers if not b.browser.is_connected()]:
+            logger.warning(f"Dropping disconnected browser serving {len(pooled.contexts)} sessions")
+            self.browsers.remove(pooled)
+
+    async def _close(self, pooled: PooledBrowser) -> None:
+        self.browsers.remove(pooled)
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.debug(f"Error closing browser: {e}")
+
+    async def close(self) -> None:
+        """Close every browser and stop Playwright."""
+        for task in list(self._warming):
+            task.cancel()
+        async with self._lock:
+            for pooled in list(self.browsers):
+                await self._close(pooled)
+            if self.playwright:
+                await self.playwright.stop()
+                self.playwright = None
+        logger.info(f"Browser pool stats: {self.stats()}")
+
+    def stats(self) -> dict:
+        return {
+            "browsers": len(self.browsers),
+            "sessions": sum(len(b.contexts) for b in self.browsers),
+            "spare_contexts": sum(1 for b in self.browsers if b.spare),
+            "acquired": self.acquired,
+            "released": self.released,
+            "browser_hits": self.browser_hits,
+            "context_hits": self.context_hits,
+            "launches": self.launches,
+            "launch_ms": self.launch_time * 1000,
+            "acquire_ms": self.acquire_time * 1000,
+        }
+
+_pool: Optional[BrowserPool] = None
+
+def get_pool() -> BrowserPool:
+    """Return the process-wide browser pool."""
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool()
+    return _pool
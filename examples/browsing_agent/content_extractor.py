@@ -0,0 +1,147 @@
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger("content-extractor")
+
+TOKEN_BUDGET = 1500  # Tokens of page content per part read to the LLM
+CHARS_PER_TOKEN = 4  # Rough size of a token of English text
+CACHE_SIZE = 16  # Pages kept split into parts
+
+class PageContent:
+    """A page's text split into parts that each fit the token budget."""
+
+    def __init__(self, url: str, title: str, parts: List[str], sections: List[List[str]]):
+        self.url = url
+        self.title = title
+        self.parts = parts
+        self.sections = sections  # Headings that start in each part
+
+class ContentExtractor:
+    """Turns the blocks extracted by the page helper into cached, budgeted parts to read one at a time.
+
+    A page is cached under its document id and DOM version, so reading it again
+    while nothing changed costs one round trip and no extraction. Its blocks are
+    grouped into sections at each heading and packed into parts of at most
+    token_budget tokens; a section longer than that is split between blocks.
+    Blocks repeated on the page are dropped, as is nav, header and footer text
+    already read on another page of the session.
+    """
+
+    def __init__(self, token_budget: int = TOKEN_BUDGET, cache_size: int = CACHE_SIZE):
+        self.token_budget = token_budget
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, int], PageContent]" = OrderedDict()
+        self._keys: Dict[str, Tuple[str, int]] = {}  # Latest key read for every URL
+        self._boilerplate: Dict[str, str] = {}  # Nav/footer line -> URL it was first read on
+        self.current: Optional[PageContent] = None
+        self.position = -1  # Index of the part read last
+        self.hits = 0
+        self.misses = 0
+        self.parts_read = 0
+        self.blocks_dropped = 0
+
+    def known(self, url: str) -> Tuple[Optional[str], Optional[int]]:
+        """Return the document id and DOM version cached for url, to send along with the extraction."""
+        key = self._keys.get(url)
+        return key if key in self._cache else (None, None)
+
+    def update(self, result: Dict[str, Any]) -> PageContent:
+        """Return the content for an extraction result, from the cache if the page did not change."""
+        key = (result["documentId"], result["version"])
+        content = self._cache.get(key) if result.get("unchanged") else None
+        if content is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+        else:
+            self.misses += 1
+            content = self._split(result["url"], result["title"], self._dedupe(result["url"], result["blocks"]))
+            self._cache[key] = content
+            logger.info(f"Split {content.url} into {len(content.parts)} parts")
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self._keys[result["url"]] = key
+        if self.current is None or content.url != self.current.url:
+            # Another page: paging starts over; a changed page keeps its place
+            self.position = -1
+        self.current = content
+        return content
+
+    def _dedupe(self, url: str, blocks: List[list]) -> List[Tuple[int, str]]:
+        seen = set()
+        kept = []
+        for level, line, boilerplate in blocks:
+            if line in seen:
+                self.blocks_dropped += 1
+                continue
+            seen.add(line)
+            if boilerplate:
+                first_url = self._boilerplate.setdefault(line, url)
+                if first_url != url:
+                    self.blocks_dropped += 1
+                    continue
+            kept.append((level, line))
+        return kept
+
+    def _split(self, url: str, title: str, blocks: List[Tuple[int, str]]) -> PageContent:
+        budget = self.token_budget * CHARS_PER_TOKEN
+        sections = []
+        for level, line in blocks:
+            if level or not sections:
+                sections.append([])
+            sections[-1].append((level, line[:budget]))
+
+        parts, headings = [[]], [[]]
+        size = 0
+        for section in sections:
+            length = sum(len(line) + 2 for _, line in section)
+            # Start a section that does not fit on a new part, so a heading stays with its text
+            if parts[-1] and size + length > budget:
+                parts.append([])
+                headings.append([])
+                size = 0
+            for level, line in section:
+                if parts[-1] and size + len(line) + 2 > budget:
+                    parts.append([])
+                    headings.append([])
+                    size = 0
+                parts[-1].append(line)
+                if level:
+                    headings[-1].append(line.lstrip("# "))
+                size += len(line) + 2
+        if not parts[-1]:
+            parts, headings = [], []
+        return PageContent(url, title, ["\n\n".join(part) for part in parts], headings)
+
+    def read(self, index: int = None) -> str:
+        """Return part index of the current page (by default the one after the last read),
+        with a note on what is left to read."""
+        if index is None:
+            index = self.position + 1
+        content = self.current
+        if content is None or not content.parts:
+            return "No content found on the page."
+        if index >= len(content.parts):
+            return f"That was the end of {content.title or 'the page'}; there are no more sections."
+        self.position = index
+        self.parts_read += 1
+        total = len(content.parts)
+        header = f"Page content of {content.title or content.url}"
+        if total > 1:
+            header += f" (part {index + 1} of {total})"
+        text = f"{header}:\n{content.parts[index]}"
+        if index + 1 < total:
+            upcoming = ", ".join(content.sections[index + 1][:5])
+            text += (f"\n\n[{total - index - 1} more part(s)"
+                     + (f", next covering: {upcoming}" if upcoming else "")
+                     + ". Use read next section to continue.]")
+        return text
+
+    def stats(self) -> dict:
+        return {
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cached_pages": len(self._cache),
+            "parts_read": self.parts_read,
+            "blocks_dropped": self.blocks_dropped,
+        }
@@ -19,6 +19,7 @@ from livekit.plugins import openai, silero, deepgram
 from livekit.agents.llm import function_tool
 
 from browser_manager import BrowserState
+from browser_pool import get_pool
 from agent_camera import AgentCamera
 
 load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
@@ -29,6 +30,8 @@ logger.setLevel(logging.INFO)
 class SimpleAgent(Agent):
     def __init__(self, room: rtc.Room, voice: str) -> None:
         self.browser_state = BrowserState()
+        # Tell the user about things that happen in the page on its own, like auto-scroll reaching the end
+        self.browser_state.on_notice = lambda message: asyncio.create_task(self._send_message(message))
         self.room = room
         self.participant_names = {}
         self._update_participant_names()
@@ -79,7 +82,8 @@ class SimpleAgent(Agent):
                 - "press enter": Presses the Enter key
 
                 Content Reading:
-                - "read page": Gets the page content as markdown
+                - "read page": Gets the first part of the page content as markdown
+                - "read next section": Continues reading the page content where the last part ended
                 - "get title": Gets the page title
                 - "scroll to [text]": Scrolls to a section containing the text
 
@@ -245,9 +249,14 @@ class SimpleAgent(Agent):
 
     @function_tool()
     async def read_page_content(self) -> str:
-        """Gets the page content as formatted markdown."""
+        """Gets the first part of the page content as formatted markdown. Long pages are split into parts."""
         return await self.browser_state.perform_action("read_page_content")
 
+    @function_tool()
+    async def read_next_section(self) -> str:
+        """Gets the next part of the page content, after the part read last."""
+        return await self.browser_state.perform_action("read_next_section")
+
     @function_tool()
     async def get_page_title(self) -> str:
         """Gets the current page title."""
@@ -350,7 +359,8 @@ Interaction:
 - "press enter": Presses the Enter key
 
 Content Reading:
-- "read page": Gets the page content as markdown
+- "read page": Gets the first part of the page content as markdown
+- "read next section": Continues reading the page content where the last part ended
 - "get title": Gets the page title
 - "scroll to [text]": Scrolls to a section containing the text
 
@@ -378,6 +388,8 @@ class JobState:
         self.agent_camera = AgentCamera(str(image_path))
         
         self._cleanup_handlers = []
+        self._warm_task = None
+        self._stopped = False
 
     def _select_agent_config(self) -> Tuple[str, str]:
         """Randomly select between female/sage and male/ash configurations."""
@@ -388,6 +400,9 @@ class JobState:
         return random.choice(configs)
 
     async def start(self):
+        # Warm up the shared browser pool so "open browser" does not wait for a launch
+        self._warm_task = asyncio.create_task(get_pool().warm())
+
         # Start agent session
         await self.session.start(
             agent=self.agent,
@@ -401,6 +416,11 @@ class JobState:
         self._cleanup_handlers.append(self._cleanup_multiprocessing)
 
     async def stop(self):
+        # Runs on cancellation and as the job's shutdown callback, whichever comes first
+        if self._stopped:
+            return
+        self._stopped = True
+
         # Stop agent camera
         await self.agent_camera.stop(self.room)
 
@@ -415,6 +435,27 @@ class JobState:
             except Exception as e:
                 logger.error(f"Error in cleanup handler: {e}")
 
+        await self._close_browser_pool()
+
+    async def _close_browser_pool(self):
+        """Stop warming the shared browser pool and close it once no session uses it."""
+        if self._warm_task:
+            self._warm_task.cancel()
+            try:
+                await self._warm_task
+            except asyncio.CancelledError:
+                pass
+        pool = get_pool()
+        # Other jobs running in this process may still have browsers open
+        sessions = pool.stats()["sessions"]
+        if sessions:
+            logger.info(f"Keeping browser pool open for {sessions} other sessions")
+            return
+        try:
+            await pool.close()
+        except Exception as e:
+            logger.error(f"Error closing browser pool: {e}")
+
     async def _cleanup_multiprocessing(self):
         """Clean up any lingering multiprocessing resources."""
         import multiprocessing
@@ -430,6 +471,7 @@ async def entrypoint(ctx: JobContext):
     
     # Create job state
     job_state = JobState(ctx.room)
+    ctx.add_shutdown_callback(job_state.stop)
     
     try:
         # Start the job
@@ -0,0 +1,153 @@
+import json
+
+# Elements searched for a section's text, in order of preference
+SECTION_SELECTORS = [
+    "h1, h2, h3, h4, h5, h6",
+    "section",
+    "div[id*='section']",
+    "div[class*='section']",
+    "[role='region']",
+    "div",
+]
+
+# Landmarks whose text tends to repeat on every page of a site
+BOILERPLATE_SELECTOR = "nav, header, footer, aside, [role='navigation'], [role='banner'], [role='contentinfo']"
+
+# Page binding the auto-scroll loop calls with "top" or "bottom" when it reaches that end of the page
+AUTO_SCROLL_BINDING = "__agentAutoScrollEnded"
+
+# Defines window.__agentHelper, which answers BrowserAutomation's questions in one evaluate call.
+# It is added as an init script of the browser context, so every document has it before its own scripts run.
+HELPER_SCRIPT = """(() => {
+    if (window.__agentHelper) return;
+
+    const SECTION_SELECTORS = %s;
+    const BOILERPLATE_SELECTOR = %s;
+    const AUTO_SCROLL_BINDING = %s;
+    const BLOCK_SELECTOR = 'h1, h2, h3, h4, h5, h6, p, li';
+    const collapse = text => (text || '').replace(/\\s+/g, ' ').trim();
+    const normalize = text => collapse(text).toLowerCase();
+
+    // The DOM version counts mutations, so unchanged content can be served from a cache
+    const documentId = Math.random().toString(36).slice(2);
+    let version = 0;
+    let observer = null;
+    const domVersion = () => {
+        if (!observer && document.documentElement) {
+            observer = new MutationObserver(() => { version++; });
+            observer.observe(document.documentElement, {childList: true, subtree: true, characterData: true});
+        }
+        return version;
+    };
+
+    const state = () => ({
+        alive: true,
+        documentId,
+        version: domVersion(),
+        url: location.href,
+        title: document.title,
+        readyState: document.readyState,
+        scrollY: window.scrollY,
+        scrollHeight: document.documentElement.scrollHeight,
+        clientHeight: document.documentElement.clientHeight,
+    });
+
+    const findSection = text => {
+        const query = normalize(text);
+        for (const selector of SECTION_SELECTORS) {
+            let found = null;
+            for (const element of document.querySelectorAll(selector)) {
+                if (!normalize(element.textContent).includes(query)) continue;
+                // Matches come in document order, so descend to the innermost one
+                if (found === null || found.contains(element)) found = element;
+                else break;
+            }
+            if (found) return found;
+        }
+        return null;
+    };
+
+    // Scrolls a little every animation frame, in proportion to the time since the last frame
+    let autoScroll = null;
+    const autoScrollFrame = now => {
+        if (!autoScroll) return;
+        // Cap the step so a throttled frame does not jump
+        const elapsed = autoScroll.last === null ? 0 : Math.min(now - autoScroll.last, 100);
+        autoScroll.last = now;
+        autoScroll.carry += autoScroll.direction * autoScroll.pixelsPerSecond * elapsed / 1000;
+        const pixels = Math.trunc(autoScroll.carry);
+        if (pixels) {
+            window.scrollBy({top: pixels, behavior: 'instant'});
+            autoScroll.carry -= pixels;
+        }
+        const root = document.documentElement;
+        let edge = null;
+        if (autoScroll.direction > 0 && window.scrollY + root.clientHeight >= root.scrollHeight - 1) edge = 'bottom';
+        if (autoScroll.direction < 0 && window.scrollY <= 0) edge = 'top';
+        if (edge) {
+            autoScroll = null;
+            if (window[AUTO_SCROLL_BINDING]) window[AUTO_SCROLL_BINDING](edge);
+            return;
+        }
+        requestAnimationFrame(autoScrollFrame);
+    };
+
+    window.__agentHelper = {
+        state,
+        scrollBy: pixels => {
+            window.scrollBy(0, pixels);
+            return state();
+        },
+        scrollToSection: (text, margin) => {
+            const element = findSection(text);
+            if (element) {
+                const top = element.getBoundingClientRect().top + window.scrollY - margin;
+                window.scrollTo({top: Math.max(0, top), behavior: 'smooth'});
+            }
+            return {...state(), found: element !== null};
+        },
+        autoScroll: (direction, pixelsPerSecond) => {
+            // Starts scrolling, or changes the direction and speed of a running scroll
+            const running = autoScroll !== null;
+            autoScroll = {last: null, carry: 0, ...autoScroll, direction, pixelsPerSecond};
+            if (!running) requestAnimationFrame(autoScrollFrame);
+            return state();
+        },
+        stopAutoScroll: () => {
+            autoScroll = null;
+            return state();
+        },
+        extract: (knownId, knownVersion) => {
+            // Returns [heading level or 0, markdown, inside nav/footer] for every block of text
+            const current = state();
+            if (knownId === documentId && knownVersion === current.version) {
+                return {...current, unchanged: true};
+            }
+            const blocks = [];
+            for (const element of document.querySelectorAll(BLOCK_SELECTOR + ', a')) {
+                const text = collapse(element.textContent);
+                if (!text) continue;
+                let line = text;
+                let level = 0;
+                if (element.tagName === 'A') {
+                    // Links inside a block are already part of its text
+                    if (element.parentElement && element.parentElement.closest(BLOCK_SELECTOR)) continue;
+                    line = `[${text}](${element.href})`;
+                } else if (/^H[1-6]$/.test(element.tagName)) {
+                    level = Number(element.tagName[1]);
+                    line = `${'#'.repeat(level)} ${text}`;
+                } else {
+                    const links = element.querySelectorAll('a');
+                    if (links.length === 1 && collapse(links[0].textContent) === text) {
+                        line = `[${text}](${links[0].href})`;
+                    }
+                }
+                blocks.push([level, line, element.closest(BOILERPLATE_SELECTOR) !== null]);
+            }
+            return {...current, blocks};
+        },
+    };
+})()""" % (json.dumps(SECTION_SELECTORS), json.dumps(BOILERPLATE_SELECTOR), json.dumps(AUTO_SCROLL_BINDING))
+
+# Runs one helper operation; evaluates to undefined (None) in documents without the helper
+HELPER_CALL = "([op, args]) => window.__agentHelper ? window.__agentHelper[op](...args) : undefined"
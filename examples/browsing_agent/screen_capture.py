@@ -0,0 +1,256 @@
+import asyncio
+import base64
+import io
+import logging
+import time
+from typing import Optional, List, Tuple
+
+import numpy as np
+from PIL import Image
+from playwright.async_api import Page
+from livekit import rtc
+
+logger = logging.getLogger("screen-capture")
+
+TILE_SIZE = 32
+FALLBACK_INTERVAL = 0.5  # Seconds between screenshots when the screencast is unavailable
+
+class TileDiff:
+    """Finds the tiles of an RGBA frame that differ from the previous frame.
+
+    Each frame is compared pixel by pixel with the one before it (as one uint32
+    per pixel) and the differences are reduced to a grid of tile_size tiles, so
+    a blinking cursor marks one tile dirty instead of the whole page.
+    """
+
+    def __init__(self, tile_size: int = TILE_SIZE):
+        self.tile_size = tile_size
+        self.previous = None
+
+    def update(self, frame: np.ndarray) -> List[Tuple[int, int, int, int]]:
+        """Return the (x, y, width, height) of every changed tile, merged into runs along each row."""
+        height, width = frame.shape[:2]
+        previous, self.previous = self.previous, frame
+        if previous is None or previous.shape != frame.shape:
+            return [(0, 0, width, height)]
+
+        t = self.tile_size
+        changed = frame.view(np.uint32)[..., 0] != previous.view(np.uint32)[..., 0]
+        rows, cols = -(-height // t), -(-width // t)
+        if rows * t != height or cols * t != width:
+            changed = np.pad(changed, ((0, rows * t - height), (0, cols * t - width)))
+        tiles = changed.reshape(rows, t, cols, t).any(axis=(1, 3))
+
+        regions = []
+        for row in np.flatnonzero(tiles.any(axis=1)).tolist():
+            y = row * t
+            h = min(t, height - y)
+            dirty = np.flatnonzero(tiles[row]).tolist()
+            # Merge adjacent dirty tiles of the row into one region
+            start = prev = dirty[0]
+            for col in dirty[1:] + [None]:
+                if col is not None and col == prev + 1:
+                    prev = col
+                    continue
+                x = start * t
+                regions.append((x, y, min((prev + 1) * t, width) - x, h))
+                if col is not None:
+                    start = prev = col
+        return regions
+
+class ScreenCapture:
+    """Keeps an up-to-date RGBA copy of what a page shows, tracking the regions that changed.
+
+    Uses the Chrome DevTools screencast: Chrome sends a frame, already scaled
+    to fit max_width x max_height, only when the page repaints. Pages without a
+    CDP session fall back to periodic JPEG screenshots, decoded at reduced size
+    and box-reduced to fit.
+    Frames identical to the previous one, byte for byte or after decoding, do
+    not count as a change; otherwise the changed tiles are added to the damage
+    and on_change is called, so updates are seen within one frame interval.
+    Damage that outgrows the tile grid while nobody takes it collapses into
+    one full-frame region.
+    """
+
+    def __init__(self, max_width: int, max_height: int, tile_size: int = TILE_SIZE,
+                 image_format: str = "jpeg", quality: int = 80,
+                 fallback_interval: float = FALLBACK_INTERVAL):
+        self.max_width = max_width
+        self.max_height = max_height
+        self.image_format = image_format
+        self.quality = quality
+        self.fallback_interval = fallback_interval
+        self.diff = TileDiff(tile_size)
+        self.frame: Optional[np.ndarray] = None
+        self.version = 0
+        self.damage: List[Tuple[int, int, int, int]] = []
+        self.page = None
+        self._cdp = None
+        self._fallback_task = None
+        self._last_data = None
+        self.on_change = None  # Called after every frame that changed
+        self.frames_received = 0
+        self.frames_unchanged = 0
+        self.regions_changed = 0
+        self.decode_time = 0.0
+        self.diff_time = 0.0
+
+    async def attach(self, page: Page) -> None:
+        """Start following page, replacing the page followed so far."""
+        await self.detach()
+        self.page = page
+        self.diff.previous = None
+        self._last_data = None
+        try:
+            self._cdp = await page.context.new_cdp_session(page)
+            self._cdp.on("Page.screencastFrame", self._on_screencast_frame)
+            await self._cdp.send("Page.startScreencast", {
+                "format": self.image_format,
+                "quality": self.quality,
+                "maxWidth": self.max_width,
+                "maxHeight": self.max_height,
+            })
+            logger.info("Started screencast capture")
+        except Exception as e:
+            logger.warning(f"Screencast unavailable, falling back to periodic screenshots: {e}")
+            self._cdp = None
+            self._fallback_task = asyncio.create_task(self._capture_periodically())
+
+    async def detach(self) -> None:
+        """Stop following the current page."""
+        if self._fallback_task:
+            self._fallback_task.cancel()
+            try:
+                await self._fallback_task
+            except asyncio.CancelledError:
+                pass
+            self._fallback_task = None
+        if self._cdp:
+            try:
+                await self._cdp.send("Page.stopScreencast")
+                await self._cdp.detach()
+            except Exception as e:
+                logger.debug(f"Error stopping screencast: {e}")
+            self._cdp = None
+        self.page = None
+
+    async def _on_screencast_frame(self, params: dict) -> None:
+        cdp = self._cdp
+        try:
+            self._process(base64.b64decode(params["data"]))
+        except Exception as e:
+            logger.error(f"Error processing screencast frame: {e}")
+        finally:
+            # Chrome sends the next frame only once this one is acknowledged
+            if cdp is not None and cdp is self._cdp:
+                try:
+                    await cdp.send("Page.screencastFrameAck", {"sessionId": params["sessionId"]})
+                except Exception as e:
+                    logger.debug(f"Error acknowledging screencast frame: {e}")
+
+    async def _capture_periodically(self) -> None:
+        while True:
+            try:
+                self._process(await self.page.screenshot(type="jpeg", quality=self.quality))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error capturing screenshot: {e}")
+            await asyncio.sleep(self.fallback_interval)
+
+    def _process(self, data: bytes) -> None:
+        """Decode an encoded frame and record which tiles changed."""
+        self.frames_received += 1
+        if data == self._last_data:
+            self.frames_unchanged += 1
+            return
+        self._last_data = data
+
+        start = time.perf_counter()
+        img = Image.open(io.BytesIO(data))
+        if img.width > self.max_width or img.height > self.max_height:
+            # Let the JPEG decoder skip detail we would scale away anyway, then box-reduce by
+            # a whole factor, which is far cheaper than a filtered resize
+            img.draft("RGB", (self.max_width, self.max_height))
+            factor = max(-(-img.width // self.max_width), -(-img.height // self.max_height))
+            if factor > 1:
+                img = img.reduce(factor)
+        frame = np.asarray(img.convert("RGBA"))
+        decoded = time.perf_counter()
+        self.decode_time += decoded - start
+
+        regions = self.diff.update(frame)
+        self.diff_time += time.perf_counter() - decoded
+        if not regions:
+            self.frames_unchanged += 1
+            return
+        self.frame = frame
+        self.damage.extend(regions)
+        height, width = frame.shape[:2]
+        t = self.diff.tile_size
+        if len(self.damage) > -(-height // t) * -(-width // t):
+            # Nobody took the damage for a while; it cannot cover more than the whole frame
+            self.damage = [(0, 0, width, height)]
+        self.regions_changed += len(regions)
+        self.version += 1
+        if self.on_change:
+            self.on_change()
+
+    def take_damage(self) -> List[Tuple[int, int, int, int]]:
+        """Return the regions changed since the last call and reset them."""
+        damage, self.damage = self.damage, []
+        return damage
+
+    def stats(self) -> dict:
+        return {
+            "source": "screencast" if self._cdp else "screenshots",
+            "frames_received": self.frames_received,
+            "frames_unchanged": self.frames_unchanged,
+            "frames_changed": self.version,
+            "regions_changed": self.regions_changed,
+            "decode_ms": self.decode_time * 1000,
+            "diff_ms": self.diff_time * 1000,
+        }
+
+class FrameComposer:
+    """Composes captured frames into one preallocated, letterboxed RGBA VideoFrame.
+
+    The canvas is a numpy view of the VideoFrame's own buffer, so only the
+    damaged regions are copied into it and nothing is allocated per frame.
+    Captured frames never exceed the canvas, so composing needs no resize; the
+    same VideoFrame can be published again while nothing changes.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.frame = rtc.VideoFrame(width, height, rtc.VideoBufferType.RGBA, bytearray(width * height * 4))
+        self.canvas = np.frombuffer(self.frame.data, dtype=np.uint8).reshape(height, width, 4)
+        self._shape = None
+        self.frames_composed = 0
+        self.regions_composed = 0
+        self.compose_time = 0.0
+
+    def compose(self, source: np.ndarray, damage: List[Tuple[int, int, int, int]]) -> rtc.VideoFrame:
+        """Copy the damaged regions of source into the canvas, centered, and return the frame."""
+        start = time.perf_counter()
+        height, width = source.shape[:2]
+        top, left = (self.height - height) // 2, (self.width - width) // 2
+        if source.shape != self._shape:
+            # New size: redraw everything, including the letterbox
+            self.canvas.fill(0)
+            damage = [(0, 0, width, height)]
+            self._shape = source.shape
+        for x, y, w, h in damage:
+            self.canvas[top + y:top + y + h, left + x:left + x + w] = source[y:y + h, x:x + w]
+        self.frames_composed += 1
+        self.regions_composed += len(damage)
+        self.compose_time += time.perf_counter() - start
+        return self.frame
+
+    def stats(self) -> dict:
+        return {
+            "frames_composed": self.frames_composed,
+            "regions_composed": self.regions_composed,
+            "compose_ms": self.compose_time * 1000,
+        }
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import time
+from typing import Callable, Optional
+
+from livekit import rtc
+
+logger = logging.getLogger("video-scheduler")
+
+class VideoScheduler:
+    """Publishes a video track's frames only when its content changes, plus a slow keep-alive.
+
+    Producers call notify() when the content changes; the next publish then
+    calls render() for a fresh VideoFrame. Otherwise the last frame is sent
+    again every 1 / keepalive_fps seconds, so static content is never
+    re-rendered and reuses a single frame buffer. The frame rate adapts to the
+    measured cost of rendering and publishing, to keep it within budget (a
+    fraction of each frame interval), capped at max_fps. While subscribers()
+    reports nobody else in the room, nothing is published at all; the count
+    only gates publishing on or off, since the SFU forwards one published
+    stream to any number of viewers and the cost here does not grow with them.
+    """
+
+    def __init__(self, source: rtc.VideoSource, render: Callable[[], Optional[rtc.VideoFrame]],
+                 max_fps: float = 15.0, keepalive_fps: float = 1.0, budget: float = 0.25,
+                 subscribers: Callable[[], int] = None, name: str = "video"):
+        self.source = source
+        self.render = render
+        self.max_fps = max_fps
+        self.keepalive_fps = keepalive_fps
+        self.budget = budget
+        self.subscribers = subscribers
+        self.name = name
+        self.fps = max_fps
+        self.frame = None
+        self._dirty = True
+        self._changed = asyncio.Event()
+        self._cost = None  # Moving average of seconds spent rendering and publishing one frame
+        self._last_publish = 0.0
+        self._task = None
+        self.frames_rendered = 0
+        self.frames_published = 0
+        self.keepalives = 0
+        self.idle_ticks = 0
+        self.render_time = 0.0
+        self.publish_time = 0.0
+
+    def notify(self) -> None:
+        """Mark the content as changed."""
+        self._dirty = True
+        self._changed.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            logger.info(f"{self.name} stats: {self.stats()}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await asyncio.wait_for(self._changed.wait(), 1 / self.keepalive_fps)
+            except asyncio.TimeoutError:
+                pass
+            self._changed.clear()
+            if self.subscribers is not None and self.subscribers() == 0:
+                # Nobody to watch; render once someone joins
+                self.idle_ticks += 1
+                continue
+
+            # Never faster than the current frame rate; changes made meanwhile are picked up by this frame
+            delay = self._last_publish + 1 / self.fps - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                self._changed.clear()
+
+            try:
+                start = time.perf_counter()
+                if self._dirty or self.frame is None:
+                    self._dirty = False
+                    frame = self.render()
+                    if frame is not None:
+                        self.frame = frame
+                        self.frames_rendered += 1
+                else:
+                    self.keepalives += 1
+                rendered = time.perf_counter()
+                if self.frame is None:
+                    continue
+                self.source.capture_frame(self.frame)
+                end = time.perf_counter()
+            except Exception as e:
+                logger.error(f"Error publishing {self.name} frame: {e}")
+                continue
+
+            self._last_publish = loop.time()
+            self.frames_published += 1
+            self.render_time += rendered - start
+            self.publish_time += end - rendered
+            cost = end - start
+            self._cost = cost if self._cost is None else 0.8 * self._cost + 0.2 * cost
+            self.fps = min(self.max_fps, max(self.keepalive_fps, self.budget / max(self._cost, 1e-6)))
+
+    def stats(self) -> dict:
+        return {
+            "fps": self.fps,
+            "frames_rendered": self.frames_rendered,
+            "frames_published": self.frames_published,
+            "keepalives": self.keepalives,
+            "idle_ticks": self.idle_ticks,
+            "render_ms": self.render_time * 1000,
+            "publish_ms": self.publish_time * 1000,
+        }
@@ -3,16 +3,38 @@ import logging
 from signal import SIGINT, SIGTERM
 import os
 import argparse
+from functools import partial
 
 from livekit import rtc
 from test_script import TestScript
 from room_handlers import setup_room_handlers
 from room_manager import run_room, cleanup
+from audio_utils import SYNTHESIZERS, create_synthesizer, set_synthesizer
+from audio_sinks import SINKS, create_sink
+from loopback import add_loopback_arguments, transport_from_args
+from shared_state import default_state
+from playback_manager import DEFAULT_MAX_STREAMS
+from instrumentation import add_instrumentation_arguments, instrumentation_from_args
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Publish audio to a LiveKit room')
     parser.add_argument('--room', default='my-room', help='Name of the LiveKit room to join')
     parser.add_argument('--test', help='Name of the test to run (without .json extension)')
+    parser.add_argument('--report', help='Write a JSON latency report for the test to this file')
+    parser.add_argument('--tts', choices=SYNTHESIZERS, default=os.getenv('TTS_BACKEND', 'gtts'),
+                        help='Speech backend for tts steps and console input')
+    parser.add_argument('--phrase-dir', default=os.getenv('TTS_PHRASE_DIR'),
+                        help='Directory of pre-rendered phrases for the phrases backend')
+    parser.add_argument('--sink', choices=SINKS, default='device',
+                        help='Where received agent audio goes (device plays it locally)')
+    parser.add_argument('--sink-dir', default='recordings', help='Output directory for wav/raw sinks')
+    parser.add_argument('--sink-decimation', type=int, default=1,
+                        help='Divide the 48 kHz sample rate of stored audio by this factor')
+    parser.add_argument('--jitter-ms', type=int, default=60, help='Jitter buffer depth of the device sink')
+    parser.add_argument('--max-streams', type=int, default=DEFAULT_MAX_STREAMS,
+                        help='Maximum number of received audio tracks played at once')
+    add_loopback_arguments(parser)
+    add_instrumentation_arguments(parser)
     args = parser.parse_args()
 
     logging.basicConfig(
@@ -20,10 +42,21 @@ if __name__ == "__main__":
         handlers=[logging.FileHandler("publish_wave.log"), logging.StreamHandler()],
     )
 
+    try:
+        set_synthesizer(create_synthesizer(args.tts, args.phrase_dir))
+    except ValueError as e:
+        logging.error(f"Failed to set up TTS backend: {e}")
+        os._exit(1)
+
     # Create a new event loop
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
-    room = rtc.Room(loop=loop)
+    default_state.rtc = transport_from_args(args)
+    default_state.playback.max_streams = args.max_streams
+    default_state.instrumentation = instrumentation_from_args(args)
+    if default_state.instrumentation:
+        default_state.instrumentation.watch(default_state)
+    room = default_state.rtc.Room(loop=loop)
 
     # Load test script if provided
     script = None
@@ -33,22 +66,27 @@ if __name__ == "__main__":
             if not os.path.exists(script_path):
                 logging.error(f"Test script not found: {script_path}")
                 os._exit(1)
-            script = TestScript(script_path, room)
+            script = TestScript(script_path, room, report_path=args.report)
             logging.info(f"Loaded test script: {args.test}")
         except Exception as e:
             logging.error(f"Failed to load script: {e}")
             os._exit(1)
 
     # Set up room handlers
-    setup_room_handlers(room, script)
+    sink_factory = partial(create_sink, args.sink, output_dir=args.sink_dir,
+                           decimation=args.sink_decimation, jitter_ms=args.jitter_ms)
+    setup_room_handlers(room, script, sink_factory)
 
     async def main():
         """Main function to run the agent driver."""
         try:
-            await run_room(room, args.room, script)
-            # Keep the main task running until cleanup is called
-            while True:
-                await asyncio.sleep(1)
+            if default_state.instrumentation:
+                default_state.instrumentation.start()
+            success = await run_room(room, args.room, script)
+            if default_state.instrumentation:
+                await default_state.instrumentation.stop()
+            # Exit with the test result (or connection failure) so callers can check it
+            os._exit(0 if success else 1)
         except asyncio.CancelledError:
             logging.info("Main task cancelled")
             os._exit(0)
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import os
+import re
+import wave
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+import numpy as np
+
+from audio_utils import SAMPLE_RATE, NUM_CHANNELS, AudioRingBuffer, PolyphaseResampler
+
+SINKS = ("device", "wav", "raw", "memory", "null")
+
+class AudioSink:
+    """Destination for audio received from a remote participant.
+
+    play_audio_stream calls open() once, write() with every received mono
+    48 kHz int16 frame, and aclose() when the stream ends or is cancelled.
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self.frames_received = 0
+        self.samples_received = 0
+
+    def open(self) -> None:
+        pass
+
+    def write(self, samples: np.ndarray) -> None:
+        self.frames_received += 1
+        self.samples_received += len(samples)
+
+    async def aclose(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        """Return the sink counters."""
+        return {
+            "sink": self.name,
+            "frames_received": self.frames_received,
+            "seconds_received": self.samples_received / SAMPLE_RATE,
+        }
+
+class NullSink(AudioSink):
+    """Discards audio, only counting what was received."""
+
+    name = "null"
+
+class _DecimatingSink(AudioSink, ABC):
+    """Base for sinks that store audio, optionally reduced to SAMPLE_RATE // decimation."""
+
+    def __init__(self, decimation: int = 1):
+        super().__init__()
+        self.decimation = decimation
+        self.sample_rate = SAMPLE_RATE // decimation
+        self._resampler = PolyphaseResampler(SAMPLE_RATE, self.sample_rate) if decimation > 1 else None
+
+    def write(self, samples: np.ndarray) -> None:
+        super().write(samples)
+        if self._resampler is not None:
+            samples = self._resampler.process(samples)
+        if len(samples):
+            self._store(samples)
+
+    async def aclose(self) -> None:
+        if self._resampler is not None:
+            tail = self._resampler.flush(np.int16)
+            if len(tail):
+                self._store(tail)
+
+    @abstractmethod
+    def _store(self, samples: np.ndarray) -> None:
+        """Keep a block of (decimated) samples."""
+
+class WavFileSink(_DecimatingSink):
+    """Writes received audio to a WAV file."""
+
+    name = "wav"
+
+    def __init__(self, path: str, decimation: int = 1):
+        super().__init__(decimation)
+        self.path = path
+        self._wav = None
+
+    def open(self) -> None:
+        self._wav = wave.open(self.path, 'wb')
+        self._wav.setnchannels(NUM_CHANNELS)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(self.sample_rate)
+        logging.info("Recording received audio to %s", self.path)
+
+    def _store(self, samples: np.ndarray) -> None:
+        self._wav.writeframes(samples.tobytes())
+
+    async def aclose(self) -> None:
+        await super().aclose()
+        if self._wav:
+            self._wav.close()
+            self._wav = None
+
+class RawFileSink(_DecimatingSink):
+    """Writes received audio to a headerless int16 PCM file."""
+
+    name = "raw"
+
+    def __init__(self, path: str, decimation: int = 1):
+        super().__init__(decimation)
+        self.path = path
+        self._file = None
+
+    def open(self) -> None:
+        self._file = open(self.path, 'wb')
+        logging.info("Recording received audio (%d Hz raw int16) to %s", self.sample_rate, self.path)
+
+    def _store(self, samples: np.ndarray) -> None:
+        self._file.write(samples.tobytes())
+
+    async def aclose(self) -> None:
+        await super().aclose()
+        if self._file:
+            self._file.close()
+            self._file = None
+
+class MemorySink(_DecimatingSink):
+    """Keeps received audio in memory, up to max_seconds of the most recent audio if given."""
+
+    name = "memory"
+
+    def __init__(self, decimation: int = 1, max_seconds: float = None):
+        super().__init__(decimation)
+        self.max_samples = int(max_seconds * self.sample_rate) if max_seconds else None
+        self._chunks = []
+        self._buffered = 0
+
+    def _store(self, samples: np.ndarray) -> None:
+        self._chunks.append(samples.copy())
+        self._buffered += len(samples)
+        while self.max_samples and self._buffered - len(self._chunks[0]) >= self.max_samples:
+            self._buffered -= len(self._chunks.pop(0))
+
+    def samples(self) -> np.ndarray:
+        """Return everything buffered so far as one int16 array."""
+        if not self._chunks:
+            return np.zeros(0, dtype=np.int16)
+        return np.concatenate(self._chunks)
+
+@lru_cache(maxsize=None)
+def _output_devices() -> tuple[int, tuple]:
+    """Query (and log, once per process) the default and available output devices."""
+    import sounddevice as sd
+
+    devices = sd.query_devices()
+    default_output = sd.default.device[1]
+    logging.info("Default audio output device: %s", devices[default_output]['name'])
+    logging.info("Available audio devices:")
+    for i, device in enumerate(devices):
+        logging.info("%d: %s", i, device['name'])
+    outputs = tuple((i, device['name']) for i, device in enumerate(devices)
+                    if device['max_output_channels'] > 0)
+    return default_output, outputs
+
+class SoundDeviceSink(AudioSink):
+    """Plays received audio on a local output device through an AudioRingBuffer."""
+
+    name = "device"
+
+    def __init__(self, jitter_ms: int = 60):
+        super().__init__()
+        self.ring = AudioRingBuffer(capacity=SAMPLE_RATE, target_depth=SAMPLE_RATE * jitter_ms // 1000)
+        self._stream = None
+
+    def open(self) -> None:
+        import sounddevice as sd
+
+        default_output, outputs = _output_devices()
+        # Try the default output device first, then anything else that can play audio
+        candidates = [(default_output, "default")] + [output for output in outputs if output[0] != default_output]
+        for device, name in candidates:
+            try:
+                self._stream = sd.OutputStream(
+                    samplerate=SAMPLE_RATE,
+                    channels=1,
+                    callback=self._callback,
+                    device=device,
+                    blocksize=480,  # Match the frame size we're receiving
+                    dtype=np.float32,  # Use float32 for internal processing
+                    finished_callback=lambda: logging.info("Audio output stream finished")
+                )
+                self._stream.start()
+                logging.info("Audio output stream started successfully on device %d: %s", device, name)
+                return
+            except Exception as e:
+                logging.error("Failed to use device %d (%s): %s", device, name, e)
+        raise RuntimeError("No working audio output devices found")
+
+    def _callback(self, outdata, frames, time, status):
+        if status:
+            logging.warning('Audio callback status: %s', status)
+        try:
+            self.ring.read_into(outdata[:, 0])
+        except Exception as e:
+            logging.error("Error in audio callback: %s", e)
+            outdata.fill(0)
+
+    def write(self, samples: np.ndarray) -> None:
+        super().write(samples)
+        self.ring.write(samples)
+
+    async def aclose(self) -> None:
+        if self._stream is None:
+            return
+        try:
+            # Let whatever is still buffered play out
+            while self.ring.depth > 0 and self._stream.active:
+                await asyncio.sleep(0.01)
+        finally:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+
+    def stats(self) -> dict:
+        return {**super().stats(), **self.ring.stats()}
+
+def create_sink(kind: str = "device", name: str = "stream", output_dir: str = ".",
+                decimation: int = 1, jitter_ms: int = 60) -> AudioSink:
+    """Create a sink by kind; file sinks are named after name inside output_dir."""
+    if kind == "device":
+        return SoundDeviceSink(jitter_ms)
+    if kind == "null":
+        return NullSink()
+    if kind == "memory":
+        return MemorySink(decimation)
+    if kind in ("wav", "raw"):
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, re.sub(r'[^\w.-]+', '_', name) + '.' + kind)
+        return WavFileSink(path, decimation) if kind == "wav" else RawFileSink(path, decimation)
+    raise ValueError(f"Unknown sink: {kind}")
@@ -1,257 +1,945 @@
 import os
+import re
+import mmap
+import time
 import wave
-import tempfile
+import asyncio
 import subprocess
+from abc import ABC, abstractmethod
+from collections import deque
+from functools import lru_cache
+from math import gcd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from gtts import gTTS
 from livekit import rtc
+from tts_cache import TTSCache, get_tts_cache
 
 SAMPLE_RATE = 48000
 NUM_CHANNELS = 1
 
+# Polyphase resampler settings
+RESAMPLE_ZERO_CROSSINGS = 16  # Sinc zero crossings on each side of the filter centre
+RESAMPLE_ROLLOFF = 0.94  # Passband edge as a fraction of the output Nyquist frequency
+RESAMPLE_KAISER_BETA = 8.0
+RESAMPLE_BLOCK_SIZE = 48000  # Input samples processed per block
+
+@lru_cache(maxsize=None)
+def polyphase_filter_bank(src_rate: int, dst_rate: int) -> tuple[int, int, np.ndarray, int]:
+    """Build (and cache) the polyphase filter bank for a src_rate -> dst_rate conversion.
+
+    Returns (up, down, bank, delay) where bank[p] holds the time-reversed taps of
+    phase p and delay is the filter group delay in upsampled samples.
+    """
+    g = gcd(src_rate, dst_rate)
+    up, down = dst_rate // g, src_rate // g
+
+    # Windowed-sinc low-pass at the lower of the two Nyquist frequencies
+    num_taps = 2 * RESAMPLE_ZERO_CROSSINGS * max(up, down) + 1
+    cutoff = RESAMPLE_ROLLOFF * 0.5 / max(up, down)
+    t = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * t) * np.kaiser(num_taps, RESAMPLE_KAISER_BETA)
+    taps *= up / taps.sum()  # Unity DC gain after zero-stuffing
+
+    # Split into `up` phases of equal length, reversed so each phase is a plain dot product
+    taps_per_phase = -(-num_taps // up)
+    padded = np.zeros(taps_per_phase * up)
+    padded[:num_taps] = taps
+    bank = np.ascontiguousarray(padded.reshape(taps_per_phase, up).T[:, ::-1], dtype=np.float32)
+    bank.setflags(write=False)
+    return up, down, bank, (num_taps - 1) // 2
+
+class PolyphaseResampler:
+    """Streaming rational (up/down) resampler using a cached polyphase filter bank.
+
+    Feed blocks of int16 or float32 samples to process() and call flush() after the
+    last block; the output dtype matches the input dtype.
+    """
+
+    def __init__(self, src_rate: int, dst_rate: int):
+        self.src_rate = src_rate
+        self.dst_rate = dst_rate
+        self.up, self.down, self.bank, self.delay = polyphase_filter_bank(src_rate, dst_rate)
+        self.reset()
+
+    def reset(self) -> None:
+        """Discard any buffered input and start a new stream."""
+        taps_per_phase = self.bank.shape[1]
+        self._history = np.zeros(taps_per_phase - 1, dtype=np.float32)
+        self._history_start = -(taps_per_phase - 1)  # Absolute input index of _history[0]
+        self._next_output = 0
+        self._consumed = 0
+
+    def output_length(self, input_length: int) -> int:
+        """Number of output samples produced for input_length input samples."""
+        return -(-input_length * self.up // self.down)
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Resample one block of mono samples, returning every output sample that is ready."""
+        self._consumed += len(block)
+        buf = np.concatenate((self._history, block.astype(np.float32, copy=False)))
+        return self._to_dtype(self._run(buf), block.dtype)
+
+    def flush(self, dtype=np.int16) -> np.ndarray:
+        """Return the remaining output samples once the input has ended."""
+        end = self.output_length(self._consumed)
+        if end <= self._next_output:
+            return np.zeros(0, dtype=dtype)
+        last_needed = ((end - 1) * self.down + self.delay) // self.up
+        available = self._history_start + len(self._history) - 1
+        buf = np.concatenate((self._history, np.zeros(max(0, last_needed - available), dtype=np.float32)))
+        return self._to_dtype(self._run(buf), dtype)
+
+    def _run(self, buf: np.ndarray) -> np.ndarray:
+        up, down, bank, delay = self.up, self.down, self.bank, self.delay
+        taps_per_phase = bank.shape[1]
+        last = self._history_start + len(buf) - 1
+
+        # Outputs whose newest input sample is already buffered, capped at the input length
+        ready = max(0, (last * up + up - 1 - delay) // down + 1)
+        end = min(ready, self.output_length(self._consumed))
+        count = end - self._next_output
+
+        out = np.empty(max(count, 0), dtype=np.float32)
+        if count > 0:
+            windows = sliding_window_view(buf, taps_per_phase)
+            # Outputs n and n + up share a phase and are `down` input samples apart, so
+            # each phase is a single strided matrix-vector product over the block
+            for j in range(min(up, count)):
+                pos = (self._next_output + j) * down + delay
+                start = pos // up - (taps_per_phase - 1) - self._history_start
+                n = len(range(j, count, up))
+                out[j::up] = windows[start:start + down * (n - 1) + 1:down] @ bank[pos % up]
+            self._next_output = end
+
+        # Keep only the input still needed by the next output sample
+        keep_from = ((self._next_output * down + delay) // up - (taps_per_phase - 1)) - self._history_start
+        keep_from = min(max(keep_from, 0), len(buf))
+        self._history = buf[keep_from:].copy()
+        self._history_start += keep_from
+        return out
+
+    @staticmethod
+    def _to_dtype(samples: np.ndarray, dtype) -> np.ndarray:
+        if np.dtype(dtype) == np.int16:
+            np.rint(samples, out=samples)
+            np.clip(samples, -32768, 32767, out=samples)
+            return samples.astype(np.int16)
+        return samples
+
+def resample(samples: np.ndarray, src_rate: int, dst_rate: int,
+             block_size: int = RESAMPLE_BLOCK_SIZE) -> np.ndarray:
+    """Resample a whole mono signal block-wise with the polyphase resampler."""
+    if src_rate == dst_rate:
+        return samples
+    resampler = PolyphaseResampler(src_rate, dst_rate)
+    out = np.empty(resampler.output_length(len(samples)), dtype=samples.dtype)
+    position = 0
+    for start in range(0, len(samples), block_size):
+        chunk = resampler.process(samples[start:start + block_size])
+        out[position:position + len(chunk)] = chunk
+        position += len(chunk)
+    tail = resampler.flush(samples.dtype)
+    out[position:position + len(tail)] = tail
+    return out
+
+def resample_linear(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Resample with linear interpolation (the original path, kept for benchmarking)."""
+    x = np.arange(len(samples))
+    x_new = np.linspace(0, len(samples) - 1, int(len(samples) * dst_rate / src_rate))
+    return np.interp(x_new, x, samples).astype(samples.dtype)
+
+def downmix(samples: np.ndarray, n_channels: int) -> np.ndarray:
+    """Convert interleaved int16 samples to mono by averaging channels."""
+    if n_channels == 1:
+        return samples
+    return samples.reshape(-1, n_channels).mean(axis=1).astype(np.int16)
+
 def read_wav_file(file_path: str) -> tuple[np.ndarray, int]:
     """Read a WAV file and return its data as a numpy array and sample rate."""
     with wave.open(file_path, 'rb') as wav_file:
         # Get WAV file parameters
         n_channels = wav_file.getnchannels()
-        sampwidth = wav_file.getsampwidth()
         framerate = wav_file.getframerate()
         n_frames = wav_file.getnframes()
-        
-        # Read the WAV data
-        wav_data = wav_file.readframes(n_frames)
-        wav_array = np.frombuffer(wav_data, dtype=np.int16)
-        
-        # Reshape if stereo
-        if n_channels == 2:
-            wav_array = wav_array.reshape(-1, 2)
-            # Convert to mono by averaging channels
-            wav_array = wav_array.mean(axis=1).astype(np.int16)
-        
-        # Resample if necessary (simple linear interpolation)
-        if framerate != SAMPLE_RATE:
-            x = np.arange(len(wav_array))
-            x_new = np.linspace(0, len(wav_array) - 1, int(len(wav_array) * SAMPLE_RATE / framerate))
-            wav_array = np.interp(x_new, x, wav_array).astype(np.int16)
-        
-        return wav_array, SAMPLE_RATE
-
-async def play_wav(source: rtc.AudioSource, wav_filename: str) -> None:
-    """Play a WAV file from the local file system."""
-    import logging
-    logging.info("Playing WAV: %s", wav_filename)
-    wav_data, _ = read_wav_file(wav_filename)
-    samples_per_channel = 480  # 10ms at 48kHz
-    audio_frame = rtc.AudioFrame.create(SAMPLE_RATE, NUM_CHANNELS, samples_per_channel)
-    audio_data = np.frombuffer(audio_frame.data, dtype=np.int16)
-    
-    position = 0
-    while position < len(wav_data):
-        # Get next chunk of audio data
-        chunk = wav_data[position:position + samples_per_channel]
-        
-        # If we're at the end, pad with silence if needed
-        if len(chunk) < samples_per_channel:
-            # Pad the remaining space with silence
-            padded_chunk = np.zeros(samples_per_channel, dtype=np.int16)
-            padded_chunk[:len(chunk)] = chunk
-            np.copyto(audio_data, padded_chunk)
+
+        if framerate == SAMPLE_RATE:
+            wav_data = wav_file.readframes(n_frames)
+            return downmix(np.frombuffer(wav_data, dtype=np.int16), n_channels), SAMPLE_RATE
+
+        # Resample block-wise into a preallocated output so only one block of
+        # intermediate data is alive at a time
+        resampler = PolyphaseResampler(framerate, SAMPLE_RATE)
+        wav_array = np.empty(resampler.output_length(n_frames), dtype=np.int16)
+        position = 0
+        while True:
+            wav_data = wav_file.readframes(RESAMPLE_BLOCK_SIZE)
+            if not wav_data:
+                break
+            chunk = resampler.process(downmix(np.frombuffer(wav_data, dtype=np.int16), n_channels))
+            wav_array[position:position + len(chunk)] = chunk
+            position += len(chunk)
+        tail = resampler.flush(np.int16)
+        wav_array[position:position + len(tail)] = tail
+        return wav_array[:position + len(tail)], SAMPLE_RATE
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+RELEASE_INTERVAL = 1 << 20  # Bytes of played PCM between releasing mapped pages
+
+def parse_wav_header(buf) -> tuple[int, int, int, int]:
+    """Locate the PCM data chunk of a 16-bit WAV file.
+
+    Returns (n_channels, framerate, data_offset, data_length) in bytes.
+    """
+    if len(buf) < 12 or bytes(buf[0:4]) != b'RIFF' or bytes(buf[8:12]) != b'WAVE':
+        raise wave.Error("file does not start with RIFF/WAVE header")
+
+    fmt = None
+    offset = 12
+    while offset + 8 <= len(buf):
+        chunk_id = bytes(buf[offset:offset + 4])
+        chunk_size = int.from_bytes(buf[offset + 4:offset + 8], 'little')
+        body = offset + 8
+        if chunk_id == b'fmt ':
+            audio_format = int.from_bytes(buf[body:body + 2], 'little')
+            n_channels = int.from_bytes(buf[body + 2:body + 4], 'little')
+            framerate = int.from_bytes(buf[body + 4:body + 8], 'little')
+            bits = int.from_bytes(buf[body + 14:body + 16], 'little')
+            if audio_format not in (WAVE_FORMAT_PCM, WAVE_FORMAT_EXTENSIBLE) or bits != 16:
+                raise wave.Error(f"unsupported WAV format {audio_format} with {bits} bits per sample")
+            fmt = (n_channels, framerate)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise wave.Error("data chunk found before fmt chunk")
+            # Some writers leave the size unset when streaming, so clamp it to the file
+            data_length = min(chunk_size, len(buf) - body)
+            data_length -= data_length % (2 * fmt[0])
+            return fmt[0], fmt[1], body, data_length
+        offset = body + chunk_size + (chunk_size & 1)  # Chunks are word aligned
+    raise wave.Error("no data chunk found")
+
+def iter_wav_frames(file_path: str, samples_per_channel: int = 480):
+    """Lazily yield mono 48 kHz int16 frames from a memory-mapped WAV file.
+
+    Only the pages being played are touched, and stereo downmix and resampling
+    happen one frame at a time, so memory use does not depend on the file length.
+    The yielded array is a reused buffer that is only valid until the next frame
+    is requested; the final frame may be shorter than samples_per_channel.
+    """
+    return _iter_mapped_frames(file_path, samples_per_channel, parse_wav_header)
+
+def iter_pcm_frames(file_path: str, samples_per_channel: int = 480):
+    """Lazily yield frames from a memory-mapped raw mono 48 kHz int16 PCM file."""
+    return _iter_mapped_frames(file_path, samples_per_channel,
+                               lambda mm: (NUM_CHANNELS, SAMPLE_RATE, 0, len(mm) - len(mm) % 2))
+
+def _iter_mapped_frames(file_path: str, samples_per_channel: int, parse_header):
+    with open(file_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            n_channels, framerate, data_offset, data_length = parse_header(mm)
+            pcm = np.frombuffer(mm, dtype=np.int16, count=data_length // 2, offset=data_offset)
+            try:
+                yield from _iter_pcm_frames(pcm.reshape(-1, n_channels), framerate, samples_per_channel,
+                                            lambda played: _release_pages(mm, data_offset, played * 2 * n_channels))
+            finally:
+                # The mmap cannot be closed while numpy still references it
+                del pcm
+
+def _release_pages(mm: mmap.mmap, data_offset: int, played_bytes: int) -> None:
+    """Drop already-played pages of a mapping from the resident set."""
+    end = (data_offset + played_bytes) // mmap.PAGESIZE * mmap.PAGESIZE
+    if hasattr(mmap, 'MADV_DONTNEED') and end > 0:
+        mm.madvise(mmap.MADV_DONTNEED, 0, end)
+
+def _iter_pcm_frames(frames: np.ndarray, framerate: int, samples_per_channel: int, on_progress=None):
+    """Yield mono 48 kHz frames from an (n, channels) int16 array, converting one frame at a time."""
+    n_channels = frames.shape[1]
+    # Input samples that produce roughly one output frame
+    step = max(1, samples_per_channel * framerate // SAMPLE_RATE)
+    resampler = PolyphaseResampler(framerate, SAMPLE_RATE) if framerate != SAMPLE_RATE else None
+    mono = np.empty(step, dtype=np.int16)
+    scratch = np.empty(step, dtype=np.float32)
+    frame = np.empty(samples_per_channel, dtype=np.int16)
+    filled = 0
+    released = 0
+
+    def fill(samples: np.ndarray):
+        """Copy samples into the frame buffer, yielding it every time it becomes full."""
+        nonlocal filled
+        position = 0
+        while position < len(samples):
+            n = min(samples_per_channel - filled, len(samples) - position)
+            frame[filled:filled + n] = samples[position:position + n]
+            position += n
+            filled += n
+            if filled == samples_per_channel:
+                filled = 0
+                yield frame
+
+    for position in range(0, len(frames), step):
+        block = frames[position:position + step]
+        if n_channels == 1:
+            samples = block[:, 0]
         else:
-            np.copyto(audio_data, chunk)
-            
-        await source.capture_frame(audio_frame)
-        position += samples_per_channel
-    
+            n = len(block)
+            np.mean(block, axis=1, out=scratch[:n])
+            np.copyto(mono[:n], scratch[:n], casting='unsafe')
+            samples = mono[:n]
+        if resampler is not None:
+            samples = resampler.process(samples)
+        # Always copy into our own buffer so no view of the source escapes to the caller
+        yield from fill(samples)
+
+        if on_progress and position - released >= RELEASE_INTERVAL // (2 * n_channels):
+            on_progress(position)
+            released = position
+
+    if resampler is not None:
+        yield from fill(resampler.flush(np.int16))
+    if filled:
+        yield frame[:filled]
+
+class FramePump:
+    """Pushes int16 audio into an AudioSource through a ring of preallocated AudioFrames.
+
+    Samples are copied straight into the frame buffers (through strided per-channel
+    views) and padding/silence is zero-filled in place, so pushing a frame does not
+    allocate. The ring lets the next frame be written while the previous one may
+    still be referenced by capture_frame.
+    """
+
+    def __init__(self, source: rtc.AudioSource, samples_per_channel: int = 480, ring_size: int = 4,
+                 sample_rate: int = SAMPLE_RATE, num_channels: int = NUM_CHANNELS):
+        self.source = source
+        self.samples_per_channel = samples_per_channel
+        self.frames = [rtc.AudioFrame.create(sample_rate, num_channels, samples_per_channel)
+                       for _ in range(ring_size)]
+        self._buffers = [np.frombuffer(frame.data, dtype=np.int16).reshape(samples_per_channel, num_channels)
+                         for frame in self.frames]
+        self._zeroed = [False] * ring_size
+        self._slot = 0
+        self.frames_pushed = 0
+        self.silence_frames = 0
+        self.copies_made = 0
+        self.blocked_time = 0.0
+
+    async def push(self, samples: np.ndarray) -> None:
+        """Send up to samples_per_channel mono samples, padding the rest of the frame with silence."""
+        buf = self._buffers[self._slot]
+        n = len(samples)
+        for channel in range(buf.shape[1]):
+            np.copyto(buf[:n, channel], samples)
+            self.copies_made += 1
+        if n < self.samples_per_channel:
+            buf[n:].fill(0)
+        self._zeroed[self._slot] = False
+        await self._capture()
+
+    async def push_silence(self, count: int = 1) -> None:
+        """Send count frames of silence."""
+        for _ in range(count):
+            if not self._zeroed[self._slot]:
+                self._buffers[self._slot].fill(0)
+                self._zeroed[self._slot] = True
+            self.silence_frames += 1
+            await self._capture()
+
+    async def _capture(self) -> None:
+        frame = self.frames[self._slot]
+        self._slot = (self._slot + 1) % len(self.frames)
+        start = time.perf_counter()
+        await self.source.capture_frame(frame)
+        self.blocked_time += time.perf_counter() - start
+        self.frames_pushed += 1
+
+    def stats(self) -> dict:
+        """Return the pump counters."""
+        return {
+            "frames_pushed": self.frames_pushed,
+            "silence_frames": self.silence_frames,
+            "copies_made": self.copies_made,
+            "blocked_time": self.blocked_time,
+        }
+
+async def play_frames(source: rtc.AudioSource, chunks, pump: FramePump = None) -> None:
+    """Push a (sync or async) iterable of int16 sample chunks into source, followed by a short silence."""
+    import logging
+    if pump is None:
+        pump = FramePump(source)
+    if hasattr(chunks, '__aiter__'):
+        async for chunk in chunks:
+            await pump.push(chunk)
+    else:
+        for chunk in chunks:
+            await pump.push(chunk)
+
     # Send a few frames of silence to ensure clean ending
-    for _ in range(3):
-        np.copyto(audio_data, np.zeros(samples_per_channel, dtype=np.int16))
-        await source.capture_frame(audio_frame)
-
-async def play_string(source: rtc.AudioSource, text: str, lang: str = 'en') -> None:
-    """Play a string of text as speech."""
-    # Create temporary files for both MP3 and WAV
-    with tempfile.NamedTemporaryFile(suffix='.mp3', delete=False) as temp_mp3, \
-         tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_wav:
-        temp_mp3_filename = temp_mp3.name
-        temp_wav_filename = temp_wav.name
-    
-    try:
-        # Generate speech using gTTS
-        import logging
-        logging.info("TTS: %s", text)
-        tts = gTTS(text=text, lang=lang)
-        tts.save(temp_mp3_filename)
-        
-        # Convert MP3 to WAV using ffmpeg with suppressed output
-        subprocess.run([
-            'ffmpeg', '-y',  # Overwrite output file without asking
+    await pump.push_silence(3)
+    logging.debug("Frame pump stats: %s", pump.stats())
+
+async def play_wav(source: rtc.AudioSource, wav_filename: str, streaming: bool = True,
+                   pump: FramePump = None) -> None:
+    """Play a WAV file from the local file system.
+
+    By default the file is streamed from a memory map; pass streaming=False to
+    decode the whole file up front. Pass a FramePump to reuse its frames and
+    counters across calls.
+    """
+    import logging
+    logging.info("Playing WAV: %s", wav_filename)
+    samples_per_channel = pump.samples_per_channel if pump else 480  # 10ms at 48kHz
+    if streaming:
+        chunks = iter_wav_frames(wav_filename, samples_per_channel)
+    else:
+        wav_data, _ = read_wav_file(wav_filename)
+        chunks = (wav_data[position:position + samples_per_channel]
+                  for position in range(0, len(wav_data), samples_per_channel))
+    await play_frames(source, chunks, pump)
+
+def _iter_chunks(samples: np.ndarray, samples_per_channel: int):
+    for position in range(0, len(samples), samples_per_channel):
+        yield samples[position:position + samples_per_channel]
+
+class Synthesizer(ABC):
+    """Interface for the speech backends used by play_string.
+
+    synthesize() is an async generator of mono 48 kHz int16 frames of at most
+    samples_per_channel samples. Backends that are slow or remote set cacheable so
+    their output is stored in the TTS cache.
+    """
+
+    name = "base"
+    cacheable = False
+
+    @abstractmethod
+    async def synthesize(self, text: str, lang: str = 'en', samples_per_channel: int = 480):
+        """Yield the speech for text as frames of at most samples_per_channel samples."""
+
+class GTTSSynthesizer(Synthesizer):
+    """Google Translate TTS, decoded through an ffmpeg pipe while it downloads."""
+
+    name = "gtts"
+    cacheable = True
+
+    async def synthesize(self, text: str, lang: str = 'en', samples_per_channel: int = 480):
+        frame_bytes = samples_per_channel * NUM_CHANNELS * 2
+        process = await asyncio.create_subprocess_exec(
+            'ffmpeg',
             '-loglevel', 'error',  # Only show errors
-            '-i', temp_mp3_filename,
+            '-f', 'mp3', '-i', 'pipe:0',
+            '-f', 's16le',
             '-acodec', 'pcm_s16le',
             '-ar', str(SAMPLE_RATE),
             '-ac', str(NUM_CHANNELS),
-            temp_wav_filename
-        ], check=True)
-        
-        # Play the converted WAV file
-        await play_wav(source, temp_wav_filename)
-    finally:
-        # Clean up the temporary files
-        os.unlink(temp_mp3_filename)
-        os.unlink(temp_wav_filename)
-
-async def play_audio_stream(audio_stream: rtc.AudioStream, _) -> None:
-    """Play an audio stream from a LiveKit participant."""
+            'pipe:1',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+        )
+        feeder = asyncio.create_task(self._feed_mp3(process.stdin, text, lang))
+        try:
+            while True:
+                try:
+                    data = await process.stdout.readexactly(frame_bytes)
+                except asyncio.IncompleteReadError as e:
+                    data = e.partial
+                if data:
+                    yield np.frombuffer(data, dtype=np.int16)
+                if len(data) < frame_bytes:
+                    break
+            await feeder  # Surface download errors
+            if await process.wait() != 0:
+                raise subprocess.CalledProcessError(process.returncode, 'ffmpeg')
+        finally:
+            if not feeder.done():
+                feeder.cancel()
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+    @staticmethod
+    async def _feed_mp3(stdin: asyncio.StreamWriter, text: str, lang: str) -> None:
+        """Download MP3 from gTTS part by part (in a worker thread) and write it to the decoder."""
+        loop = asyncio.get_running_loop()
+        parts = gTTS(text=text, lang=lang).stream()
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, parts, None)
+                if chunk is None:
+                    break
+                stdin.write(chunk)
+                await stdin.drain()
+        finally:
+            stdin.close()
+
+# Formant frequencies and bandwidths (Hz) used by the formant synthesizer
+VOWEL_FORMANTS = {
+    'a': ((730, 90), (1090, 110), (2440, 170)),
+    'e': ((530, 60), (1840, 100), (2480, 120)),
+    'i': ((270, 60), (2290, 100), (3010, 120)),
+    'o': ((570, 70), (840, 80), (2410, 160)),
+    'u': ((300, 60), (870, 90), (2240, 150)),
+}
+NASAL_FORMANTS = ((250, 60), (2000, 200), (2700, 250))
+VOICED_CONSONANTS = "bdgjlmnrvwz"
+PLOSIVES = "ptkcq"
+FRICATIVES = "fhsx"
+
+class FormantSynthesizer(Synthesizer):
+    """Deterministic, in-process formant synthesizer for offline tests.
+
+    Each character is rendered once as a short unit (vowels and voiced consonants
+    as formant wave trains, unvoiced consonants as seeded noise) and cached, so an
+    utterance is just a concatenation of cached units. It is not intelligible
+    speech, but it has speech-like energy and timing and needs no network. The
+    language is ignored.
+    """
+
+    name = "formant"
+
+    def __init__(self, pitch: float = 120.0, unit_ms: int = 80, amplitude: float = 0.3):
+        self.pitch = pitch
+        self.unit_ms = unit_ms
+        self.amplitude = amplitude
+        self._units = {}
+        # Render the common units up front so synthesis latency stays flat
+        for char in "abcdefghijklmnopqrstuvwxyz0123456789 .,?!":
+            self._unit(char)
+
+    async def synthesize(self, text: str, lang: str = 'en', samples_per_channel: int = 480):
+        for chunk in _iter_chunks(self.render(text), samples_per_channel):
+            yield chunk
+
+    def render(self, text: str) -> np.ndarray:
+        """Render text to a mono 48 kHz int16 array."""
+        units = [self._unit(char) for char in text.lower()]
+        return np.concatenate(units) if units else np.zeros(0, dtype=np.int16)
+
+    def _unit(self, char: str) -> np.ndarray:
+        unit = self._units.get(char)
+        if unit is None:
+            unit = self._render_unit(char)
+            unit.setflags(write=False)
+            self._units[char] = unit
+        return unit
+
+    def _render_unit(self, char: str) -> np.ndarray:
+        n = SAMPLE_RATE * self.unit_ms // 1000
+        if char in '.!?;:':
+            return np.zeros(2 * n, dtype=np.int16)
+        if char in VOWEL_FORMANTS or char == 'y' or char.isdigit():
+            samples = self._formant_wave(VOWEL_FORMANTS.get(char, VOWEL_FORMANTS['i' if char == 'y' else 'o']), n)
+        elif char in VOICED_CONSONANTS:
+            samples = 0.5 * self._formant_wave(NASAL_FORMANTS, n * 3 // 4)
+        elif char in PLOSIVES:
+            samples = np.zeros(n * 3 // 4)
+            burst = n // 8
+            samples[:burst] = self._noise(char, burst)
+        elif char in FRICATIVES:
+            noise = self._noise(char, n * 3 // 4)
+            samples = np.diff(noise, prepend=0.0) * (0.6 if char != 'h' else 0.3)
+        else:
+            return np.zeros(n * 3 // 4, dtype=np.int16)  # Spaces and anything unknown
+
+        # Short raised-cosine fades avoid clicks between units
+        fade = min(SAMPLE_RATE // 200, len(samples) // 2)
+        ramp = 0.5 - 0.5 * np.cos(np.linspace(0, np.pi, fade))
+        samples[:fade] *= ramp
+        samples[len(samples) - fade:] *= ramp[::-1]
+        peak = np.abs(samples).max() or 1.0
+        return (samples * (self.amplitude * 32767 / peak)).astype(np.int16)
+
+    def _formant_wave(self, formants, n: int) -> np.ndarray:
+        """Sum of damped sinusoids per formant, repeated every pitch period."""
+        period = int(SAMPLE_RATE / self.pitch)
+        t = np.arange(period) / SAMPLE_RATE
+        pulse = sum(np.exp(-np.pi * bandwidth * t) * np.sin(2 * np.pi * freq * t) / (i + 1)
+                    for i, (freq, bandwidth) in enumerate(formants))
+        return np.resize(pulse, n)
+
+    @staticmethod
+    def _noise(char: str, n: int) -> np.ndarray:
+        return np.random.default_rng(ord(char)).uniform(-1.0, 1.0, n)
+
+class PhraseBankSynthesizer(Synthesizer):
+    """Plays pre-rendered WAV files from a directory, keyed by their text.
+
+    A phrase is looked up by its normalized text (lowercase, runs of anything but
+    letters and digits replaced by '_'), first in a <lang>/ subdirectory and then
+    in the bank root, e.g. "What is the weather?" -> what_is_the_weather.wav.
+    Phrases missing from the bank are passed to the fallback synthesizer.
+    """
+
+    name = "phrases"
+
+    def __init__(self, directory: str, fallback: Synthesizer = None):
+        self.directory = directory
+        self.fallback = fallback
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Return the file stem used for text."""
+        return re.sub(r'[^0-9a-z]+', '_', text.lower()).strip('_')
+
+    def find(self, text: str, lang: str = 'en') -> str:
+        """Return the WAV file for text, or None if the bank does not have it."""
+        stem = self.normalize(text) + '.wav'
+        for path in (os.path.join(self.directory, lang, stem), os.path.join(self.directory, stem)):
+            if os.path.exists(path):
+                return path
+        return None
+
+    async def synthesize(self, text: str, lang: str = 'en', samples_per_channel: int = 480):
+        path = self.find(text, lang)
+        if path:
+            for chunk in iter_wav_frames(path, samples_per_channel):
+                yield chunk
+        elif self.fallback:
+            async for chunk in self.fallback.synthesize(text, lang, samples_per_channel):
+                yield chunk
+        else:
+            raise KeyError(f"No phrase for {text!r} in {self.directory}")
+
+SYNTHESIZERS = ("gtts", "formant", "phrases")
+_synthesizer = None
+
+def create_synthesizer(name: str, phrase_dir: str = None) -> Synthesizer:
+    """Create a synthesizer by backend name."""
+    if name == "gtts":
+        return GTTSSynthesizer()
+    if name == "formant":
+        return FormantSynthesizer()
+    if name == "phrases":
+        if not phrase_dir:
+            raise ValueError("the phrases backend needs a phrase directory (TTS_PHRASE_DIR)")
+        return PhraseBankSynthesizer(phrase_dir, fallback=FormantSynthesizer())
+    raise ValueError(f"Unknown TTS backend: {name}")
+
+def get_synthesizer() -> Synthesizer:
+    """Return the process-wide synthesizer, configured from TTS_BACKEND and TTS_PHRASE_DIR."""
+    global _synthesizer
+    if _synthesizer is None:
+        _synthesizer = create_synthesizer(os.getenv("TTS_BACKEND", "gtts"), os.getenv("TTS_PHRASE_DIR"))
+    return _synthesizer
+
+def set_synthesizer(synthesizer: Synthesizer) -> None:
+    """Replace the process-wide synthesizer."""
+    global _synthesizer
+    _synthesizer = synthesizer
+
+async def _tee_to_cache(chunks, cache: TTSCache, key: str):
+    """Pass chunks through while writing them to the cache; published only if the stream completes."""
+    with cache.writer(key) as pcm_filename, open(pcm_filename, 'wb') as pcm_file:
+        async for chunk in chunks:
+            pcm_file.write(chunk.tobytes())
+            yield chunk
+
+def _speech_key(cache: TTSCache, synthesizer: Synthesizer, text: str, lang: str) -> str:
+    return cache.key(text, lang, SAMPLE_RATE, NUM_CHANNELS, synthesizer.name)
+
+async def render_speech(text: str, lang: str = 'en', cache: TTSCache = None,
+                        synthesizer: Synthesizer = None) -> str:
+    """Return the cached 48 kHz int16 PCM file for text, rendering it on a miss.
+
+    Concurrent misses on the same text share a single render.
+    """
+    cache = cache or get_tts_cache()
+    synthesizer = synthesizer or get_synthesizer()
+    key = _speech_key(cache, synthesizer, text, lang)
+    path = cache.lookup(key)
+    if path is None:
+        async def render():
+            async for _ in _tee_to_cache(synthesizer.synthesize(text, lang), cache, key):
+                pass
+        path = await cache.render_once(key, render)
+    return path
+
+async def play_string(source: rtc.AudioSource, text: str, lang: str = 'en',
+                      cache: TTSCache = None, synthesizer: Synthesizer = None) -> None:
+    """Play a string of text as speech.
+
+    Speech from cacheable backends is streamed from the TTS cache when present;
+    otherwise playback starts as soon as the synthesizer produces the first frame.
+    """
     import logging
-    import asyncio
-    import sounddevice as sd
-    from queue import Queue
-    
-    try:
-        logging.info("Starting audio stream playback")
-        
-        # Create a queue for audio frames
-        audio_queue = Queue()
-        stream_active = True
-        
-        async def audio_stream_reader():
-            """Task to read audio frames from the stream and put them in the queue."""
-            nonlocal stream_active
-            try:
-                while stream_active:
-                    try:
-                        frame_event = await audio_stream.__anext__()
-                        frame = frame_event.frame
-                        if frame and frame.data is not None:
-                            frame_data = np.frombuffer(frame.data, dtype=np.int16)
-                            if len(frame_data.shape) == 1:
-                                frame_data = frame_data.reshape(-1, 1)
-                            frame_data = frame_data.astype(np.float32) / 32768.0
-                            audio_queue.put(frame_data)
-                            #logging.info("Queued audio frame - shape: %s, queue size: %d", 
-                            #           frame_data.shape, audio_queue.qsize())
-                    except StopAsyncIteration:
-                        logging.info("Audio stream ended")
-                        stream_active = False
-                        break
-                    except Exception as e:
-                        logging.error("Error reading audio frame: %s", e)
-                        stream_active = False
-                        break
-            except asyncio.CancelledError:
-                logging.info("Audio stream reader task cancelled")
-                stream_active = False
-            except Exception as e:
-                logging.error("Error in audio stream reader: %s", e)
-                stream_active = False
-        
-        def audio_callback(outdata, frames, time, status):
-            if status:
-                logging.warning('Audio callback status: %s', status)
-            
-            try:
-                # Get the next frame from the queue
-                if not audio_queue.empty():
-                    frame_data = audio_queue.get()
-                    if len(frame_data) >= frames:
-                        outdata[:] = frame_data[:frames]
-                    else:
-                        # Pad with silence if frame is too short
-                        outdata[:] = np.zeros((frames, 1), dtype=np.float32)
-                else:
-                    # Output silence if no frame available
-                    outdata[:] = np.zeros((frames, 1), dtype=np.float32)
-            except Exception as e:
-                logging.error("Error in audio callback: %s", e)
-                outdata[:] = np.zeros((frames, 1), dtype=np.float32)
-        
-        # Start the audio stream reader task
-        reader_task = asyncio.create_task(audio_stream_reader())
-        
+    synthesizer = synthesizer or get_synthesizer()
+    if not synthesizer.cacheable:
+        logging.info("TTS (%s): %s", synthesizer.name, text)
+        await play_frames(source, synthesizer.synthesize(text, lang))
+        return
+
+    cache = cache or get_tts_cache()
+    key = _speech_key(cache, synthesizer, text, lang)
+    path = cache.lookup(key)
+    pending = cache.rendering(key) if path is None else None
+    if pending:
+        # Another caller is already rendering this text; stream it once it is cached
+        logging.info("TTS cache waiting for render: %s", text)
+        await asyncio.shield(pending)
+        path = cache.path(key)
+    if path:
+        logging.info("TTS cache hit: %s", text)
+        chunks = iter_pcm_frames(path)
+    else:
+        logging.info("TTS cache miss: %s", text)
+        chunks = _tee_to_cache(synthesizer.synthesize(text, lang), cache, key)
+    await play_frames(source, chunks)
+
+async def render_samples(text: str, lang: str = 'en', cache: TTSCache = None,
+                         synthesizer: Synthesizer = None) -> np.ndarray:
+    """Render text to 48 kHz int16 samples in memory, through the TTS cache for cacheable backends."""
+    synthesizer = synthesizer or get_synthesizer()
+    if synthesizer.cacheable:
+        return np.fromfile(await render_speech(text, lang, cache, synthesizer), dtype=np.int16)
+    chunks = [chunk.copy() async for chunk in synthesizer.synthesize(text, lang)]
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int16)
+
+async def play_samples(source: rtc.AudioSource, samples: np.ndarray, pump: FramePump = None) -> None:
+    """Play already decoded 48 kHz int16 samples."""
+    samples_per_channel = pump.samples_per_channel if pump else 480
+    await play_frames(source, _iter_chunks(samples, samples_per_channel), pump)
+
+class PacedPlayer:
+    """Streams prompts and the silence between them as one continuous, sample-clocked track.
+
+    A feeder task pushes one frame per frame period against a clock started with
+    the first frame, staying lead seconds ahead of real time instead of filling
+    the AudioSource queue, and sends silence whenever nothing is queued, like an
+    open microphone. Queued audio is packed into frames back to back, so every
+    prompt starts at an exact sample offset of the outgoing track and
+    time_at(offset) is when that sample is due to play.
+    """
+
+    def __init__(self, source: rtc.AudioSource, samples_per_channel: int = 480, lead: float = 0.04,
+                 pump: FramePump = None):
+        self.pump = pump or FramePump(source, samples_per_channel)
+        self.samples_per_channel = self.pump.samples_per_channel
+        self.lead = lead
+        self.position = 0  # Offset just past the last queued audio
+        self.sent = 0  # Samples pushed so far, including idle silence
+        self.started = None
+        self.late_frames = 0
+        self._queue = deque()  # [samples (None for silence), length, read, future]
+        self._frame = np.zeros(self.samples_per_channel, dtype=np.int16)
+        self._task = None
+
+    @property
+    def next_offset(self) -> int:
+        """Offset at which audio queued now would start."""
+        return max(self.position, self.sent)
+
+    def time_at(self, offset: int) -> float:
+        """Return the time.monotonic() at which the sample at offset is due to play."""
+        return self.started + offset / SAMPLE_RATE
+
+    def start(self) -> None:
+        """Start the clock and the feeder task."""
+        if self._task is None:
+            self.started = time.monotonic()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def play(self, samples: np.ndarray) -> tuple[int, int]:
+        """Queue samples right after everything queued so far and wait until they are sent.
+
+        Returns the (start, end) offsets of the samples in the outgoing track.
+        """
+        return await self._enqueue(samples, len(samples))
+
+    async def silence(self, seconds: float) -> tuple[int, int]:
+        """Send seconds of silence after the last queued audio and wait until it is sent.
+
+        Idle silence already sent within the last frame counts towards it, so a
+        silence following a prompt starts exactly where the prompt ended.
+        """
+        count = round(seconds * SAMPLE_RATE)
+        start = self.position if self.sent - self.position < self.samples_per_channel else self.sent
+        _, end = await self._enqueue(None, max(start + count - self.next_offset, 0))
+        return start, end
+
+    async def _enqueue(self, samples, length: int) -> tuple[int, int]:
+        self.start()
+        start = self.next_offset
+        self.position = start + length
+        if length:
+            future = asyncio.get_running_loop().create_future()
+            self._queue.append([samples, length, 0, future])
+            await future
+        return start, self.position
+
+    async def _run(self) -> None:
+        import logging
+        spf = self.samples_per_channel
+        frame = self._frame
         try:
-            devices = sd.query_devices()
-            default_output = sd.default.device[1]
-            logging.info("Using audio output device: %s", devices[default_output]['name'])
-            logging.info("Available audio devices:")
-            for i, device in enumerate(devices):
-                logging.info("%d: %s", i, device['name'])
-            
-            # Try to use the default output device
-            try:
-                with sd.OutputStream(
-                    samplerate=SAMPLE_RATE,
-                    channels=1,
-                    callback=audio_callback,
-                    device=default_output,
-                    blocksize=480,  # Match the frame size we're receiving
-                    dtype=np.float32,  # Use float32 for internal processing
-                    finished_callback=lambda: logging.info("Audio output stream finished")
-                ):
-                    logging.info("Audio output stream started successfully")
-                    # Keep the stream running until explicitly cancelled or stream ends
-                    while stream_active:
-                        try:
-                            await asyncio.sleep(0.1)  # Shorter sleep interval for more responsive playback
-                            # Check if we have frames in the queue
-                            if audio_queue.empty() and not stream_active:
-                                logging.info("No more frames and stream is inactive, stopping playback")
-                                break
-                        except asyncio.CancelledError:
-                            logging.info("Audio playback task cancelled")
-                            break
-                        except Exception as e:
-                            logging.error("Error in audio playback loop: %s", e)
-                            break
-            except Exception as e:
-                logging.error("Failed to use default output device: %s", e)
-                # Try to use any available output device
-                for i, device in enumerate(devices):
-                    if device['max_output_channels'] > 0:  # This is an output device
-                        try:
-                            with sd.OutputStream(
-                                samplerate=SAMPLE_RATE,
-                                channels=1,
-                                callback=audio_callback,
-                                device=i,
-                                blocksize=480,
-                                dtype=np.float32,
-                                finished_callback=lambda: logging.info("Audio output stream finished")
-                            ):
-                                logging.info("Audio output stream started successfully on device %d: %s", 
-                                           i, device['name'])
-                                while stream_active:
-                                    try:
-                                        await asyncio.sleep(0.1)
-                                        # Check if we have frames in the queue
-                                        if audio_queue.empty() and not stream_active:
-                                            logging.info("No more frames and stream is inactive, stopping playback")
-                                            break
-                                    except asyncio.CancelledError:
-                                        logging.info("Audio playback task cancelled")
-                                        break
-                                    except Exception as e:
-                                        logging.error("Error in audio playback loop: %s", e)
-                                        break
-                                break  # If we get here, we successfully started the stream
-                        except Exception as e:
-                            logging.error("Failed to use device %d (%s): %s", 
-                                        i, device['name'], e)
-                            continue
+            while True:
+                delay = self.time_at(self.sent) - self.lead - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif delay < -self.lead - spf / SAMPLE_RATE:
+                    # More than a frame past the time it was due to play
+                    self.late_frames += 1
+
+                # Fill the frame synchronously so offsets never move between awaits
+                filled = 0
+                done = []
+                while filled < spf and self._queue:
+                    entry = self._queue[0]
+                    samples, length, read, future = entry
+                    n = min(spf - filled, length - read)
+                    if samples is None:
+                        frame[filled:filled + n] = 0
+                    else:
+                        frame[filled:filled + n] = samples[read:read + n]
+                    entry[2] = read + n
+                    filled += n
+                    if entry[2] == length:
+                        self._queue.popleft()
+                        done.append(future)
+                self.sent += spf
+                if filled:
+                    frame[filled:] = 0
+                    await self.pump.push(frame)
                 else:
-                    raise RuntimeError("No working audio output devices found")
-                    
+                    await self.pump.push_silence()
+                for future in done:
+                    if not future.done():
+                        future.set_result(None)
         except Exception as e:
-            logging.error("Error setting up audio output: %s", e)
-            raise
-        finally:
-            # Cancel the reader task
-            reader_task.cancel()
+            logging.error("Paced playback failed: %s", e)
+            for entry in self._queue:
+                if not entry[3].done():
+                    entry[3].set_exception(e)
+            self._queue.clear()
+
+    async def aclose(self) -> None:
+        """Stop the feeder, dropping anything still queued."""
+        if self._task is not None:
+            self._task.cancel()
             try:
-                await reader_task
+                await self._task
             except asyncio.CancelledError:
                 pass
-            
+        for entry in self._queue:
+            entry[3].cancel()
+        self._queue.clear()
+
+    def stats(self) -> dict:
+        """Return the player and pump counters."""
+        return {
+            "seconds_sent": self.sent / SAMPLE_RATE,
+            "late_frames": self.late_frames,
+            **self.pump.stats(),
+        }
+
+class AudioRingBuffer:
+    """Preallocated single-producer/single-consumer float32 ring buffer with a jitter buffer.
+
+    The producer (the AudioStream reader) only advances the write index and the
+    consumer (the sounddevice callback) only advances the read index, so neither
+    side takes a lock. Reads start once target_depth samples are buffered and
+    restart priming after an underrun; anything beyond max_depth is trimmed by the
+    consumer to bound latency. Frames of any size are split across callbacks and
+    neither side allocates.
+    """
+
+    def __init__(self, capacity: int, target_depth: int, max_depth: int = None):
+        self.capacity = capacity
+        self.target_depth = min(target_depth, capacity)
+        self.max_depth = min(max_depth or 4 * self.target_depth, capacity)
+        self._buf = np.zeros(capacity, dtype=np.float32)
+        self._written = 0  # Total samples written, owned by the producer
+        self._read = 0  # Total samples read, owned by the consumer
+        self._primed = False
+        self.underruns = 0
+        self.overruns = 0
+        self.dropped_samples = 0
+        self.silence_samples = 0
+
+    @property
+    def depth(self) -> int:
+        """Number of buffered samples."""
+        return self._written - self._read
+
+    def write(self, samples: np.ndarray) -> None:
+        """Append int16 samples, scaling them to float32; drops what does not fit."""
+        free = self.capacity - (self._written - self._read)
+        n = len(samples)
+        if n > free:
+            self.overruns += 1
+            self.dropped_samples += n - free
+            n = free
+        start = self._written % self.capacity
+        first = min(n, self.capacity - start)
+        np.multiply(samples[:first], np.float32(1 / 32768), out=self._buf[start:start + first], casting='unsafe')
+        np.multiply(samples[first:n], np.float32(1 / 32768), out=self._buf[:n - first], casting='unsafe')
+        self._written += n  # Publish only after the data is in place
+
+    def read_into(self, out: np.ndarray) -> None:
+        """Fill out with buffered samples, padding with silence when not enough are available."""
+        available = self._written - self._read
+        if not self._primed:
+            if available < self.target_depth:
+                out.fill(0)
+                self.silence_samples += len(out)
+                return
+            self._primed = True
+        if available > self.max_depth:
+            # Trim back to the target depth when the producer runs ahead
+            skip = available - self.target_depth
+            self._read += skip
+            available -= skip
+            self.overruns += 1
+            self.dropped_samples += skip
+
+        n = min(len(out), available)
+        start = self._read % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._buf[start:start + first]
+        out[first:n] = self._buf[:n - first]
+        if n < len(out):
+            out[n:].fill(0)
+            self.silence_samples += len(out) - n
+            self.underruns += 1
+            self._primed = False
+        self._read += n
+
+    def stats(self) -> dict:
+        """Return the buffer counters."""
+        return {
+            "depth": self.depth,
+            "underruns": self.underruns,
+            "overruns": self.overruns,
+            "dropped_samples": self.dropped_samples,
+            "silence_samples": self.silence_samples,
+        }
+
+async def play_audio_stream(audio_stream: rtc.AudioStream, sink, on_frame=None) -> None:
+    """Feed an audio stream from a LiveKit participant into an audio sink (see audio_sinks).
+
+    on_frame, if given, is called with the int16 samples of every received frame.
+    """
+    import logging
+
+    try:
+        logging.info("Starting audio stream playback (%s sink)", sink.name)
+        sink.open()
+        try:
+            async for frame_event in audio_stream:
+                frame = frame_event.frame
+                if frame and frame.data is not None:
+                    samples = np.frombuffer(frame.data, dtype=np.int16)
+                    sink.write(samples)
+                    if on_frame:
+                        on_frame(samples)
+            logging.info("Audio stream ended")
+        finally:
+            await sink.aclose()
+            logging.info("Audio sink stats: %s", sink.stats())
     except asyncio.CancelledError:
         logging.info("Audio stream task cancelled")
     except Exception as e:
-        logging.error("Error playing audio stream: %s", e) 
\ No newline at end of file
+        logging.error("Error playing audio stream: %s", e)
@@ -0,0 +1,214 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+from audio_utils import (SAMPLE_RATE, FramePump, create_synthesizer, play_audio_stream, play_wav,
+                         resample, resample_linear, set_synthesizer)
+from audio_sinks import NullSink
+from latency import summarize
+from loopback import LoopbackAudioSource, LoopbackAudioStream, LoopbackAudioTrack, LoopbackNetwork, LoopbackRTC
+
+def measure(func, *args) -> tuple[object, float, int]:
+    """Run func once, returning its result, wall time and peak traced memory."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def image_rejection_db(samples: np.ndarray, src_rate: int, dst_rate: int) -> float:
+    """Energy above the source Nyquist frequency relative to the passband, in dB."""
+    spectrum = np.abs(np.fft.rfft(samples.astype(np.float64) * np.hanning(len(samples)))) ** 2
+    freqs = np.fft.rfftfreq(len(samples), 1 / dst_rate)
+    nyquist = min(src_rate, dst_rate) / 2
+    stopband = spectrum[freqs > nyquist * 1.05].sum()
+    passband = spectrum[freqs < nyquist * 0.95].sum()
+    return 10 * np.log10(max(stopband, 1e-12) / passband)
+
+def bench_resample(args) -> None:
+    """Compare the polyphase resampler with the linear interpolation path."""
+    rng = np.random.default_rng(0)
+    n = int(args.seconds * args.src_rate)
+    # Noise plus a tone close to the source Nyquist frequency, which exposes imaging
+    t = np.arange(n) / args.src_rate
+    signal = 8000 * np.sin(2 * np.pi * 0.45 * args.src_rate * t) + rng.normal(0, 1000, n)
+    samples = np.clip(signal, -32768, 32767).astype(np.int16)
+    del t, signal
+
+    print(f"Resampling {args.seconds:.0f}s of audio {args.src_rate} Hz -> {args.dst_rate} Hz")
+    for name, func in (("polyphase", resample), ("linear", resample_linear)):
+        output, elapsed, peak = measure(func, samples, args.src_rate, args.dst_rate)
+        print(f"{name:>10}: {elapsed * 1000:8.1f} ms  "
+              f"{args.seconds / elapsed:8.0f}x realtime  "
+              f"peak {peak / 1e6:7.1f} MB  "
+              f"images {image_rejection_db(output, args.src_rate, args.dst_rate):6.1f} dB")
+
+class NullAudioSource:
+    """AudioSource stand-in that accepts frames without sending them anywhere."""
+
+    async def capture_frame(self, frame) -> None:
+        await asyncio.sleep(0)
+
+async def _pump_frames(pump: FramePump, samples: np.ndarray) -> None:
+    for position in range(0, len(samples), pump.samples_per_channel):
+        await pump.push(samples[position:position + pump.samples_per_channel])
+    await pump.push_silence(3)
+
+def bench_pump(args) -> None:
+    """Drive many frame pumps concurrently and report per-frame allocations."""
+    samples = np.random.default_rng(0).integers(-3000, 3000, int(args.seconds * SAMPLE_RATE) + 123,
+                                                dtype=np.int16)
+    pumps = [FramePump(NullAudioSource()) for _ in range(args.sources)]
+
+    async def run():
+        await asyncio.gather(*(_pump_frames(pump, samples) for pump in pumps))
+
+    asyncio.run(run())  # Warm up the event loop machinery before measuring
+    for pump in pumps:
+        pump.frames_pushed = pump.silence_frames = pump.copies_made = 0
+        pump.blocked_time = 0.0
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    asyncio.run(run())
+    elapsed = time.perf_counter() - start
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    audio_utils_stats = [stat for stat in after.compare_to(before, 'filename')
+                         if stat.traceback[0].filename.endswith('audio_utils.py')]
+    frames = sum(pump.frames_pushed for pump in pumps)
+    copies = sum(pump.copies_made for pump in pumps)
+    blocked = sum(pump.blocked_time for pump in pumps)
+    allocated = sum(stat.count_diff for stat in audio_utils_stats)
+    print(f"{args.sources} sources, {frames} frames in {elapsed * 1000:.1f} ms "
+          f"({frames / elapsed:.0f} frames/s)")
+    print(f"copies made: {copies}, blocked in capture_frame: {blocked * 1000:.1f} ms")
+    # Live blocks left behind by audio_utils; this stays flat as --seconds grows
+    print(f"net allocations in audio_utils during the run: {allocated}")
+
+async def _loopback_throughput(path: str, frames: int) -> tuple[float, float]:
+    """Return the frames/s of play_wav into, and play_audio_stream out of, an unpaced loopback track."""
+    from loopback import LoopbackLink
+
+    network = LoopbackNetwork(realtime=False)
+    source = LoopbackAudioSource()
+    source.realtime = False
+    track = LoopbackAudioTrack("bench", source)
+    track.link = LoopbackLink(network, "bench")
+    received = [0]
+    track.subscribe(lambda samples: received.__setitem__(0, received[0] + (samples is not None)))
+
+    start = time.perf_counter()
+    await play_wav(source, path)
+    await asyncio.sleep(0)  # Let the last deliveries run
+    play_rate = received[0] / (time.perf_counter() - start)
+
+    stream = LoopbackAudioStream(track)
+    task = asyncio.ensure_future(play_audio_stream(stream, NullSink()))
+    samples = np.zeros(480, dtype=np.int16)
+    start = time.perf_counter()
+    for i in range(frames):
+        track.send(samples, 0.0)
+        if i % 100 == 0:
+            await asyncio.sleep(0)
+    track.close()
+    await task
+    return play_rate, frames / (time.perf_counter() - start)
+
+def _loopback_script(turns: int) -> list[dict]:
+    commands = [
+        {"type": "wait_for_participant", "params": {"timeout": 5}},
+        # Let the agent's greeting finish
+        {"type": "wait_for_audio", "params": {"timeout": 10}},
+        {"type": "wait_for_silence", "params": {"timeout": 30}},
+    ]
+    for i in range(turns):
+        commands += [
+            {"type": "tts", "params": {"text": f"This is test prompt number {i + 1}"}},
+            {"type": "wait_for_audio", "params": {"timeout": 10}},
+            {"type": "wait_for_silence", "params": {"timeout": 30}},
+        ]
+    return commands
+
+def bench_loopback(args) -> None:
+    """Run the audio paths and a scripted session over the loopback transport."""
+    from room_manager import run_session
+
+    set_synthesizer(create_synthesizer("formant"))
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_path = os.path.join(tmp, "noise.wav")
+        with wave.open(wav_path, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(SAMPLE_RATE)
+            noise = np.random.default_rng(0).integers(-3000, 3000, int(args.seconds * SAMPLE_RATE), dtype=np.int16)
+            wav_file.writeframes(noise.tobytes())
+        frames = int(args.seconds * 100)
+        play_rate, stream_rate = asyncio.run(_loopback_throughput(wav_path, frames))
+        print(f"play_wav -> loopback track: {play_rate:9.0f} frames/s ({play_rate / 100:.0f}x realtime)")
+        print(f"loopback track -> play_audio_stream: {stream_rate:9.0f} frames/s ({stream_rate / 100:.0f}x realtime)")
+
+        script_path = os.path.join(tmp, "loopback.json")
+        with open(script_path, 'w') as f:
+            json.dump(_loopback_script(args.turns), f)
+        network = LoopbackNetwork(args.latency_ms, args.jitter_ms, args.loss, args.seed)
+        transport = LoopbackRTC(network, reply_delay_ms=args.reply_ms)
+
+        async def run():
+            return await run_session(script_path, "loopback", sink_factory=lambda name: NullSink(),
+                                     transport=transport)
+
+        start = time.perf_counter()
+        script, result = asyncio.run(run())
+        elapsed = time.perf_counter() - start
+
+    print(f"{args.turns} scripted turns in {elapsed:.1f}s: {result['message']}")
+    summary = script.latency.report()["summary"]["time_to_first_audio"]
+    if summary["count"]:
+        print(f"time to first audio: p50 {summary['p50']:.1f} ms, p95 {summary['p95']:.1f} ms "
+              f"(expected about {500 + args.reply_ms + args.latency_ms:.0f} ms plus jitter: "
+              f"500 ms end of speech, reply delay, latency)")
+    steps = {}
+    for step in script.step_results:
+        steps.setdefault(step["type"], []).append(step["duration"])
+    for name, durations in steps.items():
+        stats = summarize(durations)
+        print(f"{name:>22}: p50 {stats['p50']:8.1f} ms  p95 {stats['p95']:8.1f} ms  ({stats['count']} steps)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the test client audio paths')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    resample_parser = subparsers.add_parser('resample', help='Benchmark WAV resampling')
+    resample_parser.add_argument('--src-rate', type=int, default=16000, help='Source sample rate')
+    resample_parser.add_argument('--dst-rate', type=int, default=SAMPLE_RATE, help='Target sample rate')
+    resample_parser.add_argument('--seconds', type=float, default=60, help='Length of the test signal')
+    resample_parser.set_defaults(func=bench_resample)
+
+    pump_parser = subparsers.add_parser('pump', help='Benchmark the frame pump used by play_wav')
+    pump_parser.add_argument('--sources', type=int, default=50, help='Number of concurrent audio sources')
+    pump_parser.add_argument('--seconds', type=float, default=10, help='Seconds of audio per source')
+    pump_parser.set_defaults(func=bench_pump)
+
+    loopback_parser = subparsers.add_parser('loopback', help='Benchmark the client over the loopback transport')
+    loopback_parser.add_argument('--seconds', type=float, default=60, help='Seconds of audio for throughput')
+    loopback_parser.add_argument('--turns', type=int, default=5, help='Prompt/response turns in the script')
+    loopback_parser.add_argument('--latency-ms', type=float, default=20, help='Simulated one-way latency')
+    loopback_parser.add_argument('--jitter-ms', type=float, default=0, help='Simulated jitter')
+    loopback_parser.add_argument('--loss', type=float, default=0.0, help='Simulated packet loss probability')
+    loopback_parser.add_argument('--seed', type=int, default=0, help='Seed of the simulated jitter and loss')
+    loopback_parser.add_argument('--reply-ms', type=float, default=300, help='Delay before the echo agent replies')
+    loopback_parser.set_defaults(func=bench_loopback)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -0,0 +1,161 @@
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+import weakref
+from collections import Counter
+
+from latency import summarize
+
+class HandlerStats:
+    """Call count and durations of one instrumented callback."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.slow = 0
+
+    def record(self, duration: float, slow_threshold: float) -> None:
+        self.calls += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        if duration >= slow_threshold:
+            self.slow += 1
+
+class Instrumentation:
+    """Samples event-loop lag and times callbacks, reporting periodic snapshots.
+
+    A sampler task sleeps for lag_interval seconds at a time and records how late
+    it wakes up; that lateness is time the loop spent running something else.
+    Room event handlers wrapped with timed() record their run time, and sessions
+    registered with watch() report their audio playback stream counts. Every
+    interval seconds a snapshot is logged and, if path is set, appended to it as
+    a JSON line.
+    """
+
+    def __init__(self, interval: float = 5.0, lag_interval: float = 0.01, path: str = None,
+                 slow_ms: float = 20.0):
+        self.interval = interval
+        self.lag_interval = lag_interval
+        self.path = path
+        self.slow_threshold = slow_ms / 1000
+        self.handlers: dict[str, HandlerStats] = {}
+        self._lags = []
+        self._states = weakref.WeakSet()
+        self._task = None
+        self._window_start = None
+        self.snapshots = 0
+
+    def watch(self, state) -> None:
+        """Include a ClientState's audio playback stream counts in the snapshots."""
+        self._states.add(state)
+
+    def timed(self, name: str, callback):
+        """Wrap a synchronous callback so its run time is recorded under name."""
+        stats = self.handlers.setdefault(name, HandlerStats())
+
+        @functools.wraps(callback)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return callback(*args, **kwargs)
+            finally:
+                stats.record(time.perf_counter() - start, self.slow_threshold)
+        return wrapper
+
+    def start(self) -> None:
+        """Start sampling on the running event loop."""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        """Stop sampling and report a final snapshot."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.report()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._window_start = loop.time()
+        while True:
+            expected = loop.time() + self.lag_interval
+            await asyncio.sleep(self.lag_interval)
+            now = loop.time()
+            self._lags.append(max(now - expected, 0.0) * 1000)
+            if now - self._window_start >= self.interval:
+                self.report()
+
+    def snapshot(self) -> dict:
+        """Return the metrics of the current window and reset the per-window counters."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        tasks = asyncio.all_tasks(loop)
+        coroutines = Counter(getattr(task.get_coro(), '__qualname__', '?') for task in tasks)
+        playback = [state.playback.stats() for state in list(self._states)]
+        snapshot = {
+            "time": time.time(),
+            "pid": os.getpid(),
+            "window": now - self._window_start if self._window_start is not None else 0.0,
+            "loop_lag": {**summarize(self._lags), "max": max(self._lags, default=0.0)},
+            "tasks": len(tasks),
+            "tasks_by_coroutine": dict(coroutines.most_common(10)),
+            "audio_streams": sum(stats["active"] for stats in playback),
+            "audio_streams_started": sum(stats["started"] for stats in playback),
+            "audio_streams_rejected": sum(stats["rejected"] for stats in playback),
+            "handlers": {
+                name: {
+                    "calls": stats.calls,
+                    "total_ms": stats.total * 1000,
+                    "max_ms": stats.max * 1000,
+                    "slow": stats.slow,
+                }
+                for name, stats in sorted(self.handlers.items()) if stats.calls
+            },
+        }
+        self._lags = []
+        self._window_start = now
+        for stats in self.handlers.values():
+            stats.reset()
+        return snapshot
+
+    def report(self) -> dict:
+        """Log a snapshot and append it to the JSON lines file."""
+        snapshot = self.snapshot()
+        self.snapshots += 1
+        lag = snapshot["loop_lag"]
+        slowest = max(snapshot["handlers"].items(), key=lambda item: item[1]["max_ms"], default=None)
+        logging.info("Loop lag p50 %.1f ms, p99 %.1f ms, max %.1f ms; %d tasks, %d audio streams; "
+                     "slowest handler: %s",
+                     lag.get("p50", 0.0), lag.get("p99", 0.0), lag["max"], snapshot["tasks"],
+                     snapshot["audio_streams"],
+                     f"{slowest[0]} {slowest[1]['max_ms']:.1f} ms" if slowest else "none")
+        if self.path:
+            with open(self.path, 'a') as f:
+                f.write(json.dumps(snapshot) + "\n")
+        return snapshot
+
+def add_instrumentation_arguments(parser) -> None:
+    """Add the event-loop instrumentation options to an argparse parser."""
+    group = parser.add_argument_group('instrumentation', 'Event-loop lag and handler timing snapshots')
+    group.add_argument('--instrument', action='store_true', help='Sample loop lag and time room handlers')
+    group.add_argument('--instrument-interval', type=float, default=5.0, help='Seconds between snapshots')
+    group.add_argument('--instrument-file', help='Append each snapshot to this file as a JSON line')
+    group.add_argument('--slow-handler-ms', type=float, default=20.0,
+                       help='Count room handler calls taking at least this long as slow')
+
+def instrumentation_from_args(args) -> Instrumentation:
+    """Return the Instrumentation selected by the add_instrumentation_arguments options, or None."""
+    if not args.instrument:
+        return None
+    return Instrumentation(args.instrument_interval, path=args.instrument_file, slow_ms=args.slow_handler_ms)
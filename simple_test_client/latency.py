@@ -0,0 +1,141 @@
+import json
+import logging
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+def summarize(values: list[float]) -> dict:
+    """Return count, mean and p50/p95/p99 of a list of durations in milliseconds."""
+    if not values:
+        return {"count": 0}
+    summary = {"count": len(values), "mean": float(np.mean(values))}
+    for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p}"] = float(v)
+    return summary
+
+class Turn:
+    """Timestamps (time.monotonic()) of one prompt and the agent's response to it."""
+
+    def __init__(self, index: int, kind: str, label: str, playback_start: float):
+        self.index = index
+        self.kind = kind
+        self.label = label
+        self.playback_start = playback_start
+        self.playback_end = None
+        self.start_sample = None  # Offsets of the prompt in the outgoing track, when paced
+        self.end_sample = None
+        self.first_audio = None
+        self.audio_end = None
+        self.speaking_start = None
+        self.speaking_stop = None
+
+    def durations(self) -> dict:
+        """Return the turn's latencies in milliseconds (None when not observed)."""
+        def ms(start, end):
+            return (end - start) * 1000 if start is not None and end is not None else None
+        return {
+            "time_to_first_audio": ms(self.playback_end, self.first_audio),
+            "audio_duration": ms(self.first_audio, self.audio_end),
+            "time_to_speaking": ms(self.playback_end, self.speaking_start),
+            "turn_duration": ms(self.speaking_start, self.speaking_stop),
+            "response_complete": ms(self.playback_end, self.speaking_stop),
+        }
+
+class LatencyTracker:
+    """Records per-turn response latency of the agent during a scripted test.
+
+    A turn starts when we play a prompt (tts or wav). Once our playback ends we
+    record when speech starts and ends in the received audio (from the energy
+    based SpeechDetector, to within one frame) and the agent's speaking
+    start/stop from active_speakers_changed, which lags behind the audio.
+    """
+
+    def __init__(self):
+        self.turns: list[Turn] = []
+        self.started = time.monotonic()
+
+    @property
+    def current(self) -> Turn:
+        return self.turns[-1] if self.turns else None
+
+    def playback_started(self, kind: str, label: str, timestamp: float = None) -> None:
+        """Start a new turn for a prompt we are about to play (at timestamp, default now)."""
+        self.turns.append(Turn(len(self.turns), kind, label, timestamp or time.monotonic()))
+
+    def playback_ended(self, timestamp: float = None) -> None:
+        """Mark the end of our prompt; the agent's response is measured from here."""
+        if self.current:
+            self.current.playback_end = timestamp or time.monotonic()
+
+    def speech_started(self, timestamp: float) -> None:
+        """Record the start of the agent's first speech in received audio after our prompt."""
+        turn = self.current
+        if turn and turn.playback_end is not None and turn.first_audio is None and timestamp >= turn.playback_end:
+            turn.first_audio = timestamp
+
+    def speech_ended(self, timestamp: float) -> None:
+        """Record the end of that speech."""
+        turn = self.current
+        if turn and turn.first_audio is not None and turn.audio_end is None:
+            turn.audio_end = timestamp
+
+    def speaking_changed(self, is_speaking: bool) -> None:
+        """Record the agent starting or stopping speaking after our prompt."""
+        turn = self.current
+        if not turn or turn.playback_end is None:
+            return
+        now = time.monotonic()
+        if is_speaking and turn.speaking_start is None:
+            turn.speaking_start = now
+        elif not is_speaking and turn.speaking_start is not None and turn.speaking_stop is None:
+            turn.speaking_stop = now
+
+    def report(self) -> dict:
+        """Return per-turn timings and percentile summaries."""
+        def rel(t):
+            return (t - self.started) * 1000 if t is not None else None
+
+        turns = []
+        metrics = {}
+        for turn in self.turns:
+            durations = turn.durations()
+            turns.append({
+                "index": turn.index,
+                "kind": turn.kind,
+                "label": turn.label,
+                "start_sample": turn.start_sample,
+                "end_sample": turn.end_sample,
+                "playback_start": rel(turn.playback_start),
+                "playback_end": rel(turn.playback_end),
+                "first_audio": rel(turn.first_audio),
+                "audio_end": rel(turn.audio_end),
+                "speaking_start": rel(turn.speaking_start),
+                "speaking_stop": rel(turn.speaking_stop),
+                **durations,
+            })
+            for name, value in durations.items():
+                if value is not None:
+                    metrics.setdefault(name, []).append(value)
+        return {
+            "turns": turns,
+            "summary": {name: summarize(metrics.get(name, []))
+                        for name in ("time_to_first_audio", "audio_duration", "time_to_speaking",
+                                     "turn_duration", "response_complete")},
+        }
+
+    def log_summary(self) -> None:
+        """Log a one-line summary of the time to first audio."""
+        summary = self.report()["summary"]["time_to_first_audio"]
+        if summary["count"]:
+            logging.info("Time to first audio over %d turns: p50 %.0f ms, p95 %.0f ms, p99 %.0f ms",
+                         summary["count"], summary["p50"], summary["p95"], summary["p99"])
+
+def write_report(path: str, report: dict, **metadata) -> None:
+    """Write a latency report as JSON, stamped with the current time and metadata."""
+    document = {"created": datetime.now(timezone.utc).isoformat(), **metadata, **report}
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2)
+    logging.info("Wrote latency report to %s", path)
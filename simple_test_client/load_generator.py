@@ -0,0 +1,163 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
+
+from room_manager import run_session
+from audio_sinks import SINKS, create_sink
+from audio_utils import SYNTHESIZERS, create_synthesizer, set_synthesizer
+from latency import LatencyTracker, summarize
+from loopback import add_loopback_arguments, transport_from_args
+from instrumentation import add_instrumentation_arguments, instrumentation_from_args
+
+def ramp_schedule(spec: str, clients: int) -> list[float]:
+    """Return the start offset in seconds of each client for a ramp spec.
+
+    - "burst": start everything at once
+    - "linear:SECONDS": spread the starts evenly over SECONDS
+    - "step:COUNT:SECONDS": start COUNT more clients every SECONDS
+    """
+    kind, _, rest = spec.partition(':')
+    if kind == "burst":
+        return [0.0] * clients
+    if kind == "linear":
+        duration = float(rest)
+        return [duration * i / clients for i in range(clients)]
+    if kind == "step":
+        count, seconds = rest.split(':')
+        return [(i // int(count)) * float(seconds) for i in range(clients)]
+    raise ValueError(f"Unknown ramp schedule: {spec}")
+
+async def run_client(index: int, start_offset: float, args, active: list, transport,
+                     instrumentation=None) -> dict:
+    """Run one simulated client in its own room and return its result."""
+    await asyncio.sleep(start_offset)
+    room_name = args.room if args.shared_room else f"{args.room}-{index}"
+    concurrency = active[0] + 1  # Clients running when this one started
+    active[0] += 1
+    sink_factory = partial(create_sink, args.sink, output_dir=os.path.join(args.sink_dir, room_name))
+    try:
+        script, result = await run_session(args.script, room_name,
+                                           identity=f"load-client-{os.getpid()}-{index}",
+                                           sink_factory=sink_factory, timeout=args.client_timeout,
+                                           transport=transport, instrumentation=instrumentation)
+    finally:
+        active[0] -= 1
+    # A script that failed to load leaves no script, just a failed result
+    latency = script.latency if script else LatencyTracker()
+    result.update(client=index, start_offset=start_offset, concurrency=concurrency,
+                  latency=latency.report())
+    logging.info("Client %d finished: %s", index, result["message"])
+    return result
+
+async def run_clients(indices: list[int], offsets: list[float], args) -> list[dict]:
+    """Run a group of clients concurrently on this process's event loop."""
+    active = [0]
+    transport = transport_from_args(args)
+    instrumentation = instrumentation_from_args(args)
+    if instrumentation:
+        instrumentation.start()
+    try:
+        return await asyncio.gather(*(run_client(i, offsets[i], args, active, transport, instrumentation)
+                                      for i in indices))
+    finally:
+        if instrumentation:
+            await instrumentation.stop()
+
+def run_worker(indices: list[int], offsets: list[float], args) -> list[dict]:
+    """Entry point of a worker process."""
+    configure(args)
+    return asyncio.run(run_clients(indices, offsets, args))
+
+def configure(args) -> None:
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    set_synthesizer(create_synthesizer(args.tts, args.phrase_dir))
+
+def aggregate(results: list[dict], bucket_size: int) -> dict:
+    """Combine client results into success/failure counts and latency percentiles."""
+    metrics = {}
+    by_concurrency = {}
+    for result in results:
+        bucket = (result["concurrency"] - 1) // bucket_size * bucket_size + bucket_size
+        for turn in result["latency"]["turns"]:
+            for name in ("time_to_first_audio", "time_to_speaking", "turn_duration"):
+                if turn[name] is not None:
+                    metrics.setdefault(name, []).append(turn[name])
+            if turn["time_to_first_audio"] is not None:
+                by_concurrency.setdefault(bucket, []).append(turn["time_to_first_audio"])
+
+    failures = Counter(result["message"] for result in results if not result["success"])
+    return {
+        "clients": len(results),
+        "succeeded": sum(result["success"] for result in results),
+        "failed": sum(not result["success"] for result in results),
+        "failures": dict(failures),
+        "connect_time": summarize([r["connect_time"] for r in results if "connect_time" in r]),
+        "latency": {name: summarize(values) for name, values in metrics.items()},
+        # Time to first audio grouped by how many clients were running when each client started
+        "time_to_first_audio_by_concurrency": {
+            f"<= {bucket}": summarize(values) for bucket, values in sorted(by_concurrency.items())
+        },
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run many scripted test clients against an agent')
+    parser.add_argument('--test', required=True, help='Name of the test to run (without .json extension)')
+    parser.add_argument('--clients', type=int, default=10, help='Number of concurrent clients')
+    parser.add_argument('--room', default='load-test', help='Room name (prefix, one room per client)')
+    parser.add_argument('--shared-room', action='store_true', help='Put every client in the same room')
+    parser.add_argument('--ramp', default='linear:10',
+                        help='Start schedule: burst, linear:SECONDS or step:COUNT:SECONDS')
+    parser.add_argument('--processes', type=int, default=1, help='Spread clients over this many processes')
+    parser.add_argument('--client-timeout', type=float, default=300, help='Seconds before a client is failed')
+    parser.add_argument('--sink', choices=SINKS, default='null', help='Where received agent audio goes')
+    parser.add_argument('--sink-dir', default='recordings', help='Output directory for wav/raw sinks')
+    parser.add_argument('--tts', choices=SYNTHESIZERS, default=os.getenv('TTS_BACKEND', 'formant'),
+                        help='Speech backend for tts steps')
+    parser.add_argument('--phrase-dir', default=os.getenv('TTS_PHRASE_DIR'),
+                        help='Directory of pre-rendered phrases for the phrases backend')
+    parser.add_argument('--bucket-size', type=int, default=10, help='Concurrency bucket size in the report')
+    parser.add_argument('--report', default='load_report.json', help='Write the aggregated report here')
+    parser.add_argument('--verbose', action='store_true', help='Log every client event')
+    add_loopback_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args()
+    args.script = os.path.join('tests', f'{args.test}.json')
+
+    configure(args)
+    offsets = ramp_schedule(args.ramp, args.clients)
+    started = time.monotonic()
+    if args.processes > 1:
+        groups = [list(range(args.clients))[p::args.processes] for p in range(args.processes)]
+        with ProcessPoolExecutor(max_workers=args.processes) as pool:
+            futures = [pool.submit(run_worker, group, offsets, args) for group in groups if group]
+            results = [result for future in futures for result in future.result()]
+        # Concurrency was counted per process; rebuild it from the start offsets and durations
+        for result in results:
+            start = result["start_offset"]
+            result["concurrency"] = sum(
+                1 for other in results
+                if other["start_offset"] <= start < other["start_offset"] + other["duration"] / 1000)
+    else:
+        results = asyncio.run(run_clients(list(range(args.clients)), offsets, args))
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "script": args.script,
+        "ramp": args.ramp,
+        "processes": args.processes,
+        "wall_time": time.monotonic() - started,
+        "summary": aggregate(results, args.bucket_size),
+        "clients": sorted(results, key=lambda result: result["client"]),
+    }
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2)
+    summary = report["summary"]
+    print(f"{summary['succeeded']}/{summary['clients']} clients succeeded; report written to {args.report}")
+    print(json.dumps(summary["time_to_first_audio_by_concurrency"], indent=2))
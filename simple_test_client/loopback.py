@@ -0,0 +1,404 @@
+import asyncio
+import itertools
+import logging
+import random
+
+import numpy as np
+
+from livekit import rtc
+from audio_utils import SAMPLE_RATE, NUM_CHANNELS, FormantSynthesizer
+
+class LoopbackNetwork:
+    """Settings of the simulated path between the test client and the loopback agent.
+
+    Every audio frame is delayed by latency_ms plus a uniform random 0..jitter_ms
+    (frames stay in order, as after a jitter buffer) and dropped with probability
+    loss. The random draws are seeded, so a run is repeatable. With realtime=False
+    audio sources are not paced and frames are delivered as fast as the event loop
+    allows, which is what throughput benchmarks want.
+    """
+
+    def __init__(self, latency_ms: float = 20, jitter_ms: float = 0, loss: float = 0.0,
+                 seed: int = 0, realtime: bool = True):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.loss = loss
+        self.seed = seed
+        self.realtime = realtime
+
+class LoopbackLink:
+    """One direction of the simulated network for one room."""
+
+    def __init__(self, network: LoopbackNetwork, name: str):
+        self.network = network
+        self.name = name
+        self._rng = random.Random(f"{network.seed}:{name}")
+        self._last_delivery = 0.0
+        self.sent = 0
+        self.lost = 0
+
+    def send(self, samples: np.ndarray, sent_at: float, deliver) -> None:
+        """Deliver samples (a frame sent at loop time sent_at) after the simulated delay, unless lost."""
+        loop = asyncio.get_running_loop()
+        self.sent += 1
+        # Always draw both numbers so the pattern of losses does not depend on the delays
+        lost = self._rng.random() < self.network.loss
+        delay = self.network.latency + self._rng.uniform(0, self.network.jitter)
+        if lost:
+            self.lost += 1
+            return
+        if not self.network.realtime:
+            loop.call_soon(deliver, samples)
+            return
+        at = max(sent_at + delay, self._last_delivery)
+        self._last_delivery = at
+        loop.call_at(at, deliver, samples)
+
+    def signal(self, sent_at: float, callback, *args) -> None:
+        """Run a reliable signalling callback (sent at loop time sent_at) after the base latency."""
+        loop = asyncio.get_running_loop()
+        if self.network.realtime:
+            loop.call_at(sent_at + self.network.latency, callback, *args)
+        else:
+            loop.call_soon(callback, *args)
+
+    def stats(self) -> dict:
+        return {"sent": self.sent, "lost": self.lost}
+
+class LoopbackParticipant:
+    def __init__(self, sid: str, identity: str, name: str = None):
+        self.sid = sid
+        self.identity = identity
+        self.name = name or identity
+
+class LoopbackPublication:
+    def __init__(self, sid: str, track):
+        self.sid = sid
+        self.track = track
+        self.kind = track.kind
+
+class LoopbackAudioFrame:
+    """The parts of rtc.AudioFrame that received audio is read through."""
+
+    def __init__(self, samples: np.ndarray, sample_rate: int = SAMPLE_RATE, num_channels: int = NUM_CHANNELS):
+        self.data = memoryview(samples)
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.samples_per_channel = len(samples) // num_channels
+
+class LoopbackFrameEvent:
+    def __init__(self, frame: LoopbackAudioFrame):
+        self.frame = frame
+
+class LoopbackAudioTrack:
+    """An audio track; frames sent on it go through its link to every subscriber."""
+
+    kind = rtc.TrackKind.KIND_AUDIO
+
+    def __init__(self, name: str, source: "LoopbackAudioSource"):
+        self.name = name
+        self.source = source
+        self.sid = None
+        self.link = None
+        self._subscribers = []
+        source.track = self
+
+    @staticmethod
+    def create_audio_track(name: str, source: "LoopbackAudioSource") -> "LoopbackAudioTrack":
+        return LoopbackAudioTrack(name, source)
+
+    def subscribe(self, callback) -> None:
+        self._subscribers.append(callback)
+
+    def unsubscribe(self, callback) -> None:
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    def send(self, samples: np.ndarray, sent_at: float) -> None:
+        if self.link is not None:
+            self.link.send(samples, sent_at, self._fan_out)
+
+    def _fan_out(self, samples: np.ndarray) -> None:
+        for callback in list(self._subscribers):
+            callback(samples)
+
+    def close(self) -> None:
+        """End every subscriber's stream."""
+        for callback in list(self._subscribers):
+            callback(None)
+        self._subscribers.clear()
+
+class LoopbackAudioSource:
+    """Stand-in for rtc.AudioSource.
+
+    capture_frame copies the frame and sends it on the published track. In
+    realtime mode it paces the caller like the real source: frames queue up to
+    queue_size_ms ahead of real time before capture_frame starts waiting.
+    """
+
+    def __init__(self, sample_rate: int = SAMPLE_RATE, num_channels: int = NUM_CHANNELS,
+                 queue_size_ms: int = 1000):
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self.queue_size = queue_size_ms / 1000
+        self.track = None
+        self.realtime = True
+        self._playout = 0.0
+
+    async def capture_frame(self, frame) -> None:
+        samples = np.frombuffer(frame.data, dtype=np.int16).copy()
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if not self.realtime:
+            sent_at = now
+        else:
+            # The frame leaves the queue once everything captured before it has played out
+            sent_at = self._playout = max(self._playout, now)
+            self._playout += len(samples) / self.num_channels / self.sample_rate
+            ahead = self._playout - now - self.queue_size
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+        if self.track is not None:
+            self.track.send(samples, sent_at)
+
+    @property
+    def queued_duration(self) -> float:
+        """Seconds of captured audio that have not played out yet."""
+        if not self.realtime:
+            return 0.0
+        return max(0.0, self._playout - asyncio.get_running_loop().time())
+
+    async def wait_for_playout(self) -> None:
+        """Wait until every captured frame has played out, like rtc.AudioSource.wait_for_playout."""
+        remaining = self.queued_duration
+        if remaining > 0:
+            await asyncio.sleep(remaining)
+
+class LoopbackAudioStream:
+    """Stand-in for rtc.AudioStream: async iterator of frame events received on a track.
+
+    Unlike a real stream it only yields the frames the remote side actually sent
+    (no comfort silence while the agent is quiet). Iteration ends when the track
+    is closed.
+    """
+
+    def __init__(self, track: LoopbackAudioTrack, sample_rate: int = SAMPLE_RATE,
+                 num_channels: int = NUM_CHANNELS):
+        self.track = track
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+        self._queue = asyncio.Queue()
+        track.subscribe(self._queue.put_nowait)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> LoopbackFrameEvent:
+        samples = await self._queue.get()
+        if samples is None:
+            raise StopAsyncIteration
+        return LoopbackFrameEvent(LoopbackAudioFrame(samples, self.sample_rate, self.num_channels))
+
+    async def aclose(self) -> None:
+        self.track.unsubscribe(self._queue.put_nowait)
+        self._queue.put_nowait(None)
+
+class EchoAgent:
+    """A fake agent that greets the client on joining and then repeats back whatever it hears.
+
+    Once the client has been quiet for end_of_speech_ms after speaking, the agent
+    waits reply_delay_ms and plays the utterance back, reporting itself as an
+    active speaker for the duration, like a voice agent answering a prompt. The
+    greeting is rendered with the formant synthesizer; pass greeting=None to skip it.
+    """
+
+    identity = "agent-loopback"
+
+    def __init__(self, room: "LoopbackRoom", reply_delay_ms: float = 300, end_of_speech_ms: float = 500,
+                 threshold: float = 300.0, max_utterance_s: float = 30.0,
+                 greeting: str = "Hello, how can I help you today?"):
+        self.room = room
+        self.reply_delay = reply_delay_ms / 1000
+        self.end_of_speech = end_of_speech_ms / 1000
+        self.threshold = threshold
+        self.max_samples = int(max_utterance_s * SAMPLE_RATE)
+        self.greeting = greeting
+        self.participant = LoopbackParticipant("PA_agent", self.identity)
+        self.track = LoopbackAudioTrack("agent-audio", LoopbackAudioSource())
+        self.replies = 0
+        self._utterance = []
+        self._utterance_samples = 0
+        self._end_timer = None
+        self._busy_until = 0.0
+
+    def on_frame(self, samples: np.ndarray) -> None:
+        """Handle a frame of client audio delivered over the uplink."""
+        if samples is None:
+            return
+        voiced = np.sqrt(np.mean(samples.astype(np.float32) ** 2)) >= self.threshold
+        if not voiced and not self._utterance:
+            return
+        if self._utterance_samples < self.max_samples:
+            self._utterance.append(samples)
+            self._utterance_samples += len(samples)
+        if voiced:
+            # The utterance ends once no voiced frame has arrived for end_of_speech seconds
+            if self._end_timer is not None:
+                self._end_timer.cancel()
+            self._end_timer = asyncio.get_running_loop().call_later(self.end_of_speech, self._reply)
+
+    def greet(self) -> None:
+        """Say the greeting, if any, right after joining."""
+        if self.greeting:
+            self.say(FormantSynthesizer().render(self.greeting), delay=0.0)
+
+    def _reply(self) -> None:
+        samples = np.concatenate(self._utterance)
+        self._utterance = []
+        self._utterance_samples = 0
+        self._end_timer = None
+        self.replies += 1
+        self.say(samples, self.reply_delay)
+
+    def say(self, samples: np.ndarray, delay: float) -> None:
+        """Play samples after delay seconds (or once the previous reply has finished)."""
+        start = max(asyncio.get_running_loop().time() + delay, self._busy_until)
+        frame_duration = 480 / SAMPLE_RATE
+        link = self.track.link
+        link.signal(start, self.room.emit, "active_speakers_changed", [self.participant])
+        for i, position in enumerate(range(0, len(samples), 480)):
+            self.track.send(samples[position:position + 480], start + i * frame_duration)
+        self._busy_until = start + -(-len(samples) // 480) * frame_duration
+        link.signal(self._busy_until, self.room.emit, "active_speakers_changed", [])
+
+    def close(self) -> None:
+        if self._end_timer is not None:
+            self._end_timer.cancel()
+        self.track.close()
+
+class LoopbackLocalParticipant(LoopbackParticipant):
+    def __init__(self, room: "LoopbackRoom"):
+        super().__init__("PA_local", "python-publisher")
+        self.room = room
+        self.track_publications = {}
+
+    async def publish_track(self, track: LoopbackAudioTrack, options=None) -> LoopbackPublication:
+        track.sid = self.room.next_sid("TR")
+        track.link = self.room.uplink
+        track.source.realtime = self.room.network.realtime
+        publication = LoopbackPublication(track.sid, track)
+        self.track_publications[track.sid] = publication
+        if self.room.agent is not None:
+            track.subscribe(self.room.agent.on_frame)
+        self.room.emit("local_track_published", publication, track)
+        return publication
+
+class LoopbackRoom:
+    """In-process stand-in for rtc.Room with an EchoAgent as the only remote participant.
+
+    The agent joins join_delay_ms after connect() and publishes an audio track
+    that the client is subscribed to automatically.
+    """
+
+    def __init__(self, loop=None, network: LoopbackNetwork = None, name: str = "loopback",
+                 join_delay_ms: float = 500, **agent_options):
+        self.network = network or LoopbackNetwork()
+        self.name = name
+        self.join_delay = join_delay_ms / 1000
+        self.agent_options = agent_options
+        self.local_participant = LoopbackLocalParticipant(self)
+        self.remote_participants = {}
+        self.uplink = LoopbackLink(self.network, f"{name}:up")
+        self.downlink = LoopbackLink(self.network, f"{name}:down")
+        self.agent = None
+        self._handlers = {}
+        self._sids = itertools.count(1)
+        self._join_timer = None
+
+    def next_sid(self, prefix: str) -> str:
+        return f"{prefix}_{next(self._sids)}"
+
+    def on(self, event: str, callback=None):
+        """Register a handler; used as a decorator when callback is omitted (like rtc.Room.on)."""
+        if callback is None:
+            return lambda callback: self.on(event, callback)
+        self._handlers.setdefault(event, []).append(callback)
+        return callback
+
+    def emit(self, event: str, *args) -> None:
+        for callback in list(self._handlers.get(event, ())):
+            callback(*args)
+
+    async def connect(self, url: str = None, token: str = None, options=None) -> None:
+        self.agent = EchoAgent(self, **self.agent_options)
+        self.agent.track.link = self.downlink
+        self.agent.track.source.realtime = self.network.realtime
+        self.emit("connected")
+        self._join_timer = asyncio.get_running_loop().call_later(self.join_delay, self._agent_joined)
+
+    def _agent_joined(self) -> None:
+        participant = self.agent.participant
+        self.remote_participants[participant.identity] = participant
+        self.emit("participant_connected", participant)
+        self.agent.track.sid = self.next_sid("TR")
+        publication = LoopbackPublication(self.agent.track.sid, self.agent.track)
+        self.emit("track_subscribed", self.agent.track, publication, participant)
+        self.agent.greet()
+
+    async def disconnect(self) -> None:
+        if self._join_timer is not None:
+            self._join_timer.cancel()
+        for publication in self.local_participant.track_publications.values():
+            publication.track.close()
+        if self.agent is not None:
+            self.agent.close()
+        self.emit("disconnected")
+
+    def stats(self) -> dict:
+        """Return the simulated network counters."""
+        return {
+            "uplink": self.uplink.stats(),
+            "downlink": self.downlink.stats(),
+            "agent_replies": self.agent.replies if self.agent else 0,
+        }
+
+class LoopbackRTC:
+    """Stand-in for the livekit.rtc module that creates loopback rooms.
+
+    Assign an instance to ClientState.rtc to run a session without a server.
+    Rooms are named loopback-1, loopback-2, ... so each gets its own
+    (deterministic) random draws.
+    """
+
+    requires_token = False
+    AudioSource = LoopbackAudioSource
+    AudioStream = LoopbackAudioStream
+    LocalAudioTrack = LoopbackAudioTrack
+
+    def __init__(self, network: LoopbackNetwork = None, **room_options):
+        self.network = network or LoopbackNetwork()
+        self.room_options = room_options
+        self._rooms = itertools.count(1)
+
+    def Room(self, loop=None) -> LoopbackRoom:
+        return LoopbackRoom(loop, self.network, f"loopback-{next(self._rooms)}", **self.room_options)
+
+def add_loopback_arguments(parser) -> None:
+    """Add the --loopback option and the simulated network settings to an argparse parser."""
+    group = parser.add_argument_group('loopback', 'Run against an in-process echo agent instead of a server')
+    group.add_argument('--loopback', action='store_true', help='Use the in-process loopback transport')
+    group.add_argument('--net-latency-ms', type=float, default=20, help='Simulated one-way latency')
+    group.add_argument('--net-jitter-ms', type=float, default=0, help='Simulated jitter (extra 0..N ms)')
+    group.add_argument('--net-loss', type=float, default=0.0, help='Simulated packet loss probability')
+    group.add_argument('--net-seed', type=int, default=0, help='Seed of the simulated jitter and loss')
+    group.add_argument('--agent-reply-ms', type=float, default=300,
+                       help='Delay before the echo agent replies')
+
+def transport_from_args(args):
+    """Return the rtc implementation selected by the add_loopback_arguments options."""
+    if not args.loopback:
+        return rtc
+    network = LoopbackNetwork(args.net_latency_ms, args.net_jitter_ms, args.net_loss, args.net_seed)
+    logging.info("Using the loopback transport (latency %.0f ms, jitter %.0f ms, loss %.1f%%)",
+                 args.net_latency_ms, args.net_jitter_ms, args.net_loss * 100)
+    return LoopbackRTC(network, reply_delay_ms=args.agent_reply_ms)
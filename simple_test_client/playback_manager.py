@@ -0,0 +1,113 @@
+import asyncio
+import logging
+
+from audio_utils import play_audio_stream
+
+DEFAULT_MAX_STREAMS = 8
+
+class Playback:
+    """One subscribed track being fed into a sink."""
+
+    def __init__(self, sid: str, identity: str, stream, sink):
+        self.sid = sid
+        self.identity = identity
+        self.stream = stream
+        self.sink = sink
+        self.task = None
+
+class PlaybackManager:
+    """Audio playback of a session's subscribed tracks, keyed by track SID.
+
+    start() opens a stream and sink for a track unless max_streams are already
+    playing; stop() tears a track's playback down on unsubscribe, and
+    stop_participant()/stop_all() do the same for everything of a participant
+    or the whole session. Finished playbacks remove themselves, so nothing
+    accumulates over reconnects.
+    """
+
+    def __init__(self, max_streams: int = DEFAULT_MAX_STREAMS):
+        self.max_streams = max_streams
+        self._playbacks: dict[str, Playback] = {}
+        self._closing = set()  # Tasks of stopped playbacks that are still closing
+        self.started = 0
+        self.stopped = 0
+        self.ended = 0
+        self.rejected = 0
+        self.peak = 0
+
+    @property
+    def active(self) -> int:
+        return len(self._playbacks)
+
+    def start(self, track, sid: str, identity: str, stream_factory, sink_factory, on_frame=None) -> bool:
+        """Play track into a new sink; returns False if the stream limit is reached."""
+        if sid in self._playbacks:
+            # Subscribed again (e.g. after a reconnect); replace the old playback
+            self.stop(sid)
+        if self.active >= self.max_streams:
+            self.rejected += 1
+            logging.warning("Not playing track %s from %s: %d streams already active",
+                            sid, identity, self.active)
+            return False
+
+        playback = Playback(sid, identity, stream_factory(track), sink_factory(f"{identity}_{sid}"))
+        playback.task = asyncio.ensure_future(self._run(playback, on_frame))
+        self._playbacks[sid] = playback
+        self.started += 1
+        self.peak = max(self.peak, self.active)
+        logging.info("Started audio playback of %s from %s (%d active)", sid, identity, self.active)
+        return True
+
+    async def _run(self, playback: Playback, on_frame) -> None:
+        try:
+            await play_audio_stream(playback.stream, playback.sink, on_frame)
+        finally:
+            try:
+                await playback.stream.aclose()
+            except Exception as e:
+                logging.error("Error closing audio stream %s: %s", playback.sid, e)
+            if self._playbacks.get(playback.sid) is playback:
+                # The stream ended by itself
+                del self._playbacks[playback.sid]
+                self.ended += 1
+
+    def stop(self, sid: str) -> None:
+        """Stop playing a track and close its stream and sink."""
+        playback = self._playbacks.pop(sid, None)
+        if playback is None:
+            return
+        playback.task.cancel()
+        self._closing.add(playback.task)
+        playback.task.add_done_callback(self._closing.discard)
+        self.stopped += 1
+        logging.info("Stopped audio playback of %s from %s (%d active)", sid, playback.identity, self.active)
+
+    def stop_participant(self, identity: str) -> None:
+        """Stop playing every track of a participant."""
+        for sid in [sid for sid, playback in self._playbacks.items() if playback.identity == identity]:
+            self.stop(sid)
+
+    def stop_all(self) -> None:
+        """Stop every playback."""
+        for sid in list(self._playbacks):
+            self.stop(sid)
+
+    async def aclose(self) -> None:
+        """Stop every playback and wait for the streams and sinks to close."""
+        self.stop_all()
+        await asyncio.gather(*self._closing, return_exceptions=True)
+
+    def tasks(self) -> list[asyncio.Task]:
+        """Return the tasks of the active playbacks."""
+        return [playback.task for playback in self._playbacks.values()]
+
+    def stats(self) -> dict:
+        """Return active and lifetime stream counts."""
+        return {
+            "active": self.active,
+            "peak": self.peak,
+            "started": self.started,
+            "stopped": self.stopped,
+            "ended": self.ended,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,231 @@
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import os
+import sys
+import time
+import wave
+from datetime import datetime, timezone
+
+import numpy as np
+
+from room_manager import run_session
+from audio_sinks import MemorySink, NullSink
+from audio_utils import SAMPLE_RATE, SYNTHESIZERS, create_synthesizer, set_synthesizer
+from latency import summarize
+from loopback import add_loopback_arguments, transport_from_args
+from instrumentation import add_instrumentation_arguments, instrumentation_from_args
+from speech_detection import frame_energy_db
+
+METRICS = ("time_to_first_audio", "audio_duration", "response_complete", "response_level_db")
+
+class ResponseRecorder(MemorySink):
+    """Keeps the agent's audio in memory with the arrival time of every frame, so it can be cut per turn."""
+
+    name = "replay"
+
+    def __init__(self):
+        super().__init__()
+        self.times = []  # time.monotonic() of every received frame
+        self.offsets = []  # Offset of that frame in samples()
+
+    def write(self, samples: np.ndarray) -> None:
+        self.times.append(time.monotonic())
+        self.offsets.append(self.samples_received)
+        super().write(samples)
+
+    def between(self, start: float, end: float, samples: np.ndarray) -> np.ndarray:
+        """Return the part of samples (from samples()) that arrived between the start and end times."""
+        first = bisect.bisect_left(self.times, start)
+        last = bisect.bisect_left(self.times, end)
+        return samples[self.offsets[first] if first < len(self.offsets) else len(samples):
+                       self.offsets[last] if last < len(self.offsets) else len(samples)]
+
+def write_wav(path: str, samples: np.ndarray) -> None:
+    with wave.open(path, 'wb') as wav_file:
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(SAMPLE_RATE)
+        wav_file.writeframes(samples.tobytes())
+
+async def replay_once(fixture: str, run: int, args, transport, instrumentation=None) -> dict:
+    """Replay the fixture once in its own room, saving the agent's response to every turn."""
+    recorders = []
+
+    def sink_factory(name: str):
+        if not name.startswith("agent-"):
+            return NullSink()
+        recorders.append(ResponseRecorder())
+        return recorders[-1]
+
+    script, result = await run_session(fixture, f"{args.room}-{run}", identity=f"replay-{run}",
+                                       sink_factory=sink_factory, timeout=args.timeout,
+                                       transport=transport, instrumentation=instrumentation, paced=True)
+    run_dir = os.path.join(args.output_dir, f"run{run}")
+    os.makedirs(run_dir, exist_ok=True)
+    recorder = recorders[0] if recorders else ResponseRecorder()
+    received = recorder.samples()
+    write_wav(os.path.join(run_dir, "session.wav"), received)
+
+    turns = []
+    latency = script.latency.turns if script else []
+    for index, turn in enumerate(latency):
+        # The response to a turn is everything received until the next prompt starts
+        start = turn.playback_end if turn.playback_end is not None else turn.playback_start
+        end = latency[index + 1].playback_start if index + 1 < len(latency) else float('inf')
+        response = recorder.between(start, end, received)
+        response_file = os.path.join(f"run{run}", f"turn{index:02d}.wav")
+        write_wav(os.path.join(args.output_dir, response_file), response)
+        speech = (recorder.between(turn.first_audio, turn.audio_end, received)
+                  if turn.first_audio is not None and turn.audio_end is not None else response[:0])
+        turns.append({
+            "index": index,
+            "kind": turn.kind,
+            "label": turn.label,
+            "start_sample": turn.start_sample,
+            "end_sample": turn.end_sample,
+            **turn.durations(),
+            "response_level_db": frame_energy_db(speech) if len(speech) else None,
+            "response_seconds": len(response) / SAMPLE_RATE,
+            "response_file": response_file,
+        })
+
+    logging.log(logging.INFO if result["success"] else logging.ERROR,
+                "Run %d %s: %s", run, "passed" if result["success"] else "failed", result["message"])
+    return {
+        "run": run,
+        **result,
+        "steps": script.step_results if script else [],
+        "player": script.player.stats() if script and script.player else None,
+        "turns": turns,
+    }
+
+def aggregate(runs: list[dict]) -> dict:
+    """Summarize every metric per turn (matched by index) and over all turns of all runs."""
+    turns = {}
+    overall = {name: [] for name in METRICS}
+    for run in runs:
+        for turn in run["turns"]:
+            entry = turns.setdefault(turn["index"], {
+                "index": turn["index"],
+                "kind": turn["kind"],
+                "label": turn["label"],
+                "start_sample": turn["start_sample"],
+                "end_sample": turn["end_sample"],
+                "values": {name: [] for name in METRICS},
+                "responses": [],
+            })
+            entry["responses"].append(turn["response_file"])
+            for name in METRICS:
+                if turn[name] is not None:
+                    entry["values"][name].append(turn[name])
+                    overall[name].append(turn[name])
+    summarized = []
+    for index in sorted(turns):
+        entry = turns[index]
+        values = entry.pop("values")
+        summarized.append({**entry, **{name: summarize(values[name]) for name in METRICS}})
+    return {"turns": summarized, "summary": {name: summarize(overall[name]) for name in METRICS}}
+
+async def replay(fixture: str, args) -> list[dict]:
+    """Replay the fixture args.runs times, one run after another."""
+    transport = transport_from_args(args)
+    instrumentation = instrumentation_from_args(args)
+    if instrumentation:
+        instrumentation.start()
+    try:
+        return [await replay_once(fixture, run, args, transport, instrumentation)
+                for run in range(1, args.runs + 1)]
+    finally:
+        if instrumentation:
+            await instrumentation.stop()
+
+def _p50(summary: dict) -> float:
+    return summary.get("p50") if summary else None
+
+def _delta(old: float, new: float, unit: str = "ms") -> str:
+    if old is None or new is None:
+        return f"{'-' if old is None else f'{old:.0f}'} -> {'-' if new is None else f'{new:.0f}'}"
+    return f"{old:.0f} -> {new:.0f} ({new - old:+.0f} {unit})"
+
+def compare(baseline: dict, report: dict, max_regression_ms: float = None) -> tuple[list[str], bool]:
+    """Compare a report with a baseline report turn by turn.
+
+    Returns the comparison lines and whether the median time to first audio of
+    any turn (or overall) got worse by more than max_regression_ms.
+    """
+    lines = [f"Comparing {report.get('label') or 'this run'} with {baseline.get('label') or 'baseline'} "
+             f"(p50 over {baseline['runs']} vs {report['runs']} runs)"]
+    old_turns = {turn["index"]: turn for turn in baseline["turns"]}
+    if [turn["label"] for turn in baseline["turns"]] != [turn["label"] for turn in report["turns"]]:
+        lines.append("warning: the fixtures differ; turns are compared by index")
+    regressed = False
+    lines.append(f"{'turn':>4}  {'prompt':<32}  {'time to first audio':<28}  {'audio duration':<28}  level (dBFS)")
+    rows = [(turn["index"], turn["label"], old_turns.get(turn["index"], {}), turn) for turn in report["turns"]]
+    rows.append(("all", "", baseline["summary"], report["summary"]))
+    for index, label, old, new in rows:
+        old_ttfa, new_ttfa = _p50(old.get("time_to_first_audio")), _p50(new.get("time_to_first_audio"))
+        flag = ""
+        if max_regression_ms is not None and old_ttfa is not None and new_ttfa is not None \
+                and new_ttfa - old_ttfa > max_regression_ms:
+            flag = "  REGRESSION"
+            regressed = True
+        lines.append(f"{index:>4}  {os.path.basename(label)[:32]:<32}  {_delta(old_ttfa, new_ttfa):<28}  "
+                     f"{_delta(_p50(old.get('audio_duration')), _p50(new.get('audio_duration'))):<28}  "
+                     f"{_delta(_p50(old.get('response_level_db')), _p50(new.get('response_level_db')), 'dB')}"
+                     f"{flag}")
+    return lines, regressed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Replay a recorded multi-turn fixture against an agent')
+    parser.add_argument('fixture', help='Test script of wav/tts turns separated by wait or wait_for_silence steps')
+    parser.add_argument('--runs', type=int, default=1, help='Number of times to replay the fixture')
+    parser.add_argument('--label', help='Name of this run in the report (e.g. the agent build)')
+    parser.add_argument('--output-dir', default='replay', help='Directory for the report and response audio')
+    parser.add_argument('--compare', help='Compare with the report of an earlier run')
+    parser.add_argument('--max-regression-ms', type=float,
+                        help='Exit with status 1 if a median time to first audio got this much worse')
+    parser.add_argument('--room', default='replay', help='Room name prefix (one room per run)')
+    parser.add_argument('--timeout', type=float, default=600, help='Seconds before a run is failed')
+    parser.add_argument('--tts', choices=SYNTHESIZERS, default=os.getenv('TTS_BACKEND', 'gtts'),
+                        help='Speech backend for tts turns')
+    parser.add_argument('--phrase-dir', default=os.getenv('TTS_PHRASE_DIR'),
+                        help='Directory of pre-rendered phrases for the phrases backend')
+    parser.add_argument('--verbose', action='store_true', help='Log every script event')
+    add_loopback_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    set_synthesizer(create_synthesizer(args.tts, args.phrase_dir))
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    runs = asyncio.run(replay(args.fixture, args))
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "label": args.label,
+        "fixture": args.fixture,
+        "runs": len(runs),
+        "passed": sum(run["success"] for run in runs),
+        **aggregate(runs),
+        "sessions": runs,
+    }
+    path = os.path.join(args.output_dir, "report.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    ttfa = report["summary"]["time_to_first_audio"]
+    print(f"{report['passed']}/{report['runs']} runs passed; "
+          + (f"time to first audio p50 {ttfa['p50']:.0f} ms, p95 {ttfa['p95']:.0f} ms over {ttfa['count']} turns"
+             if ttfa["count"] else "no agent responses detected")
+          + f"; report written to {path}")
+    regressed = False
+    if baseline:
+        lines, regressed = compare(baseline, report, args.max_regression_ms)
+        print("\n".join(lines))
+    sys.exit(0 if report["passed"] == report["runs"] and not regressed else 1)
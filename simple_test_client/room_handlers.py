@@ -1,15 +1,29 @@
 import logging
-import asyncio
 from typing import Union
 from livekit import rtc
 from test_script import TestScript
-from audio_utils import play_audio_stream
-from shared_state import audio_playback_tasks  # Import from shared_state instead
-
-def setup_room_handlers(room: rtc.Room, script: TestScript = None) -> None:
-    """Set up all room event handlers."""
+from audio_sinks import create_sink
+from shared_state import ClientState, default_state
+
+def setup_room_handlers(room: rtc.Room, script: TestScript = None, sink_factory=None,
+                        state: ClientState = None) -> None:
+    """Set up all room event handlers.
+
+    sink_factory(name) creates the audio sink for each subscribed audio track;
+    by default audio is played on the local output device. Playback is managed
+    by state.playback (the default session unless given). When the state has
+    an Instrumentation, every handler and received audio frame is timed.
+    """
+    state = state or default_state
+    if sink_factory is None:
+        sink_factory = lambda name: create_sink("device", name)
+    timed = state.instrumentation.timed if state.instrumentation else lambda name, callback: callback
+
+    def on(event: str):
+        """Register a handler for a room event, timed under the event name."""
+        return lambda handler: room.on(event, timed(event, handler))
     
-    @room.on("participant_connected")
+    @on("participant_connected")
     def on_participant_connected(participant: rtc.RemoteParticipant) -> None:
         """Handle participant connection events."""
         logging.info("participant connected: %s %s", participant.sid, participant.identity)
@@ -17,14 +31,15 @@ def setup_room_handlers(room: rtc.Room, script: TestScript = None) -> None:
             script.set_participant_joined(participant.identity)
             script.set_connection_state("connected", participant.identity)
 
-    @room.on("participant_disconnected")
+    @on("participant_disconnected")
     def on_participant_disconnected(participant: rtc.RemoteParticipant):
         """Handle participant disconnection events."""
         logging.info("participant disconnected: %s %s", participant.sid, participant.identity)
+        state.playback.stop_participant(participant.identity)
         if script:
             script.set_connection_state("disconnected", participant.identity)
 
-    @room.on("local_track_published")
+    @on("local_track_published")
     def on_local_track_published(
         publication: rtc.LocalTrackPublication,
         track: Union[rtc.LocalAudioTrack, rtc.LocalVideoTrack],
@@ -34,7 +49,7 @@ def setup_room_handlers(room: rtc.Room, script: TestScript = None) -> None:
         if script:
             script.set_track_state("published", publication.sid, track.kind)
 
-    @room.on("active_speakers_changed")
+    @on("active_speakers_changed")
     def on_active_speakers_changed(speakers: list[rtc.Participant]):
         """Handle active speakers changes."""
         logging.info("active speakers changed: %s", speakers)
@@ -44,21 +59,21 @@ def setup_room_handlers(room: rtc.Room, script: TestScript = None) -> None:
             script.set_speaking_state(is_speaking)
             script.set_active_speakers([p.identity for p in speakers])
 
-    @room.on("data_received")
+    @on("data_received")
     def on_data_received(data: rtc.DataPacket):
         """Handle data packet reception."""
         logging.info("received data from %s: %s", data.participant.identity, data.data)
         if script:
             script.set_data_received(data.participant.identity, data.data)
 
-    @room.on("track_muted")
+    @on("track_muted")
     def on_track_muted(publication: rtc.RemoteTrackPublication, participant: rtc.RemoteParticipant):
         """Handle track muting events."""
         logging.info("track muted: %s", publication.sid)
         if script:
             script.set_track_state("muted", publication.sid, publication.kind, participant.identity)
 
-    @room.on("track_unmuted")
+    @on("track_unmuted")
     def on_track_unmuted(
         publication: rtc.RemoteTrackPublication, participant: rtc.RemoteParticipant
     ):
@@ -67,14 +82,14 @@ def setup_room_handlers(room: rtc.Room, script: TestScript = None) -> None:
         if script:
             script.set_track_state("unmuted", publication.sid, publication.kind, participant.identity)
 
-    @room.on("local_track_unpublished")
+    @on("local_track_unpublished")
     def on_local_track_unpublished(publication: rtc.LocalTrackPublication):
         """Handle local track unpublishing events."""
         logging.info("local track unpublished: %s", publication.sid)
         if script:
             script.set_track_state("unpublished", publication.sid, publication.kind)
 
-    @room.on("track_subscribed")
+    @on("track_subscribed")
     def on_track_subscribed(
         track: rtc.Track,
         publication: rtc.RemoteTrackPublication,
@@ -91,20 +106,21 @@ def setup_room_handlers(room: rtc.Room, script: TestScript = None) -> None:
         # Set up audio playback for all audio tracks
         if track.kind == rtc.TrackKind.KIND_AUDIO:
             logging.info("Setting up audio playback for participant: %s", participant.identity)
-            if script:
+            # Only the agent's audio counts as received and is run through the speech
+            # detector and latency tracker; other participants are just played back
+            is_agent = TestScript.is_agent(participant.identity)
+            if script and is_agent:
                 script.set_audio_received()
             
             try:
-                _audio_stream = rtc.AudioStream(track)
-                task = asyncio.ensure_future(play_audio_stream(_audio_stream, None))
-                audio_playback_tasks.append(task)
-                logging.info("Started audio playback task for participant: %s (task count: %d)", 
-                           participant.identity, len(audio_playback_tasks))
+                on_frame = timed("audio_frame", script.on_audio_frame) if script and is_agent else None
+                state.playback.start(track, publication.sid, participant.identity,
+                                     state.rtc.AudioStream, sink_factory, on_frame)
             except Exception as e:
                 logging.error("Failed to set up audio playback for participant %s: %s", 
                             participant.identity, e)
 
-    @room.on("track_unsubscribed")
+    @on("track_unsubscribed")
     def on_track_unsubscribed(
         track: rtc.Track,
         publication: rtc.RemoteTrackPublication,
@@ -112,17 +128,18 @@ def setup_room_handlers(room: rtc.Room, script: TestScript = None) -> None:
     ):
         """Handle track unsubscription events."""
         logging.info("track unsubscribed: %s", publication.sid)
+        state.playback.stop(publication.sid)
         if script:
             script.set_track_state("unsubscribed", publication.sid, track.kind, participant.identity)
 
-    @room.on("connection_quality_changed")
+    @on("connection_quality_changed")
     def on_connection_quality_changed(participant: rtc.Participant, quality: rtc.ConnectionQuality):
         """Handle connection quality changes."""
         logging.info("connection quality changed for %s", participant.identity)
         if script:
             script.set_connection_quality(participant.identity, quality)
 
-    @room.on("track_subscription_failed")
+    @on("track_subscription_failed")
     def on_track_subscription_failed(
         participant: rtc.RemoteParticipant, track_sid: str, error: str
     ):
@@ -131,35 +148,36 @@ def setup_room_handlers(room: rtc.Room, script: TestScript = None) -> None:
         if script:
             script.set_track_state("subscription_failed", track_sid, None, participant.identity, error)
 
-    @room.on("connection_state_changed")
+    @on("connection_state_changed")
     def on_connection_state_changed(state: rtc.ConnectionState):
         """Handle connection state changes."""
         logging.info("connection state changed: %s", state)
         if script:
             script.set_connection_state(state)
 
-    @room.on("connected")
+    @on("connected")
     def on_connected() -> None:
         """Handle successful connection events."""
         logging.info("connected")
         if script:
             script.set_connection_state("connected")
 
-    @room.on("disconnected")
+    @on("disconnected")
     def on_disconnected() -> None:
         """Handle disconnection events."""
         logging.info("disconnected")
+        state.playback.stop_all()
         if script:
             script.set_connection_state("disconnected")
 
-    @room.on("reconnecting")
+    @on("reconnecting")
     def on_reconnecting() -> None:
         """Handle reconnection attempts."""
         logging.info("reconnecting")
         if script:
             script.set_connection_state("reconnecting")
 
-    @room.on("reconnected")
+    @on("reconnected")
     def on_reconnected() -> None:
         """Handle successful reconnection events."""
         logging.info("reconnected")
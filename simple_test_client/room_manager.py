@@ -1,11 +1,14 @@
 import os
 import logging
 import asyncio
+import time
+from typing import Optional
 from livekit import rtc, api
 from test_script import TestScript
+from script_steps import ScriptError
 from room_handlers import setup_room_handlers
 from audio_utils import play_string, play_wav
-from shared_state import audio_playback_tasks, publish_source, room
+from shared_state import ClientState, default_state
 
 SAMPLE_RATE = 48000
 NUM_CHANNELS = 1
@@ -33,54 +36,97 @@ async def handle_console_input(source: rtc.AudioSource) -> None:
             if text.lower() in ['/exit', '/quit', 'exit', 'quit']:
                 os._exit(1)
 
-async def run_room(room_instance: rtc.Room, room_name: str, script: TestScript = None) -> None:
-    """Run the room and handle participant connections and disconnections."""
-    global publish_source, room
-    room = room_instance
-    
+async def connect_and_publish(room: rtc.Room, room_name: str, script: TestScript = None,
+                              state: ClientState = None,
+                              identity: str = "python-publisher") -> rtc.AudioSource:
+    """Connect to the room and publish a microphone track, returning its audio source.
+
+    Raises rtc.ConnectError if the connection fails.
+    """
+    state = state or default_state
+    state.room = room
+
     @room.on("participant_disconnected")
     def on_participant_disconnect(participant: rtc.Participant, *_):
         logging.info("participant disconnected: %s", participant.identity)
         if script:
             script.set_connection_state("disconnected", participant.identity)
 
-    token = (
-        api.AccessToken()
-        .with_identity("python-publisher")
-        .with_name("Python Publisher")
-        .with_grants(
-            api.VideoGrants(
-                room_join=True,
-                room=room_name,
+    token = None
+    if getattr(state.rtc, "requires_token", True):
+        token = (
+            api.AccessToken()
+            .with_identity(identity)
+            .with_name("Python Publisher")
+            .with_grants(
+                api.VideoGrants(
+                    room_join=True,
+                    room=room_name,
+                )
             )
+            .to_jwt()
         )
-        .to_jwt()
-    )
     url = os.getenv("LIVEKIT_URL")
 
     logging.info("connecting to %s", url)
-    try:
-        await room.connect(
-            url,
-            token,
-            options=rtc.RoomOptions(
-                auto_subscribe=True,
-            ),
-        )
-        logging.info("connected to room %s", room.name)
-    except rtc.ConnectError as e:
-        logging.error("failed to connect to the room: %s", e)
-        return
+    await room.connect(
+        url,
+        token,
+        options=rtc.RoomOptions(
+            auto_subscribe=True,
+        ),
+    )
+    logging.info("connected to room %s", room.name)
 
     # Create audio source for publishing
-    publish_source = rtc.AudioSource(SAMPLE_RATE, NUM_CHANNELS)
+    state.publish_source = state.rtc.AudioSource(SAMPLE_RATE, NUM_CHANNELS)
 
     # publish a track for sending audio
-    publish_track = rtc.LocalAudioTrack.create_audio_track("publish", publish_source)
+    publish_track = state.rtc.LocalAudioTrack.create_audio_track("publish", state.publish_source)
     publish_options = rtc.TrackPublishOptions()
     publish_options.source = rtc.TrackSource.SOURCE_MICROPHONE
     publication = await room.local_participant.publish_track(publish_track, publish_options)
     logging.info("published track %s", publication.sid)
+    return state.publish_source
+
+async def run_script(script: TestScript, source: rtc.AudioSource) -> bool:
+    """Run every script command, then log and report the result."""
+    try:
+        while not script.is_finished():
+            await script.execute_command(source)
+    finally:
+        await script.aclose()
+
+    # Get and log test result
+    success, message = script.get_test_result()
+    script.finish()
+    if success:
+        logging.info("Test completed successfully")
+    else:
+        logging.error(f"Test failed: {message}")
+    return success
+
+async def run_room(room_instance: rtc.Room, room_name: str, script: TestScript = None,
+                   state: ClientState = None) -> bool:
+    """Run the room and handle participant connections and disconnections.
+
+    With a script, returns whether the test passed once it has run; otherwise
+    runs until console input ends. Returns False if the script cannot be prepared
+    or the connection fails.
+    """
+    if script:
+        try:
+            # Load all media before connecting so a broken script never joins the room
+            await script.prepare()
+        except Exception as e:
+            logging.error("failed to prepare the test script: %s", e)
+            return False
+
+    try:
+        publish_source = await connect_and_publish(room_instance, room_name, script, state)
+    except rtc.ConnectError as e:
+        logging.error("failed to connect to the room: %s", e)
+        return False
 
     # Start console input handling in the background
     console_task = asyncio.ensure_future(handle_console_input(publish_source))
@@ -88,45 +134,85 @@ async def run_room(room_instance: rtc.Room, room_name: str, script: TestScript =
     if script:
         try:
             # Run script commands
-            while not script.is_finished():
-                await script.execute_command(publish_source)
-                await asyncio.sleep(0.1)  # Small delay between commands
-            
-            # Get and log test result
-            success, message = script.get_test_result()
-            if success:
-                logging.info("Test completed successfully")
-            else:
-                logging.error(f"Test failed: {message}")
-                os._exit(0)
+            return await run_script(script, publish_source)
         except asyncio.CancelledError:
             logging.info("Script execution cancelled")
-            os._exit(0)
+            return False
         finally:
-            # Cancel the console input task and exit
+            # Stop reading console input once the script is done
             console_task.cancel()
-            os._exit(0)
     else:
         # Wait for the console input task to complete
         await console_task
+        return True
+
+async def run_session(script_path: str, room_name: str, identity: str = "python-publisher",
+                      sink_factory=None, timeout: float = None, report_path: str = None,
+                      transport=None, instrumentation=None, paced: bool = False) -> tuple[Optional[TestScript], dict]:
+    """Run a script in its own room and session, returning the script and a result dict.
+
+    The script is None if it could not be loaded. Every error, including an
+    invalid script file, is caught and recorded in the result, so one failing session
+    cannot take down others running on the same event loop. transport and
+    instrumentation are passed to the session's ClientState; paced streams the
+    script's audio on a continuous sample-clocked track (see PacedPlayer).
+    """
+    result = {"room": room_name, "success": False, "message": None}
+    state = ClientState(transport, instrumentation)
+    script = None
+
+    started = time.monotonic()
+    try:
+        room = state.rtc.Room(loop=asyncio.get_running_loop())
+        script = TestScript(script_path, room, report_path=report_path, paced=paced)
+        setup_room_handlers(room, script, sink_factory, state)
+        await script.prepare()
+        connecting = time.monotonic()
+        result["prepare_time"] = (connecting - started) * 1000
+        source = await connect_and_publish(room, room_name, script, state, identity=identity)
+        result["connect_time"] = (time.monotonic() - connecting) * 1000
+        result["success"] = await asyncio.wait_for(run_script(script, source), timeout)
+        result["message"] = script.get_test_result()[1]
+    except asyncio.TimeoutError:
+        result["message"] = f"Timed out after {timeout}s"
+        if script is not None:
+            # wait_for cancelled run_script before it could finish the script
+            script.set_test_failed(result["message"])
+            try:
+                script.finish()
+            except Exception as e:
+                logging.error("Error finishing timed out script in %s: %s", room_name, e)
+    except ScriptError as e:
+        result["message"] = f"Invalid script: {e}"
+    except rtc.ConnectError as e:
+        result["message"] = f"Connection failed: {e}"
+    except Exception as e:
+        result["message"] = f"Failed to load script: {e}" if script is None else f"Session error: {e}"
+    finally:
+        result["duration"] = (time.monotonic() - started) * 1000
+        try:
+            await close_session(state)
+        except Exception as e:
+            logging.error("Error closing session in %s: %s", room_name, e)
+    return script, result
+
+async def close_session(state: ClientState) -> None:
+    """Cancel a session's audio playback tasks and disconnect its room."""
+    await state.playback.aclose()
+    logging.info("Stopped all audio playback: %s", state.playback.stats())
 
-async def cleanup():
+    if state.room:
+        await state.room.disconnect()
+        logging.info("Disconnected from room")
+
+async def cleanup(state: ClientState = None):
     """Clean up resources and tasks."""
     logging.info("Starting cleanup...")
     try:
-        # Cancel all audio playback tasks first
-        for task in audio_playback_tasks:
-            if not task.done():
-                task.cancel()
-        logging.info("Cancelled all audio playback tasks")
-        
-        # Disconnect from the room
-        if room:
-            await room.disconnect()
-            logging.info("Disconnected from room")
-        
+        await close_session(state or default_state)
+
         # Force exit immediately
         os._exit(0)
     except Exception as e:
         logging.error("Error during cleanup: %s", e)
-        os._exit(1) 
\ No newline at end of file
+        os._exit(1)
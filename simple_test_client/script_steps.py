@@ -0,0 +1,225 @@
+import logging
+import time
+import wave
+from abc import ABC, abstractmethod
+
+from livekit import rtc
+from audio_utils import read_wav_file, render_samples
+from speech_detection import SpeechDetector
+
+REQUIRED = object()
+DETECT_MODES = ("any", "energy", "speakers")
+KIND_NAMES = {float: "a number", str: "a string"}
+
+class ScriptError(ValueError):
+    """A test script that is malformed or refers to media that cannot be loaded."""
+
+class Step(ABC):
+    """One compiled test script command.
+
+    Subclasses declare their parameters as name -> (type, default), with REQUIRED
+    for mandatory ones; the validated values become attributes of the step.
+    prepare() loads any media before the room connects, and run() executes the
+    step against a TestScript, returning False after marking the test failed.
+    """
+
+    type = None
+    params = {}
+
+    def __init__(self, index: int, params: dict):
+        self.index = index
+        for name in params:
+            if name not in self.params:
+                raise ScriptError(f"step {index} ({self.type}): unknown parameter {name!r}")
+        for name, (kind, default) in self.params.items():
+            value = params.get(name, default)
+            if value is REQUIRED:
+                raise ScriptError(f"step {index} ({self.type}): missing required parameter {name!r}")
+            if kind is float and isinstance(value, int) and not isinstance(value, bool):
+                value = float(value)
+            if not isinstance(value, kind) or isinstance(value, bool):
+                raise ScriptError(f"step {index} ({self.type}): parameter {name!r} must be "
+                                  f"{KIND_NAMES[kind]}, got {value!r}")
+            setattr(self, name, value)
+
+    async def prepare(self, media: dict) -> None:
+        """Load whatever the step plays; media is shared by every step of the script."""
+
+    @abstractmethod
+    async def run(self, script, source: rtc.AudioSource) -> bool:
+        """Execute the step; return False after marking the test failed."""
+
+class WaitForParticipantStep(Step):
+    type = "wait_for_participant"
+    params = {"timeout": (float, 30.0)}
+
+    async def run(self, script, source: rtc.AudioSource) -> bool:
+        script.participant_joined = False
+        # Wait for the participant to join with timeout
+        if not await script.wait_until(lambda: script.participant_joined, time.monotonic() + self.timeout):
+            script.set_test_failed("Timeout waiting for agent participant to join")
+            return False
+        logging.info("Agent participant joined, continuing script")
+        return True
+
+class _DetectStep(Step):
+    """Base for waits that detect the agent's speech from received audio energy and/or active speakers."""
+
+    def __init__(self, index: int, params: dict):
+        super().__init__(index, params)
+        if self.detect not in DETECT_MODES:
+            raise ScriptError(f"step {index} ({self.type}): detect must be one of {', '.join(DETECT_MODES)}")
+
+class WaitForAudioStep(_DetectStep):
+    type = "wait_for_audio"
+    params = {"timeout": (float, 30.0), "detect": (str, "any")}
+
+    async def run(self, script, source: rtc.AudioSource) -> bool:
+        script.audio_received = False
+        if not await script.wait_until(lambda: script.agent_audio_detected(self.detect),
+                                       time.monotonic() + self.timeout):
+            script.set_test_failed("Timeout waiting for audio from participant")
+            return False
+        script.set_audio_received()
+        logging.info("Audio received from participant")
+        return True
+
+class WaitForSilenceStep(_DetectStep):
+    type = "wait_for_silence"
+    params = {"timeout": (float, 30.0), "duration": (float, 1.0), "detect": (str, "any")}
+
+    async def run(self, script, source: rtc.AudioSource) -> bool:
+        deadline = time.monotonic() + self.timeout
+        while True:
+            # Done once the agent has been quiet for duration seconds
+            since = script.quiet_since(self.detect)
+            now = time.monotonic()
+            if since is not None and now >= since + self.duration:
+                logging.info("Participant has stopped speaking")
+                return True
+            if now >= deadline:
+                script.set_test_failed("Timeout waiting for participant to stop speaking")
+                return False
+            # Received audio does not signal every voiced frame, so re-check when the quiet period would be up
+            await script.wait_for_change(deadline if since is None else min(since + self.duration, deadline))
+
+class SpeechDetectionStep(Step):
+    type = "speech_detection"
+    params = {"start_db": (float, -40.0), "stop_db": (float, -50.0),
+              "min_speech_ms": (float, 20.0), "hangover_ms": (float, 300.0)}
+
+    async def run(self, script, source: rtc.AudioSource) -> bool:
+        script.set_speech_detector(SpeechDetector(self.start_db, self.stop_db, self.min_speech_ms, self.hangover_ms))
+        return True
+
+class TtsStep(Step):
+    type = "tts"
+    params = {"text": (str, REQUIRED), "lang": (str, "en")}
+
+    async def prepare(self, media: dict) -> None:
+        key = (self.type, self.text, self.lang)
+        if key not in media:
+            media[key] = await render_samples(self.text, self.lang)
+        self.samples = media[key]
+
+    async def run(self, script, source: rtc.AudioSource) -> bool:
+        logging.info("TTS: %s", self.text)
+        await script.play_prompt(source, 'tts', self.text, self.samples)
+        return True
+
+class WavStep(Step):
+    type = "wav"
+    params = {"filename": (str, REQUIRED)}
+
+    async def prepare(self, media: dict) -> None:
+        key = (self.type, self.filename)
+        if key not in media:
+            try:
+                media[key], _ = read_wav_file(self.filename)
+            except (OSError, EOFError, wave.Error) as e:
+                raise ScriptError(f"step {self.index} (wav): cannot load {self.filename}: {e}") from e
+        self.samples = media[key]
+
+    async def run(self, script, source: rtc.AudioSource) -> bool:
+        logging.info("Playing WAV: %s", self.filename)
+        await script.play_prompt(source, 'wav', self.filename, self.samples)
+        return True
+
+class WaitStep(Step):
+    type = "wait"
+    params = {"seconds": (float, 1.0)}
+
+    async def run(self, script, source: rtc.AudioSource) -> bool:
+        await script.pause(source, self.seconds)
+        return True
+
+class EventStep(Step):
+    type = "event"
+    params = {"event_type": (str, REQUIRED)}
+
+    def __init__(self, index: int, params: dict):
+        super().__init__(index, params)
+        participant_info = {
+            'sid': 'test_sid',
+            'identity': 'test_identity',
+            'name': 'Test Participant',
+        }
+        if self.event_type == 'participant_connected':
+            self.args = (self.event_type, {
+                **participant_info,
+                'metadata': '',
+                'is_speaking': False,
+                'audio_level': 0,
+                'connection_quality': rtc.ConnectionQuality.EXCELLENT
+            })
+        elif self.event_type == 'participant_disconnected':
+            self.args = (self.event_type, participant_info)
+        elif self.event_type == 'track_subscribed':
+            track_info = {
+                'sid': 'test_track_sid',
+                'name': 'test_track',
+                'kind': rtc.TrackKind.KIND_AUDIO,
+                'muted': False,
+                'stream_state': rtc.StreamState.ACTIVE
+            }
+            self.args = (self.event_type, track_info, participant_info)
+        else:
+            raise ScriptError(f"step {index} (event): unknown event_type {self.event_type!r}")
+
+    async def run(self, script, source: rtc.AudioSource) -> bool:
+        script.room.emit(*self.args)
+        return True
+
+STEP_TYPES = {step.type: step for step in (
+    WaitForParticipantStep, WaitForAudioStep, WaitForSilenceStep, SpeechDetectionStep,
+    TtsStep, WavStep, WaitStep, EventStep)}
+
+def compile_script(commands) -> list[Step]:
+    """Validate the parsed JSON of a test script and turn it into steps.
+
+    Raises ScriptError on the first malformed command.
+    """
+    if not isinstance(commands, list):
+        raise ScriptError("a test script must be a JSON list of commands")
+    steps = []
+    for index, command in enumerate(commands):
+        if not isinstance(command, dict) or 'type' not in command:
+            raise ScriptError(f"step {index}: expected an object with a 'type'")
+        extra = set(command) - {'type', 'params'}
+        if extra:
+            raise ScriptError(f"step {index}: unknown keys {sorted(extra)}")
+        step_class = STEP_TYPES.get(command['type'])
+        if step_class is None:
+            raise ScriptError(f"step {index}: unknown command type {command['type']!r} "
+                              f"(expected one of {', '.join(STEP_TYPES)})")
+        params = command.get('params', {})
+        if not isinstance(params, dict):
+            raise ScriptError(f"step {index} ({step_class.type}): params must be an object")
+        steps.append(step_class(index, params))
+    return steps
+
+async def prepare_steps(steps: list[Step]) -> None:
+    """Decode every WAV file and render every TTS prompt the steps play."""
+    media = {}
+    for step in steps:
+        await step.prepare(media)
@@ -1,4 +1,22 @@
-# Global variables shared between modules
-audio_playback_tasks = []  # List to track all audio playback tasks
-publish_source = None
-room = None 
\ No newline at end of file
+from livekit import rtc
+from playback_manager import PlaybackManager
+
+class ClientState:
+    """State shared between modules for one test client session.
+
+    agent_driver runs a single session and uses default_state; the load
+    generator creates one ClientState per simulated client. transport is the
+    rtc implementation the session uses (livekit.rtc, or a loopback.LoopbackRTC),
+    and instrumentation an optional instrumentation.Instrumentation.
+    """
+
+    def __init__(self, transport=None, instrumentation=None):
+        self.rtc = transport or rtc
+        self.instrumentation = instrumentation
+        if instrumentation:
+            instrumentation.watch(self)
+        self.room = None
+        self.publish_source = None
+        self.playback = PlaybackManager()  # Audio playback of subscribed tracks
+
+default_state = ClientState()
@@ -0,0 +1,106 @@
+import math
+
+import numpy as np
+
+from audio_utils import SAMPLE_RATE
+
+SILENCE_DB = -120.0  # Energy reported for digital silence
+
+def frame_energy_db(samples: np.ndarray, scratch: np.ndarray = None) -> float:
+    """Return the RMS level of int16 samples in dBFS.
+
+    Pass a float32 scratch array at least as long as samples to avoid allocating.
+    """
+    n = len(samples)
+    if n == 0:
+        return SILENCE_DB
+    if scratch is None or len(scratch) < n:
+        scratch = np.empty(n, dtype=np.float32)
+    x = scratch[:n]
+    np.copyto(x, samples)
+    power = float(np.dot(x, x)) / n
+    if power <= 0.0:
+        return SILENCE_DB
+    return max(10 * math.log10(power / (32768.0 * 32768.0)), SILENCE_DB)
+
+class SpeechDetector:
+    """Energy-based speech start/end detection on received audio frames.
+
+    Speech starts once min_speech_ms of consecutive frames reach start_db
+    (dBFS); the start time is the arrival of the first of those frames. Speech
+    ends once no frame has reached stop_db for hangover_ms; the end time is the
+    arrival of the last frame that did. Times are time.monotonic() values passed
+    in by the caller, so both are accurate to one frame. on_start(time) and
+    on_end(time) are called as speech starts and ends.
+    """
+
+    def __init__(self, start_db: float = -40.0, stop_db: float = -50.0, min_speech_ms: float = 20,
+                 hangover_ms: float = 300, on_start=None, on_end=None):
+        self.start_db = start_db
+        self.stop_db = stop_db
+        self.min_speech = min_speech_ms / 1000
+        self.hangover = hangover_ms / 1000
+        self.on_start = on_start
+        self.on_end = on_end
+        self.in_speech = False
+        self.energy_db = SILENCE_DB
+        self.speech_start = None
+        self.speech_end = None
+        self.last_voice = None
+        self.frames = 0
+        self.voiced_frames = 0
+        self._run_start = None
+        self._run_duration = 0.0
+        self._scratch = np.empty(SAMPLE_RATE // 100, dtype=np.float32)
+
+    def update(self, samples: np.ndarray, now: float) -> None:
+        """Process one received frame that arrived at now."""
+        self.check(now)
+        if len(samples) > len(self._scratch):
+            self._scratch = np.empty(len(samples), dtype=np.float32)
+        self.energy_db = db = frame_energy_db(samples, self._scratch)
+        self.frames += 1
+
+        if self.in_speech:
+            if db >= self.stop_db:
+                self.last_voice = now
+                self.voiced_frames += 1
+            return
+
+        if db < self.start_db:
+            self._run_start = None
+            return
+        if self._run_start is None:
+            self._run_start = now
+            self._run_duration = 0.0
+        self._run_duration += len(samples) / SAMPLE_RATE
+        self.voiced_frames += 1
+        if self._run_duration >= self.min_speech - 1e-9:
+            self.in_speech = True
+            self.speech_start = self._run_start
+            self.speech_end = None
+            self.last_voice = now
+            self._run_start = None
+            if self.on_start:
+                self.on_start(self.speech_start)
+
+    def check(self, now: float) -> None:
+        """End the current speech if it has been quiet for the hangover, even if no frames arrived."""
+        if self.in_speech and now - self.last_voice >= self.hangover:
+            self.in_speech = False
+            self.speech_end = self.last_voice
+            if self.on_end:
+                self.on_end(self.speech_end)
+
+    def speaking(self, now: float) -> bool:
+        """Return whether speech is in progress at now."""
+        self.check(now)
+        return self.in_speech
+
+    def stats(self) -> dict:
+        return {
+            "frames": self.frames,
+            "voiced_frames": self.voiced_frames,
+            "energy_db": self.energy_db,
+            "speaking": self.in_speech,
+        }
@@ -0,0 +1,149 @@
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import sys
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime, timezone
+from functools import partial
+
+from room_manager import run_session
+from audio_sinks import SINKS, create_sink
+from audio_utils import SYNTHESIZERS, create_synthesizer, set_synthesizer
+from loopback import add_loopback_arguments, transport_from_args
+from instrumentation import add_instrumentation_arguments, instrumentation_from_args
+
+def discover(directory: str, pattern: str = "*.json") -> list[str]:
+    """Return every script in directory (and its subdirectories) matching pattern, sorted."""
+    return sorted(glob.glob(os.path.join(directory, "**", pattern), recursive=True))
+
+def script_name(path: str, directory: str) -> str:
+    """Return a script's name: its path relative to the suite directory, without .json."""
+    return os.path.splitext(os.path.relpath(path, directory))[0].replace(os.sep, "/")
+
+async def run_one(path: str, args, semaphore: asyncio.Semaphore, transport, instrumentation=None) -> dict:
+    """Run one script in its own room once a worker slot is free."""
+    name = script_name(path, args.dir)
+    async with semaphore:
+        logging.info("Running %s", name)
+        room_name = f"{args.room}-{name.replace('/', '-')}"
+        sink_factory = partial(create_sink, args.sink, output_dir=os.path.join(args.sink_dir, room_name))
+        result = {"name": name, "path": path, "steps": [], "total_steps": 0}
+        script, session = await run_session(path, room_name, identity=f"suite-{name.replace('/', '-')}",
+                                             sink_factory=sink_factory, timeout=args.script_timeout,
+                                             transport=transport, instrumentation=instrumentation)
+        if script is None:
+            # The script itself could not be loaded
+            result.update(session, error=True)
+        else:
+            result.update(session, error=False, steps=script.step_results, total_steps=len(script.commands),
+                          latency=script.latency.report()["summary"])
+    logging.log(logging.INFO if result["success"] else logging.ERROR,
+                "%s %s: %s", "PASS" if result["success"] else "FAIL", name, result["message"])
+    return result
+
+async def run_suite(paths: list[str], args) -> list[dict]:
+    """Run every script, at most args.workers at a time."""
+    semaphore = asyncio.Semaphore(args.workers)
+    transport = transport_from_args(args)
+    instrumentation = instrumentation_from_args(args)
+    if instrumentation:
+        instrumentation.start()
+    try:
+        return await asyncio.gather(*(run_one(path, args, semaphore, transport, instrumentation)
+                                      for path in paths))
+    finally:
+        if instrumentation:
+            await instrumentation.stop()
+
+def junit_xml(results: list[dict], wall_time: float) -> ET.ElementTree:
+    """Build a JUnit report with one testsuite per script and one testcase per step."""
+    root = ET.Element("testsuites", name="simple_test_client", tests=str(len(results)),
+                      failures=str(sum(not r["success"] and not r["error"] for r in results)),
+                      errors=str(sum(r["error"] for r in results)), time=f"{wall_time:.3f}")
+    for result in results:
+        suite = ET.SubElement(root, "testsuite", name=result["name"], file=result["path"],
+                              time=f"{result['duration'] / 1000:.3f}")
+        if result["error"] or not result["steps"]:
+            # Nothing ran: the script failed to load or connect
+            case = ET.SubElement(suite, "testcase", classname=result["name"], name="setup", time="0")
+            ET.SubElement(case, "error" if result["error"] else "failure", message=result["message"])
+            counts = {"tests": 1, "failures": int(not result["error"]), "errors": int(result["error"]),
+                      "skipped": 0}
+        else:
+            counts = {"tests": result["total_steps"], "failures": 0, "errors": 0, "skipped": 0}
+            for step in result["steps"]:
+                case = ET.SubElement(suite, "testcase", classname=result["name"],
+                                     name=f"{step['index']}:{step['type']}", time=f"{step['duration'] / 1000:.3f}")
+                if not step["success"]:
+                    ET.SubElement(case, "failure", message=step["message"] or "")
+                    counts["failures"] += 1
+            if not result["success"] and all(step["success"] for step in result["steps"]):
+                # Timed out part way through a step
+                case = ET.SubElement(suite, "testcase", classname=result["name"], name="timeout", time="0")
+                ET.SubElement(case, "failure", message=result["message"])
+                counts["tests"] += 1
+                counts["failures"] += 1
+            # Steps after a failure never ran
+            for index in range(len(result["steps"]), result["total_steps"]):
+                case = ET.SubElement(suite, "testcase", classname=result["name"], name=f"{index}:not_run", time="0")
+                ET.SubElement(case, "skipped")
+                counts["skipped"] += 1
+        for key, value in counts.items():
+            suite.set(key, str(value))
+    ET.indent(root)
+    return ET.ElementTree(root)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run a directory of test scripts in parallel')
+    parser.add_argument('--dir', default='tests', help='Directory of TestScript JSON files')
+    parser.add_argument('--pattern', default='*.json', help='Glob pattern of scripts to run')
+    parser.add_argument('--workers', type=int, default=4, help='Number of scripts to run at once')
+    parser.add_argument('--room', default='suite', help='Room name prefix (one room per script)')
+    parser.add_argument('--script-timeout', type=float, default=300, help='Seconds before a script is failed')
+    parser.add_argument('--sink', choices=SINKS, default='null', help='Where received agent audio goes')
+    parser.add_argument('--sink-dir', default='recordings', help='Output directory for wav/raw sinks')
+    parser.add_argument('--tts', choices=SYNTHESIZERS, default=os.getenv('TTS_BACKEND', 'gtts'),
+                        help='Speech backend for tts steps')
+    parser.add_argument('--phrase-dir', default=os.getenv('TTS_PHRASE_DIR'),
+                        help='Directory of pre-rendered phrases for the phrases backend')
+    parser.add_argument('--junit', default='suite_results.xml', help='Write JUnit XML results here')
+    parser.add_argument('--json', default='suite_results.json', help='Write JSON results here')
+    parser.add_argument('--verbose', action='store_true', help='Log every script event')
+    add_loopback_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    set_synthesizer(create_synthesizer(args.tts, args.phrase_dir))
+    paths = discover(args.dir, args.pattern)
+    if not paths:
+        print(f"No scripts matching {args.pattern} found in {args.dir}")
+        sys.exit(2)
+
+    started = time.monotonic()
+    results = asyncio.run(run_suite(paths, args))
+    wall_time = time.monotonic() - started
+
+    passed = sum(result["success"] for result in results)
+    with open(args.json, 'w') as f:
+        json.dump({
+            "created": datetime.now(timezone.utc).isoformat(),
+            "directory": args.dir,
+            "workers": args.workers,
+            "wall_time": wall_time,
+            "passed": passed,
+            "failed": len(results) - passed,
+            "scripts": results,
+        }, f, indent=2)
+    junit_xml(results, wall_time).write(args.junit, encoding="utf-8", xml_declaration=True)
+
+    for result in results:
+        print(f"{'PASS' if result['success'] else 'FAIL'} {result['name']} "
+              f"({result['duration'] / 1000:.1f}s): {result['message']}")
+    print(f"{passed}/{len(results)} scripts passed in {wall_time:.1f}s; "
+          f"results written to {args.junit} and {args.json}")
+    sys.exit(0 if passed == len(results) else 1)
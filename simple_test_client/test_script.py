@@ -4,13 +4,22 @@ import time
 import asyncio
 from typing import List, Dict, Union
 from livekit import rtc
-from audio_utils import play_string, play_wav
+from script_steps import ScriptError, Step, compile_script, prepare_steps
+from audio_utils import PacedPlayer, play_samples
+from latency import LatencyTracker, write_report
+from speech_detection import SpeechDetector
 
 class TestScript:
-    def __init__(self, filename: str, room: rtc.Room):
+    def __init__(self, filename: str, room: rtc.Room, report_path: str = None, paced: bool = False):
         self.filename = filename
         self.room = room
+        self.report_path = report_path
+        self.paced = paced
+        self.player = None  # PacedPlayer for the published track, when paced
+        self.latency = LatencyTracker()
         self.commands: List[Dict] = []
+        self.steps: List[Step] = []
+        self.prepared = False
         self.current_index = 0
         self.load_script()
         self.participant_joined = False
@@ -20,32 +29,52 @@ class TestScript:
         self.test_failed = False
         self.failure_reason = None
         self.is_speaking = False
-        self.last_speaking_change = time.time()
+        self.last_speaking_change = time.monotonic()
         self.connection_state = "disconnected"
         self.active_speakers = []
         self.data_received = {}
         self.track_states = {}
         self.connection_qualities = {}  # Track connection quality by participant
+        self.step_results: List[Dict] = []  # Timing and outcome of every executed command
+        self._state_changed = asyncio.Event()  # Set by the room handler callbacks on every state change
+        self.set_speech_detector(SpeechDetector())
 
     def load_script(self):
-        """Load and parse the test script file."""
+        """Load the test script file and compile it into validated steps."""
         try:
             with open(self.filename, 'r') as f:
                 self.commands = json.load(f)
+            self.steps = compile_script(self.commands)
         except json.JSONDecodeError as e:
             logging.error(f"Error parsing script file: {e}")
             raise
         except FileNotFoundError:
             logging.error(f"Script file not found: {self.filename}")
             raise
+        except ScriptError as e:
+            logging.error(f"Invalid script {self.filename}: {e}")
+            raise
+
+    async def prepare(self):
+        """Decode the script's WAV files and render its TTS prompts so steps run without I/O."""
+        started = time.monotonic()
+        await prepare_steps(self.steps)
+        self.prepared = True
+        logging.info(f"Prepared {len(self.steps)} steps in {(time.monotonic() - started) * 1000:.0f} ms")
+
+    @staticmethod
+    def is_agent(participant_identity: str) -> bool:
+        """Return whether participant_identity is the agent under test."""
+        return bool(participant_identity) and participant_identity.startswith("agent-")
 
     def set_participant_joined(self, participant_identity: str):
         """Mark that a participant has joined."""
-        if participant_identity and participant_identity.startswith("agent-"):
+        if self.is_agent(participant_identity):
             self.participant_joined = True
             self.expected_participant = participant_identity  # Store the actual agent identity
             logging.info(f"Agent participant {participant_identity} has joined")
             self.set_connection_state("connected", participant_identity)
+            self._state_changed.set()
 
     def set_audio_received(self):
         """Mark that audio has been received from the expected participant."""
@@ -53,13 +82,65 @@ class TestScript:
             self.audio_received = True
             logging.info("Audio received from participant")
             self.set_track_state("published", "test_track_sid", "audio", self.expected_participant)
+            self._state_changed.set()
 
     def set_speaking_state(self, is_speaking: bool):
         """Update the speaking state of the participant."""
         if self.is_speaking != is_speaking:
             self.is_speaking = is_speaking
-            self.last_speaking_change = time.time()
+            self.last_speaking_change = time.monotonic()
             logging.info(f"Participant speaking state changed: {is_speaking}")
+            self.latency.speaking_changed(is_speaking)
+            self._state_changed.set()
+
+    def set_speech_detector(self, detector: SpeechDetector):
+        """Use detector for energy-based detection of the agent's speech in received audio."""
+        detector.on_start = self._speech_started
+        detector.on_end = self._speech_ended
+        self.speech = detector
+        self.speech_since = time.monotonic()  # Quiet since, until the first speech is detected
+
+    def on_audio_frame(self, samples):
+        """Handle a frame of audio received from the agent.
+
+        Only the agent's tracks are routed here, so the first speech detected
+        is the first agent audio of a turn and times its TTFA.
+        """
+        self.speech.update(samples, time.monotonic())
+
+    def _speech_started(self, timestamp: float):
+        logging.info(f"Speech detected in received audio ({self.speech.energy_db:.1f} dBFS)")
+        self.latency.speech_started(timestamp)
+        self._state_changed.set()
+
+    def _speech_ended(self, timestamp: float):
+        logging.info(f"Received audio went quiet after {(timestamp - self.speech.speech_start) * 1000:.0f} ms")
+        self.latency.speech_ended(timestamp)
+        self._state_changed.set()
+
+    def agent_audio_detected(self, detect: str = "any") -> bool:
+        """Return whether the agent is speaking now, from received audio energy and/or active speakers."""
+        energy = self.speech.speaking(time.monotonic())
+        speakers = self.audio_received or (self.is_speaking and self.expected_participant in self.active_speakers)
+        if detect == "energy":
+            return energy
+        if detect == "speakers":
+            return speakers
+        return energy or speakers
+
+    def quiet_since(self, detect: str = "any") -> float:
+        """Return the time.monotonic() since which the agent has been quiet, or None while it speaks.
+
+        Received audio counts as quiet from the last frame above the speech
+        detector's stop threshold; with "any" both sources have to be quiet.
+        """
+        speakers = None if self.is_speaking else self.last_speaking_change
+        energy = self.speech.last_voice if self.speech.last_voice is not None else self.speech_since
+        if detect == "energy":
+            return energy
+        if detect == "speakers" or speakers is None:
+            return speakers
+        return max(speakers, energy)
 
     def set_test_failed(self, reason: str):
         """Mark the test as failed with a reason."""
@@ -81,6 +162,7 @@ class TestScript:
         """Update the list of active speakers."""
         self.active_speakers = speakers
         logging.info(f"Active speakers changed: {speakers}")
+        self._state_changed.set()
 
     def set_data_received(self, participant_identity: str, data: bytes):
         """Update the received data for a participant."""
@@ -113,119 +195,97 @@ class TestScript:
         """Get the connection quality for a participant."""
         return self.connection_qualities.get(participant_identity, 0)  # Default to POOR if unknown
 
+    def player_for(self, source: rtc.AudioSource) -> PacedPlayer:
+        """Return the paced player of the published track, starting it on first use."""
+        if self.player is None:
+            self.player = PacedPlayer(source)
+            self.player.start()
+        return self.player
+
+    async def play_prompt(self, source: rtc.AudioSource, kind: str, label: str, samples) -> None:
+        """Play a prompt as a new latency turn.
+
+        Unpaced, the turn ends once the source has played out the whole prompt.
+        When paced, the prompt goes out on the continuous sample-clocked track and
+        the turn is timed from when its first and last samples are due to play.
+        """
+        if not self.paced:
+            self.latency.playback_started(kind, label)
+            await play_samples(source, samples)
+            # capture_frame returns while about a second of the prompt is still queued in the source
+            await source.wait_for_playout()
+            self.latency.playback_ended()
+            return
+
+        player = self.player_for(source)
+        self.latency.playback_started(kind, label, player.time_at(player.next_offset))
+        start, end = await player.play(samples)
+        turn = self.latency.current
+        turn.start_sample, turn.end_sample = start, end
+        self.latency.playback_ended(player.time_at(end))
+
+    async def pause(self, source: rtc.AudioSource, seconds: float) -> None:
+        """Wait for seconds; when paced, send exactly that much silence after the previous audio."""
+        if self.paced:
+            await self.player_for(source).silence(seconds)
+        else:
+            await asyncio.sleep(seconds)
+
+    async def aclose(self) -> None:
+        """Stop the paced player, if any."""
+        if self.player:
+            await self.player.aclose()
+            logging.info(f"Paced playback stats: {self.player.stats()}")
+
+    async def wait_for_change(self, deadline: float) -> bool:
+        """Wait for the next script state change; returns False if the time.monotonic() deadline passes first."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        self._state_changed.clear()
+        try:
+            await asyncio.wait_for(self._state_changed.wait(), remaining)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def wait_until(self, predicate, deadline: float) -> bool:
+        """Wait until predicate() holds or the time.monotonic() deadline passes.
+
+        Wakes up as soon as a room handler callback changes the script state
+        instead of polling.
+        """
+        while not predicate():
+            if not await self.wait_for_change(deadline):
+                return predicate()
+        return True
+
     async def execute_command(self, source: rtc.AudioSource) -> bool:
-        """Execute the next command in the script."""
+        """Execute the next command in the script, recording its duration and outcome."""
         if self.current_index >= len(self.commands):
             return False
 
-        command = self.commands[self.current_index]
-        cmd_type = command.get('type')
-        params = command.get('params', {})
+        index = self.current_index
+        started = time.monotonic()
+        result = await self._run_command(source)
+        self.step_results.append({
+            "index": index,
+            "type": self.steps[index].type,
+            "start": (started - self.latency.started) * 1000,
+            "duration": (time.monotonic() - started) * 1000,
+            "success": not self.test_failed,
+            "message": self.failure_reason if self.test_failed else None,
+        })
+        return result
 
-        try:
-            if cmd_type == 'wait_for_participant':
-                timeout = params.get('timeout', 30)  # Default 30 seconds timeout
-                self.participant_joined = False
-                
-                # Wait for the participant to join with timeout
-                start_time = time.time()
-                while not self.participant_joined:
-                    if time.time() - start_time > timeout:
-                        self.set_test_failed("Timeout waiting for agent participant to join")
-                        return False
-                    await asyncio.sleep(0.1)
-                
-                logging.info(f"Agent participant joined, continuing script")
-                self.current_index += 1
-                return True
-
-            elif cmd_type == 'wait_for_audio':
-                timeout = params.get('timeout', 30)  # Default 30 seconds timeout
-                self.audio_received = False
-                
-                # Wait for audio with timeout
-                start_time = time.time()
-                while not self.audio_received:
-                    if time.time() - start_time > timeout:
-                        self.set_test_failed("Timeout waiting for audio from participant")
-                        return False
-                    # If we detect the agent speaking, consider that audio received
-                    if self.is_speaking and self.expected_participant in self.active_speakers:
-                        self.set_audio_received()
-                        break
-                    await asyncio.sleep(0.1)
-                
-                logging.info("Audio received from participant")
-                self.current_index += 1
-                return True
-
-            elif cmd_type == 'wait_for_silence':
-                timeout = params.get('timeout', 30)  # Default 30 seconds timeout
-                silence_threshold = 1.0  # Seconds of silence required
-                
-                # Wait for silence with timeout
-                start_time = time.time()
-                while True:
-                    if time.time() - start_time > timeout:
-                        self.set_test_failed("Timeout waiting for participant to stop speaking")
-                        return False
-                    
-                    # Check if we've had enough silence
-                    if not self.is_speaking and (time.time() - self.last_speaking_change) >= silence_threshold:
-                        logging.info("Participant has stopped speaking")
-                        self.current_index += 1
-                        return True
-                    
-                    await asyncio.sleep(0.1)
-                
-            elif cmd_type == 'tts':
-                text = params.get('text', '')
-                lang = params.get('lang', 'en')
-                await play_string(source, text, lang)
-            elif cmd_type == 'wav':
-                filename = params.get('filename')
-                if filename:
-                    await play_wav(source, filename)
-            elif cmd_type == 'wait':
-                seconds = params.get('seconds', 1)
-                await asyncio.sleep(seconds)
-            elif cmd_type == 'event':
-                event_type = params.get('event_type')
-                if event_type == 'participant_connected':
-                    participant_info = {
-                        'sid': 'test_sid',
-                        'identity': 'test_identity',
-                        'name': 'Test Participant',
-                        'metadata': '',
-                        'is_speaking': False,
-                        'audio_level': 0,
-                        'connection_quality': rtc.ConnectionQuality.EXCELLENT
-                    }
-                    self.room.emit('participant_connected', participant_info)
-                elif event_type == 'participant_disconnected':
-                    participant_info = {
-                        'sid': 'test_sid',
-                        'identity': 'test_identity',
-                        'name': 'Test Participant'
-                    }
-                    self.room.emit('participant_disconnected', participant_info)
-                elif event_type == 'track_subscribed':
-                    participant_info = {
-                        'sid': 'test_sid',
-                        'identity': 'test_identity',
-                        'name': 'Test Participant'
-                    }
-                    track_info = {
-                        'sid': 'test_track_sid',
-                        'name': 'test_track',
-                        'kind': rtc.TrackKind.KIND_AUDIO,
-                        'muted': False,
-                        'stream_state': rtc.StreamState.ACTIVE
-                    }
-                    self.room.emit('track_subscribed', track_info, participant_info)
-            else:
-                logging.warning(f"Unknown command type: {cmd_type}")
+    async def _run_command(self, source: rtc.AudioSource) -> bool:
+        if not self.prepared:
+            logging.warning("Script was not prepared before running; loading media now")
+            await self.prepare()
 
+        try:
+            if not await self.steps[self.current_index].run(self, source):
+                return False
             self.current_index += 1
             return True
         except Exception as e:
@@ -238,4 +298,13 @@ class TestScript:
 
     def get_test_result(self) -> tuple[bool, str]:
         """Get the test result and reason if failed."""
-        return not self.test_failed, self.failure_reason if self.test_failed else "Test completed successfully" 
\ No newline at end of file
+        return not self.test_failed, self.failure_reason if self.test_failed else "Test completed successfully"
+
+    def finish(self) -> None:
+        """Log the latency summary and write the report if one was requested."""
+        self.speech.check(time.monotonic())  # Close out speech that ended without a later frame
+        self.latency.log_summary()
+        if self.report_path:
+            success, message = self.get_test_result()
+            write_report(self.report_path, self.latency.report(),
+                         script=self.filename, success=success, message=message)
@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "simple_test_client", "tts")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+PCM_SUFFIX = ".pcm"
+TEMP_SUFFIX = ".tmp"
+STALE_TEMP_SECONDS = 3600  # Renders left unfinished this long were abandoned by a crashed process
+
+class TTSCache:
+    """On-disk, content-addressed cache of rendered speech.
+
+    Entries are raw int16 PCM files named by the hash of (backend, text, lang,
+    sample rate, channels), ready to be streamed straight into an AudioSource. The least
+    recently used entries are evicted once the cache grows past max_bytes.
+    Concurrent misses on the same key in a process share one render, and
+    temporary files abandoned by interrupted renders are removed on startup.
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._rendering = {}  # Key -> task rendering it
+        os.makedirs(cache_dir, exist_ok=True)
+        self.sweep()
+
+    @staticmethod
+    def key(text: str, lang: str, sample_rate: int, channels: int, backend: str = "gtts") -> str:
+        """Return the content address for a rendering of text by a synthesizer backend."""
+        payload = json.dumps([backend, text, lang, sample_rate, channels], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        """Return the file path for a cache key."""
+        return os.path.join(self.cache_dir, key + PCM_SUFFIX)
+
+    def lookup(self, key: str) -> str:
+        """Return the PCM file for key, or None on a miss."""
+        path = self.path(key)
+        try:
+            os.utime(path)  # Mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return path
+
+    async def render_once(self, key: str, render) -> str:
+        """Await render(), which publishes key, unless a render of key is already running; return its path.
+
+        Every caller waits for the same render, which keeps running if one of them
+        is cancelled.
+        """
+        task = self._rendering.get(key)
+        if task is None:
+            task = asyncio.ensure_future(render())
+            self._rendering[key] = task
+            task.add_done_callback(lambda _: self._rendering.pop(key, None))
+        await asyncio.shield(task)
+        return self.path(key)
+
+    def rendering(self, key: str):
+        """Return the task rendering key, or None if no render of it is running."""
+        return self._rendering.get(key)
+
+    @contextmanager
+    def writer(self, key: str):
+        """Yield a temporary path to render into; it is published under key on success."""
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=TEMP_SUFFIX)
+        os.close(fd)
+        try:
+            yield temp_path
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        self.evict()
+
+    def entries(self) -> list[tuple[float, int, str]]:
+        """Return (mtime, size, path) for every cached entry, oldest first."""
+        entries = []
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(PCM_SUFFIX):
+                    st = entry.stat()
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+            logging.info("TTS cache evicted %s", os.path.basename(path))
+
+    def sweep(self, max_age: float = STALE_TEMP_SECONDS) -> None:
+        """Remove temporary files of renders that were abandoned more than max_age seconds ago."""
+        cutoff = time.time() - max_age
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith(TEMP_SUFFIX):
+                    try:
+                        if entry.stat().st_mtime < cutoff:
+                            os.unlink(entry.path)
+                            logging.info("TTS cache removed abandoned %s", entry.name)
+                    except FileNotFoundError:
+                        pass
+
+    def clear(self) -> None:
+        """Remove every cached entry."""
+        for _, _, path in self.entries():
+            os.unlink(path)
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current cache size."""
+        entries = self.entries()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+        }
+
+_default_cache = None
+
+def get_tts_cache() -> TTSCache:
+    """Return the process-wide cache, configured from TTS_CACHE_DIR and TTS_CACHE_MAX_MB."""
+    global _default_cache
+    if _default_cache is None:
+        max_mb = os.getenv("TTS_CACHE_MAX_MB")
+        _default_cache = TTSCache(
+            os.getenv("TTS_CACHE_DIR", DEFAULT_CACHE_DIR),
+            int(float(max_mb) * 1024 * 1024) if max_mb else DEFAULT_MAX_BYTES,
+        )
+    return _default_cache
+
+def script_tts_steps(script_path: str) -> list[tuple[str, str]]:
+    """Return (text, lang) for every tts step in a TestScript JSON file."""
+    from script_steps import TtsStep, compile_script
+
+    with open(script_path, 'r') as f:
+        steps = compile_script(json.load(f))
+    return [(step.text, step.lang) for step in steps if isinstance(step, TtsStep)]
+
+async def warm(script_paths: list[str], cache: TTSCache) -> None:
+    """Pre-render every tts step of the given scripts into the cache."""
+    from audio_utils import get_synthesizer, render_speech
+
+    if not get_synthesizer().cacheable:
+        logging.info("The %s TTS backend renders locally; nothing to warm", get_synthesizer().name)
+        return
+    for script_path in script_paths:
+        for text, lang in script_tts_steps(script_path):
+            path = await render_speech(text, lang, cache)
+            logging.info("Cached %r (%s): %s", text, lang, os.path.basename(path))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Manage the test client TTS cache')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    warm_parser = subparsers.add_parser('warm', help='Pre-render every tts step in test scripts')
+    warm_parser.add_argument('scripts', nargs='+', help='TestScript JSON files')
+    subparsers.add_parser('stats', help='Show cache size')
+    subparsers.add_parser('clear', help='Remove every cached entry')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    cache = get_tts_cache()
+    if args.command == 'warm':
+        asyncio.run(warm(args.scripts, cache))
+    elif args.command == 'clear':
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))